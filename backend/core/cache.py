@@ -0,0 +1,129 @@
+"""Versioned cache for small reference datasets.
+
+The sender `BusinessInfo` and the form dropdowns (clients, payment modes,
+payment terms, service categories) change rarely but are read on every form
+load and invoice render. Each dataset is cached under a key that embeds a
+version number; `bump(name)` increments the version, so stale entries are never
+read again and simply expire. Versions are bumped from `post_save`/`post_delete`
+receivers (core/signals.py, invoice/signals.py), immediately and again once the
+surrounding transaction commits.
+
+Invalidation is only as global as the cache backend: with the default
+per-process `LocMemCache`, other workers see a change after
+`REFERENCE_CACHE_TIMEOUT` seconds at most. Configure a shared backend (Redis,
+Memcached) in `CACHES` for immediate invalidation everywhere.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = "refdata"
+
+BUSINESS_INFO = "business_info"
+CLIENT_CHOICES = "client_choices"
+PAYMENT_MODES = "payment_modes"
+PAYMENT_TERMS = "payment_terms"
+SERVICE_CATEGORIES = "service_categories"
+
+
+def _timeout():
+    return getattr(settings, "REFERENCE_CACHE_TIMEOUT", 300)
+
+
+def _version_key(name):
+    return f"{KEY_PREFIX}:{name}:version"
+
+
+def get_version(name):
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock rather than 1 so a version lost from the cache
+        # (eviction, restart) can't point back at entries written before it.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key) or 0
+    return version
+
+
+def _bump_now(names):
+    for name in names:
+        try:
+            cache.incr(_version_key(name))
+        except ValueError:
+            cache.set(_version_key(name), time.time_ns(), None)
+
+
+def bump(*names):
+    """Invalidate the named datasets now and again after the current transaction commits.
+
+    The second bump drops anything another request cached from the
+    not-yet-committed state.
+    """
+    _bump_now(names)
+    transaction.on_commit(lambda: _bump_now(names))
+
+
+def cached(name, loader):
+    """Return the current version of dataset `name`, calling `loader()` on a miss."""
+    key = f"{KEY_PREFIX}:{name}:{get_version(name)}"
+    hit = cache.get(key)
+    if hit is not None:
+        # Stored wrapped in a tuple so a `None` result is cached too.
+        return hit[0]
+    value = loader()
+    cache.set(key, (value,), _timeout())
+    return value
+
+
+def business_info():
+    """The sender `BusinessInfo` singleton (or None)."""
+    from invoice.models import BusinessInfo
+
+    return cached(BUSINESS_INFO, lambda: BusinessInfo.objects.order_by('-created_at').first())
+
+
+def _client_choices():
+    from .models import CustomUser
+
+    rows = CustomUser.objects.filter(type="client").values(
+        "id",
+        "first_name",
+        "last_name",
+        "email",
+        "profile__company_name",
+    )
+    data = []
+    for row in rows:
+        company_name = row.get("profile__company_name")
+        if company_name:
+            name = company_name
+        else:
+            full_name = f"{row.get('first_name') or ''} {row.get('last_name') or ''}".strip()
+            name = full_name or row.get("email") or str(row.get("id"))
+        data.append({"id": row.get("id"), "name": name})
+    return data
+
+
+def client_choices():
+    """Clients as `{"id", "name"}` (company name, else full name, else email)."""
+    return cached(CLIENT_CHOICES, _client_choices)
+
+
+def payment_modes():
+    from invoice.models import PaymentMode
+
+    return cached(PAYMENT_MODES, lambda: list(PaymentMode.objects.all().values('id', 'name')))
+
+
+def payment_terms():
+    from invoice.models import PaymentTerm
+
+    return cached(PAYMENT_TERMS, lambda: list(PaymentTerm.objects.all().values('id', 'name')))
+
+
+def service_categories():
+    from .models import ServiceCategory
+
+    return cached(SERVICE_CATEGORIES, lambda: list(ServiceCategory.objects.order_by('name').values('id', 'name')))
@@ -12,13 +12,14 @@ class EventsConsumer(AsyncJsonWebsocketConsumer):
     Groups:
     - user_<id>
     - client_<id> (optional via query param)
+    - staff (every non-client user)
 
     Query params:
     - token=<jwt access token> (required)
     - client_id=<id> (optional)
 
     Events pushed by the server are of the form:
-    {"event": "comment_added"|"content_item_status_changed"|"content_item_updated"|"invoice_item_recorded", "data": {...}}
+    {"event": "comment_added"|"content_item_status_changed"|"content_item_updated"|"invoice_item_recorded"|"pipeline_progress", "data": {...}}
     """
 
     async def connect(self):
@@ -33,6 +34,11 @@ class EventsConsumer(AsyncJsonWebsocketConsumer):
         self.user_group = f"user_{user.id}"
         await self.channel_layer.group_add(self.user_group, self.channel_name)
 
+        self.staff_group = None
+        if getattr(user, "type", None) != "client":
+            self.staff_group = "staff"
+            await self.channel_layer.group_add(self.staff_group, self.channel_name)
+
         # Optional client scoping.
         try:
             qs = self.scope.get("query_string", b"").decode("utf-8")
@@ -55,6 +61,10 @@ class EventsConsumer(AsyncJsonWebsocketConsumer):
             client_group = getattr(self, "client_group", None)
             if client_group:
                 await self.channel_layer.group_discard(client_group, self.channel_name)
+
+            staff_group = getattr(self, "staff_group", None)
+            if staff_group:
+                await self.channel_layer.group_discard(staff_group, self.channel_name)
         except Exception:
             pass
 
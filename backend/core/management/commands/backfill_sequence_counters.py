@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import SequenceCounter, Service, ServiceCategory
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed or raise the per-prefix service ID counters to the highest number already in use. "
+        "Safe to re-run: counters are never lowered."
+    )
+
+    def handle(self, *args, **options):
+        prefixes = {Service.service_id_prefix(category) for category in ServiceCategory.objects.all()}
+        for service_id in Service.objects.values_list('service_id', flat=True):
+            if service_id and len(service_id) > 3:
+                prefixes.add(service_id[:3].upper())
+
+        for prefix in sorted(prefixes):
+            highest = Service.max_service_number(prefix)
+            name = Service.sequence_name(prefix)
+            with transaction.atomic():
+                counter, created = SequenceCounter.objects.select_for_update().get_or_create(
+                    name=name, defaults={'value': highest}
+                )
+                if not created and counter.value < highest:
+                    counter.value = highest
+                    counter.save(update_fields=['value', 'updated_at'])
+            self.stdout.write(f"{name}: {max(counter.value, highest)}")
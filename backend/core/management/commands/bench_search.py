@@ -0,0 +1,104 @@
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core import search
+from core.models import ClientProfile, CustomUser
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the old OR-ed icontains invoice search with the indexed search backend "
+        "on synthetic data. Everything is created inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, default=100_000)
+        parser.add_argument('--clients', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--queries', nargs='*', default=['acme', 'bench-2024', 'client42', 'zz', 'nomatch-xyz'])
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        from invoice.models import Invoice
+
+        n_clients, n_invoices = options['clients'], options['invoices']
+        self.stdout.write(f"Seeding {n_clients} clients and {n_invoices} invoices on {connection.vendor}...")
+        users = CustomUser.objects.bulk_create(
+            CustomUser(
+                email=f'bench-client{i}@example.com',
+                first_name=f'Client{i}',
+                last_name='Bench',
+                type='client',
+            )
+            for i in range(n_clients)
+        )
+        ClientProfile.objects.bulk_create(
+            ClientProfile(user=user, company_name=f'Acme {i}' if i % 10 == 0 else f'Company {i}')
+            for i, user in enumerate(users)
+        )
+        today = date.today()
+        batch = []
+        for i in range(n_invoices):
+            batch.append(
+                Invoice(
+                    client=users[i % n_clients],
+                    invoice_id=f'BENCH-{2020 + i % 5}-{i:06d}',
+                    date=today - timedelta(days=i % 720),
+                )
+            )
+            if len(batch) >= 5000:
+                Invoice.objects.bulk_create(batch)
+                batch = []
+        Invoice.objects.bulk_create(batch)
+
+        started = time.perf_counter()
+        search.reindex_clients([u.pk for u in users])
+        search.reindex_invoices(Invoice.objects.filter(client__in=users))
+        self.stdout.write(f"Indexed in {time.perf_counter() - started:.2f}s")
+
+        base = Invoice.objects.all()
+        self.stdout.write(f"{'query':<14}{'hits':>8}{'old ms':>10}{'new ms':>10}{'speedup':>9}")
+        for query in options['queries']:
+            old_qs = base.filter(
+                Q(invoice_id__icontains=query)
+                | Q(client__first_name__icontains=query)
+                | Q(client__last_name__icontains=query)
+                | Q(client__email__icontains=query)
+                | Q(client__profile__company_name__icontains=query)
+            ).distinct()
+            new_qs = search.filter_queryset(base, search.KIND_INVOICE, query)
+            old_hits, old_ms = self._time(old_qs, options['repeat'])
+            new_hits, new_ms = self._time(new_qs, options['repeat'])
+            if old_hits != new_hits:
+                self.stderr.write(f"  result mismatch for {query!r}: {old_hits} vs {new_hits}")
+            self.stdout.write(
+                f"{query:<14}{new_hits:>8}{old_ms:>10.1f}{new_ms:>10.1f}{old_ms / max(new_ms, 0.001):>8.1f}x"
+            )
+
+    @staticmethod
+    def _time(queryset, repeat):
+        """Median ms for what the list endpoint does: a COUNT plus the first page."""
+        timings = []
+        hits = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            hits = queryset.count()
+            list(queryset.order_by('-date', '-id').values_list('pk', flat=True)[:20])
+            timings.append((time.perf_counter() - started) * 1000)
+        return hits, statistics.median(timings)
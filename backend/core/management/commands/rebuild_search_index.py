@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import search
+from core.models import SearchDocument
+
+
+class Command(BaseCommand):
+    help = "Rebuild the invoice and client search documents used by list search."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=[search.KIND_INVOICE, search.KIND_CLIENT], help='Only rebuild one kind.')
+
+    def handle(self, *args, **options):
+        kinds = [options['kind']] if options['kind'] else [search.KIND_CLIENT, search.KIND_INVOICE]
+        with transaction.atomic():
+            for kind in kinds:
+                SearchDocument.objects.filter(kind=kind).delete()
+                count = search.reindex_clients() if kind == search.KIND_CLIENT else search.reindex_invoices()
+                self.stdout.write(f"Indexed {count} {kind} documents")
@@ -0,0 +1,130 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:08
+
+import warnings
+
+from django.db import DatabaseError, migrations, models, transaction
+
+FTS_TABLE = 'core_searchdocument_fts'
+
+SQLITE_FORWARD = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    "body, content='core_searchdocument', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER core_searchdocument_ai AFTER INSERT ON core_searchdocument BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, body) VALUES (new.id, new.body); END",
+    f"CREATE TRIGGER core_searchdocument_ad AFTER DELETE ON core_searchdocument BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body); END",
+    f"CREATE TRIGGER core_searchdocument_au AFTER UPDATE ON core_searchdocument BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body); "
+    f"INSERT INTO {FTS_TABLE}(rowid, body) VALUES (new.id, new.body); END",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS core_searchdocument_au",
+    "DROP TRIGGER IF EXISTS core_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS core_searchdocument_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE INDEX core_searchdocument_body_trgm ON core_searchdocument USING gin (body gin_trgm_ops)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS core_searchdocument_body_trgm",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def _ensure_pg_trgm(schema_editor):
+    """Whether pg_trgm is installed, creating it if this role is allowed to."""
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone():
+            return True
+    try:
+        # Savepoint, so a refused CREATE EXTENSION doesn't abort the migration.
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError:
+        return False
+    return True
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        if _ensure_pg_trgm(schema_editor):
+            _run(schema_editor, POSTGRES_FORWARD)
+        else:
+            # CREATE EXTENSION needs superuser (or a trusted extension and CREATE
+            # on the database). Search still works, unindexed; see docs/invoice_api.md.
+            warnings.warn(
+                "pg_trgm could not be created; search will not be indexed. Have a "
+                "superuser run: CREATE EXTENSION pg_trgm; " + POSTGRES_FORWARD[0] + ";",
+                RuntimeWarning,
+            )
+    elif vendor == 'sqlite':
+        try:
+            _run(schema_editor, SQLITE_FORWARD)
+        except Exception:
+            # SQLite built without FTS5: core.search falls back to LIKE.
+            _run(schema_editor, SQLITE_REVERSE)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_REVERSE)
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_REVERSE)
+
+
+# Copied from core.search as of this migration, so later changes there don't
+# alter what it does.
+CLIENT_DOCUMENT_FIELDS = ('company_name', 'user__first_name', 'user__last_name', 'user__email')
+KIND_CLIENT = 'client'
+
+
+def document_body(row, fields):
+    return "\n".join(str(row[f]).strip().lower() for f in fields if row.get(f))
+
+
+def index_clients(apps, schema_editor):
+    ClientProfile = apps.get_model('core', 'ClientProfile')
+    SearchDocument = apps.get_model('core', 'SearchDocument')
+    rows = ClientProfile.objects.order_by().values('user_id', *CLIENT_DOCUMENT_FIELDS)
+    SearchDocument.objects.bulk_create(
+        [
+            SearchDocument(kind=KIND_CLIENT, object_id=row['user_id'], body=document_body(row, CLIENT_DOCUMENT_FIELDS))
+            for row in rows.iterator(chunk_size=1000)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_alter_customuser_type_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('invoice', 'Invoice'), ('client', 'Client')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('body', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunPython(index_clients, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
-from django.db import models
+from functools import partial
+
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from simple_history.models import HistoricalRecords
 
@@ -99,37 +102,55 @@ class Service(BaseModel):
     other_platform = models.CharField(max_length=100, blank=True, null=True)
 
     @staticmethod
-    def generate_service_id(category):
-        """Generate next service ID for a given category (e.g., SOC001, SOC002)."""
+    def service_id_prefix(category):
+        # First 3 letters of category name, uppercased
+        return category.name[:3].upper()
+
+    @staticmethod
+    def sequence_name(prefix):
+        return f"service:{prefix}"
+
+    @staticmethod
+    def max_service_number(prefix):
+        """Highest numeric suffix among existing service IDs with `prefix` (0 if none).
+
+        A prefix scan; only used to seed a missing counter.
+        """
+        highest = 0
+        for service_id in Service.objects.filter(service_id__startswith=prefix).values_list('service_id', flat=True):
+            suffix = service_id[len(prefix):]
+            if suffix.isdigit():
+                highest = max(highest, int(suffix))
+        return highest
+
+    @staticmethod
+    def generate_service_id(category, reserve=False):
+        """Next service ID for a given category (e.g., SOC001, SOC002).
+
+        Numbers come from the per-prefix `SequenceCounter`. With `reserve=False`
+        (previews) the counter is only read; `reserve=True` consumes the number.
+        """
         if not category:
             raise ValueError("Category is required to generate service ID")
-        
-        # Get first 3 letters of category name and uppercase
-        prefix = category.name[:3].upper()
-        
-        # Find the highest existing number for this category
-        existing_services = Service.objects.filter(
-            service_id__startswith=prefix
-        ).order_by('-service_id')
-        
-        if existing_services.exists():
-            last_id = existing_services.first().service_id
-            try:
-                # Extract the numeric part
-                last_number = int(last_id[3:])
-                next_number = last_number + 1
-            except (ValueError, IndexError):
-                next_number = 1
+
+        prefix = Service.service_id_prefix(category)
+        name = Service.sequence_name(prefix)
+        seed = partial(Service.max_service_number, prefix)
+        if reserve:
+            next_number = SequenceCounter.next_value(name, seed=seed)
         else:
-            next_number = 1
-        
+            next_number = SequenceCounter.peek(name, seed=seed)
         return f"{prefix}{next_number:03d}"
 
     def save(self, *args, **kwargs):
         # Auto-generate service_id if not provided
         if not self.service_id and self.category:
-            self.service_id = self.generate_service_id(self.category)
-        
+            service_id = self.generate_service_id(self.category, reserve=True)
+            # Skip numbers already taken by manually entered IDs.
+            while Service.objects.filter(service_id=service_id).exists():
+                service_id = self.generate_service_id(self.category, reserve=True)
+            self.service_id = service_id
+
         if self.service_id:
             self.service_id = self.service_id.upper()
         if self.hsn:
@@ -166,6 +187,96 @@ class ClientProfile(BaseModel):
             self.gstin = self.gstin.upper()
         super().save(*args, **kwargs)
 
+    def assign_client_code(self):
+        """Return this client's code, allocating and storing a free one if missing.
+
+        Candidates (see `client_code_candidates`) are checked a chunk at a time
+        against the unique index. Claiming one is a conditional UPDATE in a
+        savepoint: a unique violation (another client took it) moves on to the
+        next candidate, and losing a race for *this* profile returns the code
+        the other request stored.
+        """
+        if self.client_code:
+            return self.client_code
+        unassigned = models.Q(client_code__isnull=True) | models.Q(client_code='')
+        for chunk in _chunked(client_code_candidates(self.company_name), CLIENT_CODE_CHUNK_SIZE):
+            taken = set(ClientProfile.objects.filter(client_code__in=chunk).values_list('client_code', flat=True))
+            for code in chunk:
+                if code in taken:
+                    continue
+                try:
+                    with transaction.atomic():
+                        claimed = ClientProfile.objects.filter(unassigned, pk=self.pk).update(
+                            client_code=code, updated_at=timezone.now()
+                        )
+                except IntegrityError:
+                    continue
+                if not claimed:
+                    self.client_code = ClientProfile.objects.filter(pk=self.pk).values_list('client_code', flat=True).first()
+                    return self.client_code
+                self.client_code = code
+                return code
+        raise ValueError(f"No client code available for {self.company_name!r}")
+
+
+CLIENT_CODE_CHUNK_SIZE = 50
+CLIENT_CODE_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def client_code_candidates(company_name):
+    """Lazily yield unique upper-case client codes for a company, best first.
+
+    Two letters from the name (first two, then first letter with each later
+    letter, then any ordered pair); once those are used up, three and then
+    four characters: the first two letters followed by the remaining name
+    letters and then the whole alphabet.
+    """
+    letters = [c for c in (company_name or '').upper() if c in CLIENT_CODE_ALPHABET] or ['X', 'X']
+    if len(letters) == 1:
+        letters = letters * 2
+    seen = set()
+
+    def fresh(code):
+        if code in seen:
+            return False
+        seen.add(code)
+        return True
+
+    def two_letter():
+        yield letters[0] + letters[1]
+        for i in range(1, len(letters)):
+            yield letters[0] + letters[i]
+        for i in range(len(letters)):
+            for j in range(i + 1, len(letters)):
+                yield letters[i] + letters[j]
+
+    def longer(prefix, length):
+        tails = letters[2:] + list(CLIENT_CODE_ALPHABET)
+        if length == 3:
+            for c in tails:
+                yield prefix + c
+        else:
+            for c in tails:
+                for d in tails:
+                    yield prefix + c + d
+
+    prefix = letters[0] + letters[1]
+    for source in (two_letter(), longer(prefix, 3), longer(prefix, 4)):
+        for code in source:
+            if fresh(code):
+                yield code
+
 
 class DeviceToken(BaseModel):
     """Stores a Firebase Cloud Messaging (FCM) registration token for a user."""
@@ -200,3 +311,71 @@ class DeviceToken(BaseModel):
         return f"DeviceToken(user={self.user_id}, platform={self.platform})"
 
 
+
+
+class SearchDocument(models.Model):
+    """Denormalized search text for an invoice or client, kept in sync on save.
+
+    Indexed with pg_trgm (Postgres) or an FTS5 trigram table (SQLite); see core/search.py.
+    """
+
+    KIND_CHOICES = [
+        ("invoice", "Invoice"),
+        ("client", "Client"),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    body = models.TextField(blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("kind", "object_id")
+
+    def __str__(self):
+        return f"SearchDocument({self.kind}:{self.object_id})"
+
+
+class SequenceCounter(models.Model):
+    """Named monotonic counter (e.g. "service:SOC") for human-readable IDs.
+
+    `next_value` increments the row with an `F()` update, which locks it until
+    the surrounding transaction ends, so concurrent callers never get the same
+    number and no table scan is needed.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}={self.value}"
+
+    @classmethod
+    def _ensure(cls, name, seed=None):
+        """Create the counter at `seed()` (current highest number in use) if missing."""
+        if cls.objects.filter(name=name).exists():
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(name=name, value=seed() if seed else 0)
+        except IntegrityError:
+            # Created concurrently; fine.
+            pass
+
+    @classmethod
+    def next_value(cls, name, seed=None):
+        """Atomically increment counter `name` and return the new value."""
+        with transaction.atomic():
+            if not cls.objects.filter(name=name).update(value=models.F('value') + 1):
+                cls._ensure(name, seed=seed)
+                cls.objects.filter(name=name).update(value=models.F('value') + 1)
+            return cls.objects.filter(name=name).values_list('value', flat=True).get()
+
+    @classmethod
+    def peek(cls, name, seed=None):
+        """The value `next_value` would return now, without consuming it."""
+        current = cls.objects.filter(name=name).values_list('value', flat=True).first()
+        if current is None:
+            current = seed() if seed else 0
+        return current + 1
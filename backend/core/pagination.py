@@ -1,4 +1,12 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -11,3 +19,136 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = "page_size"
     max_page_size = 1000
+
+
+class KeysetPagination(BasePagination):
+    """Cursor (keyset) pagination over a composite ordering such as ("-date", "-id").
+
+    Each page is a `WHERE (key) < (last key) ... LIMIT n` range read on an index,
+    so deep pages cost the same as the first and no COUNT(*) is issued. The
+    ordering comes from the view's `keyset_ordering` (falls back to `ordering`)
+    and must end in a unique field. Forward-only: responses carry `next`.
+    """
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    cursor_query_param = "cursor"
+    ordering = ("-created_at", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_ordering(self, view):
+        return tuple(getattr(view, "keyset_ordering", None) or self.ordering)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param) or self.page_size)
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, values):
+        raw = json.dumps(values, default=str, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    def decode_cursor(self, cursor, ordering, model=None):
+        """Cursor values, converted with each ordering field's `to_python` when `model` is given."""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        if model is None:
+            return values
+        try:
+            return [self.field_value(model, term, value) for term, value in zip(ordering, values)]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def field_value(model, term, value):
+        try:
+            field = model._meta.get_field(term.lstrip("-"))
+        except FieldDoesNotExist:
+            # An annotation: compared as sent.
+            return value
+        return field.to_python(value)
+
+    @staticmethod
+    def keyset_filter(ordering, values):
+        """Q for rows strictly after `values` in `ordering` (row-value comparison)."""
+        condition = Q()
+        for i in range(len(ordering) - 1, -1, -1):
+            field = ordering[i].lstrip("-")
+            op = "lt" if ordering[i].startswith("-") else "gt"
+            step = Q(**{f"{field}__{op}": values[i]})
+            if i < len(ordering) - 1:
+                step |= Q(**{field: values[i]}) & condition
+            condition = step
+        return condition
+
+    @staticmethod
+    def key_of(obj, ordering):
+        values = []
+        for term in ordering:
+            value = getattr(obj, term.lstrip("-"))
+            values.append(value.isoformat() if hasattr(value, "isoformat") else value)
+        return values
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = self.get_ordering(view)
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            values = self.decode_cursor(cursor, ordering, queryset.model)
+            queryset = queryset.filter(self.keyset_filter(ordering, values))
+
+        rows = list(queryset[: page_size + 1])
+        self.next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_cursor = self.encode_cursor(self.key_of(rows[-1], ordering))
+        return rows
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": None,
+            "cursor": self.next_cursor,
+            "results": data,
+        })
+
+
+class KeysetPaginationOptInMixin:
+    """Let a viewset switch to `KeysetPagination` with `?pagination=cursor` (or `?cursor=`).
+
+    Without the parameter the view's regular `pagination_class` is used, so
+    existing page-number clients are unaffected.
+    """
+
+    keyset_pagination_class = KeysetPagination
+    keyset_ordering = ("-created_at", "-id")
+
+    def use_keyset_pagination(self):
+        request = getattr(self, "request", None)
+        if request is None:
+            return False
+        params = request.query_params
+        return params.get("pagination") == "cursor" or "cursor" in params
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and self.use_keyset_pagination():
+            self._paginator = self.keyset_pagination_class()
+        return super().paginator
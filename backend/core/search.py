@@ -0,0 +1,207 @@
+"""Indexed search over invoices and clients.
+
+Each invoice and client has one `SearchDocument` row whose `body` is the
+lowercased text the list endpoints search (invoice number, client names, email,
+company name). Lookups hit that single table instead of OR-ing `icontains`
+across joins:
+
+- Postgres: `body LIKE '%q%'` served by a pg_trgm GIN index, ranked with
+  trigram word similarity (see core/migrations/0018). Without the pg_trgm
+  extension the LIKE runs unindexed and results are not ranked.
+- SQLite: an FTS5 table with the trigram tokenizer (`core_searchdocument_fts`),
+  kept in sync by triggers and ranked with bm25. Queries shorter than a
+  trigram fall back to `LIKE` on the document table.
+
+Documents are refreshed from signals (core/signals.py, invoice/signals.py);
+`python manage.py rebuild_search_index` rebuilds them from scratch.
+"""
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Subquery, Value
+from django.db.models.expressions import RawSQL
+
+from .models import ClientProfile, SearchDocument
+
+KIND_INVOICE = "invoice"
+KIND_CLIENT = "client"
+
+FTS_TABLE = "core_searchdocument_fts"
+TRIGRAM_MIN_LENGTH = 3
+REINDEX_BATCH_SIZE = 1000
+
+# `.values()` lookups concatenated into each document body, in order.
+INVOICE_DOCUMENT_FIELDS = (
+    "invoice_id",
+    "client__first_name",
+    "client__last_name",
+    "client__email",
+    "client__profile__company_name",
+)
+CLIENT_DOCUMENT_FIELDS = (
+    "company_name",
+    "user__first_name",
+    "user__last_name",
+    "user__email",
+)
+
+
+def document_body(row, fields):
+    """Join the non-empty values of `fields` from a `.values()` row into a search body.
+
+    Fields are newline-separated so a query never matches across two of them.
+    """
+    return "\n".join(str(row[f]).strip().lower() for f in fields if row.get(f))
+
+
+def _vendor():
+    return connection.vendor
+
+
+_fts_tables = {}
+
+
+def fts_available():
+    """Whether the SQLite FTS5 index exists on the current database (cached per database)."""
+    if _vendor() != "sqlite":
+        return False
+    name = connection.settings_dict["NAME"]
+    if name not in _fts_tables:
+        _fts_tables[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[name]
+
+
+_trigram_extensions = {}
+
+
+def trigram_available():
+    """Whether pg_trgm is installed on the current Postgres database (cached per database)."""
+    if _vendor() != "postgresql":
+        return False
+    name = connection.settings_dict["NAME"]
+    if name not in _trigram_extensions:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_extensions[name] = cursor.fetchone() is not None
+    return _trigram_extensions[name]
+
+
+def _fts_phrase(query):
+    return '"%s"' % query.replace('"', '""')
+
+
+def _use_fts(query):
+    return len(query) >= TRIGRAM_MIN_LENGTH and fts_available()
+
+
+def matching_documents(kind, query):
+    """`SearchDocument` queryset of documents of `kind` whose body contains `query`."""
+    query = query.strip().lower()
+    docs = SearchDocument.objects.filter(kind=kind)
+    if _use_fts(query):
+        return docs.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                (_fts_phrase(query),),
+            )
+        )
+    # Bodies are stored lowercased, so a case-sensitive LIKE is enough and lets
+    # Postgres use the gin_trgm_ops index on `body`.
+    return docs.filter(body__contains=query)
+
+
+def filter_queryset(queryset, kind, query, object_field="pk"):
+    """Restrict `queryset` to rows whose search document matches `query`.
+
+    `object_field` is the field of `queryset`'s model holding the document's
+    `object_id` (e.g. "user_id" for client profiles). No `.distinct()` is needed.
+    """
+    ids = matching_documents(kind, query).values("object_id")
+    return queryset.filter(**{f"{object_field}__in": ids})
+
+
+def annotate_rank(queryset, kind, query, object_field="pk"):
+    """Annotate `search_rank` (higher is more relevant) for `?ordering=relevance`."""
+    query = query.strip().lower()
+    if trigram_available():
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        rank = Subquery(
+            SearchDocument.objects.filter(kind=kind, object_id=OuterRef(object_field))
+            .annotate(rank=TrigramWordSimilarity(Value(query), "body"))
+            .values("rank")[:1],
+            output_field=FloatField(),
+        )
+        return queryset.annotate(search_rank=rank)
+
+    if _use_fts(query):
+        model = queryset.model
+        column = model._meta.get_field(object_field if object_field != "pk" else model._meta.pk.name).column
+        outer = f"{connection.ops.quote_name(model._meta.db_table)}.{connection.ops.quote_name(column)}"
+        # bm25() is lower-is-better; negate it so every backend sorts descending.
+        rank = RawSQL(
+            f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+            f"JOIN core_searchdocument ON core_searchdocument.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND core_searchdocument.kind = %s "
+            f"AND core_searchdocument.object_id = {outer}",
+            (_fts_phrase(query), kind),
+            output_field=FloatField(),
+        )
+        return queryset.annotate(search_rank=rank)
+
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def order_by_rank(queryset, *tiebreak):
+    return queryset.order_by(F("search_rank").desc(nulls_last=True), *tiebreak)
+
+
+def _upsert(kind, rows):
+    docs = [SearchDocument(kind=kind, object_id=object_id, body=body) for object_id, body in rows]
+    if docs:
+        SearchDocument.objects.bulk_create(
+            docs,
+            batch_size=REINDEX_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["kind", "object_id"],
+            update_fields=["body", "updated_at"],
+        )
+    return len(docs)
+
+
+def _reindex(kind, queryset, fields, key="pk"):
+    indexed = 0
+    batch = []
+    for row in queryset.values(key, *fields).iterator(chunk_size=REINDEX_BATCH_SIZE):
+        batch.append((row[key], document_body(row, fields)))
+        if len(batch) >= REINDEX_BATCH_SIZE:
+            indexed += _upsert(kind, batch)
+            batch = []
+    return indexed + _upsert(kind, batch)
+
+
+def reindex_invoices(queryset=None):
+    """Upsert search documents for `queryset` (default: all invoices)."""
+    if queryset is None:
+        from invoice.models import Invoice
+
+        queryset = Invoice.objects.all()
+    return _reindex(KIND_INVOICE, queryset.order_by().prefetch_related(None), INVOICE_DOCUMENT_FIELDS)
+
+
+def reindex_clients(user_ids=None):
+    """Upsert client search documents (keyed by user id) for `user_ids` (default: all)."""
+    queryset = ClientProfile.objects.order_by()
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    return _reindex(KIND_CLIENT, queryset, CLIENT_DOCUMENT_FIELDS, key="user_id")
+
+
+def reindex_client_and_invoices(user_id):
+    """Refresh a client's own document and those of its invoices (they embed its names)."""
+    from invoice.models import Invoice
+
+    reindex_clients([user_id])
+    reindex_invoices(Invoice.objects.filter(client_id=user_id))
+
+
+def delete_documents(kind, object_ids):
+    SearchDocument.objects.filter(kind=kind, object_id__in=list(object_ids)).delete()
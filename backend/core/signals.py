@@ -0,0 +1,62 @@
+"""Core signals: keep client search documents (`core.search`) and cached dropdowns (`core.cache`) in sync."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache as reference_cache
+from . import search
+from .models import ClientProfile, CustomUser, ServiceCategory
+
+USER_SEARCH_FIELDS = {'first_name', 'last_name', 'email'}
+PROFILE_SEARCH_FIELDS = {'company_name', 'user', 'user_id'}
+# Fields shown in the clients dropdown (`core.cache.client_choices`).
+USER_CHOICE_FIELDS = USER_SEARCH_FIELDS | {'type'}
+
+
+@receiver(post_save, sender=CustomUser, dispatch_uid='client_user_search_index')
+def index_client_user(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    # Skips e.g. `last_login` updates; users without a profile have nothing to index yet.
+    if raw or created or instance.type != 'client':
+        return
+    if update_fields and not USER_SEARCH_FIELDS.intersection(update_fields):
+        return
+    search.reindex_client_and_invoices(instance.pk)
+
+
+@receiver(post_save, sender=ClientProfile, dispatch_uid='client_profile_search_index')
+def index_client_profile(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields and not PROFILE_SEARCH_FIELDS.intersection(update_fields)):
+        return
+    search.reindex_client_and_invoices(instance.user_id)
+
+
+@receiver(post_delete, sender=ClientProfile, dispatch_uid='client_profile_search_unindex')
+def unindex_client_profile(sender, instance, **kwargs):
+    search.delete_documents(search.KIND_CLIENT, [instance.user_id])
+
+
+@receiver(post_save, sender=CustomUser, dispatch_uid='client_choices_cache_user')
+def invalidate_client_choices_for_user(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    # `last_login` and similar updates don't change the dropdown.
+    if update_fields and not USER_CHOICE_FIELDS.intersection(update_fields):
+        return
+    if instance.type == 'client' or not created:
+        reference_cache.bump(reference_cache.CLIENT_CHOICES)
+
+
+@receiver(post_delete, sender=CustomUser, dispatch_uid='client_choices_cache_user_delete')
+@receiver(post_delete, sender=ClientProfile, dispatch_uid='client_choices_cache_profile_delete')
+def invalidate_client_choices(sender, **kwargs):
+    reference_cache.bump(reference_cache.CLIENT_CHOICES)
+
+
+@receiver(post_save, sender=ClientProfile, dispatch_uid='client_choices_cache_profile')
+def invalidate_client_choices_for_profile(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if update_fields and not PROFILE_SEARCH_FIELDS.intersection(update_fields):
+        return
+    reference_cache.bump(reference_cache.CLIENT_CHOICES)
+
+
+@receiver(post_save, sender=ServiceCategory, dispatch_uid='service_categories_cache')
+@receiver(post_delete, sender=ServiceCategory, dispatch_uid='service_categories_cache_delete')
+def invalidate_service_categories(sender, **kwargs):
+    reference_cache.bump(reference_cache.SERVICE_CATEGORIES)
@@ -1,3 +1,105 @@
+from itertools import islice
+from unittest import mock
+
 from django.test import TestCase
 
-# Create your tests here.
+from core import models as core_models
+from core.models import (
+    ClientProfile,
+    CustomUser,
+    SequenceCounter,
+    Service,
+    ServiceCategory,
+    client_code_candidates,
+)
+
+
+class ClientCodeAllocationTests(TestCase):
+    def _profile(self, company_name, code=None):
+        user = CustomUser.objects.create_user(
+            email=f'{company_name.lower().replace(" ", "")}{CustomUser.objects.count()}@example.com',
+            password='x',
+            type='client',
+        )
+        return ClientProfile.objects.create(user=user, company_name=company_name, client_code=code)
+
+    def test_candidates_widen_from_two_to_four_characters(self):
+        codes = list(islice(client_code_candidates('Ab'), 1 + 26 + 2))
+
+        self.assertEqual(codes[0], 'AB')
+        self.assertEqual(codes[1:27], [f'AB{c}' for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'])
+        self.assertEqual(codes[27:], ['ABAA', 'ABAB'])
+        self.assertEqual(len(set(codes)), len(codes))
+
+    def test_candidates_prefer_two_letters_from_the_name(self):
+        codes = list(islice(client_code_candidates('Acme Co'), 4))
+
+        self.assertEqual(codes, ['AC', 'AM', 'AE', 'AO'])
+
+    def test_taken_codes_are_skipped(self):
+        self._profile('Acme', code='AC')
+        profile = self._profile('Acme')
+
+        self.assertEqual(profile.assign_client_code(), 'AM')
+        self.assertEqual(ClientProfile.objects.get(pk=profile.pk).client_code, 'AM')
+
+    def test_exhausted_two_letter_codes_widen_to_three_and_four(self):
+        self._profile('Ab', code='AB')
+        for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
+            self._profile('Ab', code=f'AB{c}')
+
+        self.assertEqual(self._profile('Ab').assign_client_code(), 'ABAA')
+
+    def test_code_stored_by_a_concurrent_request_is_returned(self):
+        profile = self._profile('Acme')
+        ClientProfile.objects.filter(pk=profile.pk).update(client_code='ZZ')
+
+        self.assertEqual(profile.assign_client_code(), 'ZZ')
+
+    def test_gives_up_when_every_candidate_is_taken(self):
+        self._profile('Acme', code='AC')
+        self._profile('Acme', code='AM')
+        profile = self._profile('Acme')
+
+        with mock.patch.object(core_models, 'client_code_candidates', return_value=iter(['AC', 'AM'])):
+            with self.assertRaises(ValueError):
+                profile.assign_client_code()
+        self.assertIsNone(ClientProfile.objects.get(pk=profile.pk).client_code)
+
+
+class ServiceIdSequenceTests(TestCase):
+    def setUp(self):
+        self.category = ServiceCategory.objects.create(name='Social')
+
+    def _service(self, service_id=''):
+        return Service.objects.create(name='Posts', description='', category=self.category, service_id=service_id)
+
+    def test_counter_is_seeded_once_then_incremented(self):
+        seed = mock.Mock(return_value=41)
+
+        self.assertEqual(SequenceCounter.next_value('test:x', seed=seed), 42)
+        self.assertEqual(SequenceCounter.next_value('test:x', seed=seed), 43)
+        seed.assert_called_once_with()
+
+    def test_first_id_continues_from_existing_ids(self):
+        self._service('SOC007')
+        self._service('SOC003')
+
+        self.assertEqual(self._service().service_id, 'SOC008')
+        self.assertEqual(self._service().service_id, 'SOC009')
+
+    def test_preview_does_not_consume_a_number(self):
+        self._service()
+
+        preview = Service.generate_service_id(self.category)
+
+        self.assertEqual(preview, 'SOC002')
+        self.assertEqual(Service.generate_service_id(self.category), preview)
+        self.assertEqual(self._service().service_id, preview)
+
+    def test_ids_entered_by_hand_ahead_of_the_counter_are_skipped(self):
+        self._service()
+        self._service('SOC002')
+
+        self.assertEqual(self._service().service_id, 'SOC003')
+        self.assertEqual(SequenceCounter.peek(Service.sequence_name('SOC')), 4)
@@ -1,5 +1,7 @@
 from rest_framework import viewsets
 from core.pagination import StandardResultsSetPagination
+from core import cache as reference_cache
+from core import search as search_index
 from .models import CustomUser, Service, ClientProfile, ServiceCategory, DeviceToken
 from .serializers import UserSerializer, ServiceSerializer, ClientProfileSerializer
 from rest_framework.views import APIView
@@ -35,9 +37,7 @@ class ServiceViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], url_path='dropdowns')
     def dropdowns(self, request):
-        categories = list(
-            ServiceCategory.objects.order_by('name').values('id', 'name')
-        )
+        categories = reference_cache.service_categories()
         is_active = [
             {'value': 'all', 'label': 'All'},
             {'value': 'active', 'label': 'Active'},
@@ -269,14 +269,11 @@ class ClientViewSet(viewsets.ModelViewSet):
 
         search = (self.request.query_params.get('search') or '').strip()
         if search:
-            from django.db.models import Q
-
-            qs = qs.filter(
-                Q(company_name__icontains=search)
-                | Q(user__first_name__icontains=search)
-                | Q(user__last_name__icontains=search)
-                | Q(user__email__icontains=search)
-            )
+            # Client documents are keyed by user id (see core.search).
+            qs = search_index.filter_queryset(qs, search_index.KIND_CLIENT, search, object_field='user_id')
+            if self.request.query_params.get('ordering') == 'relevance':
+                qs = search_index.annotate_rank(qs, search_index.KIND_CLIENT, search, object_field='user_id')
+                qs = search_index.order_by_rank(qs, 'pk')
 
         return qs
 
@@ -7,6 +7,8 @@ from invoice.models import (
     PaymentMode,
     PaymentTerm,
     BusinessInfo,
+    RecurringInvoice,
+    RecurringInvoiceItem,
 )
 
 
@@ -54,3 +56,18 @@ class PaymentTermAdmin(admin.ModelAdmin):
 class BusinessInfoAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "email", "phone", "gstin", "secondary_email")
     search_fields = ("name", "email", "phone", "gstin")
+
+
+class RecurringInvoiceItemInline(admin.TabularInline):
+    model = RecurringInvoiceItem
+    extra = 0
+    fields = ("service", "description", "unit_price", "quantity")
+
+
+@admin.register(RecurringInvoice)
+class RecurringInvoiceAdmin(admin.ModelAdmin):
+    list_display = ("id", "client", "interval", "next_run_date", "periods_billed", "is_active", "auto_start_pipeline")
+    list_filter = ("interval", "is_active", "auto_start_pipeline")
+    search_fields = ("client__email", "client__profile__company_name")
+    readonly_fields = ("periods_billed", "last_run_at")
+    inlines = [RecurringInvoiceItemInline]
@@ -0,0 +1,157 @@
+"""Accounts-receivable aging computed in SQL.
+
+Outstanding amounts (`Invoice.objects.with_balances()`) are bucketed by days
+past `due_date` relative to an `as_of` date and summed per client in a single
+grouped query. Invoices without a due date count as current; cancelled and
+fully paid invoices are left out.
+
+`ClientReceivableSummary` holds the same outstanding amounts pre-grouped by
+(client, due date). It is refreshed one client at a time from signals, so
+`aging_report_from_summary` only has to aggregate that small table.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import CENTS, ClientReceivableSummary, Invoice
+
+# (key, first day past due, last day past due); None means unbounded.
+AGING_BUCKETS = [
+    ('current', None, 0),
+    ('1_30', 1, 30),
+    ('31_60', 31, 60),
+    ('61_90', 61, 90),
+    ('90_plus', 91, None),
+]
+
+SUM_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def open_invoices(queryset=None):
+    """Invoices with something left to pay, annotated with `pending_total`."""
+    queryset = Invoice.objects.all() if queryset is None else queryset
+    return (
+        queryset.exclude(status='cancelled')
+        .with_balances()
+        .filter(pending_total__gt=0)
+    )
+
+
+def _bucket_condition(due_field, as_of, first, last):
+    # Days past due d = as_of - due_date, so first <= d <= last
+    # becomes as_of - last <= due_date <= as_of - first.
+    condition = Q()
+    if first is not None:
+        condition &= Q(**{f'{due_field}__lte': as_of - timedelta(days=first)})
+    if last is not None:
+        condition &= Q(**{f'{due_field}__gte': as_of - timedelta(days=last)})
+    if first is None:
+        condition |= Q(**{f'{due_field}__isnull': True})
+    return condition
+
+
+def _bucket_sums(amount_field, due_field, as_of):
+    return {
+        key: Coalesce(
+            Sum(amount_field, filter=_bucket_condition(due_field, as_of, first, last)),
+            Value(Decimal('0')),
+            output_field=SUM_FIELD,
+        )
+        for key, first, last in AGING_BUCKETS
+    }
+
+
+def _client_fields(prefix):
+    return {
+        'client_id': f'{prefix}id',
+        'company_name': f'{prefix}profile__company_name',
+        'first_name': f'{prefix}first_name',
+        'last_name': f'{prefix}last_name',
+    }
+
+
+def _report(rows, fields, as_of):
+    bucket_keys = [key for key, _, _ in AGING_BUCKETS]
+    totals = {key: Decimal('0') for key in bucket_keys + ['total']}
+    clients = []
+    for row in rows:
+        entry = {name: row[lookup] for name, lookup in fields.items()}
+        entry['invoice_count'] = row['n_invoices']
+        for key in bucket_keys:
+            entry[key] = Decimal(row[key]).quantize(CENTS)
+            totals[key] += entry[key]
+        entry['total'] = sum((entry[key] for key in bucket_keys), Decimal('0'))
+        totals['total'] += entry['total']
+        clients.append(entry)
+    return {
+        'as_of': as_of,
+        'buckets': bucket_keys,
+        'clients': clients,
+        'totals': totals,
+    }
+
+
+def aging_report(as_of, queryset=None):
+    """Per-client aging from live invoice/payment data (one grouped query)."""
+    fields = _client_fields('client__')
+    rows = (
+        open_invoices(queryset)
+        .order_by()
+        .values(*fields.values())
+        .annotate(n_invoices=Count('pk'), **_bucket_sums('pending_total', 'due_date', as_of))
+        .order_by('client__profile__company_name', 'client_id')
+    )
+    return _report(rows, fields, as_of)
+
+
+def aging_report_from_summary(as_of, client_ids=None):
+    """Per-client aging from `ClientReceivableSummary`."""
+    fields = _client_fields('client__')
+    queryset = ClientReceivableSummary.objects.all()
+    if client_ids is not None:
+        queryset = queryset.filter(client_id__in=client_ids)
+    rows = (
+        queryset.order_by()
+        .values(*fields.values())
+        .annotate(n_invoices=Sum('invoice_count'), **_bucket_sums('outstanding', 'due_date', as_of))
+        .order_by('client__profile__company_name', 'client_id')
+    )
+    return _report(rows, fields, as_of)
+
+
+def refresh_receivable_summary(client_ids):
+    """Recompute the summary rows of `client_ids` from their open invoices."""
+    client_ids = [cid for cid in set(client_ids) if cid is not None]
+    if not client_ids:
+        return
+    rows = (
+        open_invoices(Invoice.objects.filter(client_id__in=client_ids))
+        .order_by()
+        .values('client_id', 'due_date')
+        .annotate(outstanding=Sum('pending_total'), invoice_count=Count('pk'))
+    )
+    summaries = [
+        ClientReceivableSummary(
+            client_id=row['client_id'],
+            due_date=row['due_date'],
+            outstanding=row['outstanding'],
+            invoice_count=row['invoice_count'],
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        ClientReceivableSummary.objects.filter(client_id__in=client_ids).delete()
+        ClientReceivableSummary.objects.bulk_create(summaries)
+
+
+def rebuild_receivable_summary():
+    """Rebuild the whole summary table (e.g. after a bulk import)."""
+    client_ids = list(open_invoices().order_by().values_list('client_id', flat=True).distinct())
+    with transaction.atomic():
+        ClientReceivableSummary.objects.all().delete()
+        for start in range(0, len(client_ids), 500):
+            refresh_receivable_summary(client_ids[start:start + 500])
+    return len(client_ids)
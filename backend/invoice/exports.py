@@ -0,0 +1,79 @@
+"""Streaming CSV exports for invoices and payments.
+
+Rows are read with `.values()` + `.iterator(chunk_size=...)` and written one at a
+time, so an export of any size is a single pass over the table in constant memory.
+Balances come from `Invoice.objects.with_balances()` (computed in SQL).
+"""
+import csv
+from decimal import Decimal
+
+EXPORT_CHUNK_SIZE = 2000
+
+INVOICE_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('invoice_id', 'invoice_number'),
+    ('date', 'date'),
+    ('start_date', 'start_date'),
+    ('due_date', 'due_date'),
+    ('client_id', 'client_id'),
+    ('client__profile__company_name', 'company_name'),
+    ('client__first_name', 'client_first_name'),
+    ('client__last_name', 'client_last_name'),
+    ('client__email', 'client_email'),
+    ('status', 'status'),
+    ('gst_percentage', 'gst_percentage'),
+    ('gst_amount', 'gst_amount'),
+    ('total_amount', 'total_amount'),
+    ('paid_total', 'paid_amount'),
+    ('pending_total', 'pending_amount'),
+    ('payment_mode__name', 'payment_mode'),
+    ('payment_term__name', 'payment_term'),
+]
+
+PAYMENT_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('invoice_id', 'invoice_pk'),
+    ('invoice__invoice_id', 'invoice_number'),
+    ('invoice__client_id', 'client_id'),
+    ('invoice__client__profile__company_name', 'company_name'),
+    ('amount', 'amount'),
+    ('payment_mode__name', 'payment_mode'),
+    ('reference', 'reference'),
+    ('paid_at', 'paid_at'),
+    ('received_by__email', 'received_by'),
+]
+
+
+class _Echo:
+    """File-like object whose `write` just returns the value (Django streaming CSV idiom)."""
+
+    def write(self, value):
+        return value
+
+
+def _format(value):
+    if value is None:
+        return ''
+    if isinstance(value, Decimal):
+        return value.quantize(Decimal("0.01"))
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(queryset, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield CSV lines (header first) for `queryset` using `columns` [(lookup, header)]."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for _, header in columns])
+    lookups = [lookup for lookup, _ in columns]
+    for row in queryset.values(*lookups).iterator(chunk_size=chunk_size):
+        yield writer.writerow([_format(row[lookup]) for lookup in lookups])
+
+
+def iter_invoices_csv(queryset):
+    # Drop prefetches: values() rows don't need them and iterator() would chunk them.
+    return iter_csv(queryset.with_balances().prefetch_related(None), INVOICE_EXPORT_COLUMNS)
+
+
+def iter_payments_csv(queryset):
+    return iter_csv(queryset.prefetch_related(None), PAYMENT_EXPORT_COLUMNS)
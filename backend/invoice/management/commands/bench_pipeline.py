@@ -0,0 +1,96 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.models import CustomUser, Service, ServiceCategory
+from invoice import pipeline
+from invoice.models import Invoice, Payment
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time pipeline generation for one invoice: the old one-create-per-title loop vs "
+        "the bulk path in invoice.pipeline. Data is created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=500, help='ContentItems the pipeline should create.')
+
+    def handle(self, *args, **options):
+        for label, run in (('per-row (old)', self._legacy_start), ('bulk', self._bulk_start)):
+            try:
+                with transaction.atomic():
+                    invoice = self._seed(options['items'])
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        created = run(invoice)
+                        elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"{label:<14} {created:>5} items  {elapsed * 1000:>9.1f} ms  {len(queries)} queries"
+                    )
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def _seed(self, n_items):
+        client = CustomUser.objects.create(
+            email='bench-pipeline@example.com', first_name='Bench', last_name='Client', type='client'
+        )
+        category = ServiceCategory.objects.create(name='Bench pipeline')
+        # Two config entries x quantity 5 => n_items titles in total.
+        per_entry = max(1, n_items // 10)
+        service = Service.objects.create(
+            name='Bench posts',
+            description='',
+            category=category,
+            is_pipeline=True,
+            pipeline_config=[{'prefix': 'post', 'count': per_entry}, {'prefix': 'reel', 'count': per_entry}],
+            platforms=['instagram'],
+        )
+        invoice = Invoice.objects.create(client=client)
+        invoice.add_items([{'service': service, 'unit_price': Decimal('10'), 'quantity': 5}])
+        Payment.objects.create(invoice=invoice, amount=invoice.total_amount)
+        invoice.refresh_from_db()
+        return invoice
+
+    @staticmethod
+    def _legacy_start(invoice):
+        from kanban.models import ContentItem
+
+        created = 0
+        items = pipeline.pipeline_items(invoice)
+        for it in items:
+            titles_by_prefix = {}
+            for svc, title in pipeline.planned_titles([it]):
+                titles_by_prefix.setdefault(title.rsplit('-', 1)[0], []).append(title)
+            for titles in titles_by_prefix.values():
+                existing = set(
+                    ContentItem.objects.filter(invoice=invoice, service=it.service, title__in=titles)
+                    .values_list('title', flat=True)
+                )
+                for title in titles:
+                    if title in existing:
+                        continue
+                    ContentItem.objects.create(
+                        title=title,
+                        client=invoice.client,
+                        service=it.service,
+                        invoice=invoice,
+                        created_by=pipeline.get_system_user(),
+                        due_date=invoice.start_date or None,
+                        platforms=(getattr(it.service, 'platforms', None) or []),
+                    )
+                    created += 1
+        pipeline.mark_started(invoice)
+        return created
+
+    @staticmethod
+    def _bulk_start(invoice):
+        return len(pipeline.start_pipeline(invoice))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from invoice.pipeline import get_system_user
+from invoice.recurring import generate_due_invoices
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate invoices for every recurring template with a period due (run daily from cron). "
+        "All due invoices are created in one transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Bill periods starting on or before this date (YYYY-MM-DD, default today).")
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options['date']:
+            as_of = parse_date(options['date'])
+            if as_of is None:
+                raise CommandError("--date must be YYYY-MM-DD")
+
+        result = generate_due_invoices(as_of=as_of, history_user=get_system_user())
+        self.stdout.write(
+            f"Generated {len(result.invoices)} invoices from {result.templates} templates"
+            + (f" ({result.skipped_periods} periods already billed)" if result.skipped_periods else "")
+        )
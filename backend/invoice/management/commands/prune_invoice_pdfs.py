@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from invoice.pdf import prune_pdf_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete cached invoice PDFs not served for INVOICE_PDF_CACHE_MAX_AGE seconds (run daily from cron). "
+        "Requests that find their file gone render it again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, help="Age limit in seconds (default INVOICE_PDF_CACHE_MAX_AGE).")
+
+    def handle(self, *args, **options):
+        count = prune_pdf_cache(max_age=options['max_age'])
+        self.stdout.write(f"Pruned {count} cached PDF files")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from invoice.aging import rebuild_receivable_summary
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ClientReceivableSummary table used by the aging report (?source=summary)."
+
+    def handle(self, *args, **options):
+        count = rebuild_receivable_summary()
+        self.stdout.write(f"Rebuilt receivable summary for {count} clients")
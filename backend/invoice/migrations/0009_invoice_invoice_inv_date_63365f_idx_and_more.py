@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice', '0008_invoice_started_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['-date', '-id'], name='invoice_inv_date_63365f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['-created_at', '-id'], name='invoice_pay_created_824271_idx'),
+        ),
+    ]
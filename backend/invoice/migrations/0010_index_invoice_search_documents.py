@@ -0,0 +1,51 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:20
+
+from django.db import migrations
+
+
+# Copied from core.search as of this migration, so later changes there don't
+# alter what it does.
+INVOICE_DOCUMENT_FIELDS = (
+    'invoice_id',
+    'client__first_name',
+    'client__last_name',
+    'client__email',
+    'client__profile__company_name',
+)
+KIND_INVOICE = 'invoice'
+
+
+def document_body(row, fields):
+    return "\n".join(str(row[f]).strip().lower() for f in fields if row.get(f))
+
+
+def index_invoices(apps, schema_editor):
+    Invoice = apps.get_model('invoice', 'Invoice')
+    SearchDocument = apps.get_model('core', 'SearchDocument')
+    rows = Invoice.objects.order_by().values('pk', *INVOICE_DOCUMENT_FIELDS).iterator(chunk_size=1000)
+    batch = []
+    for row in rows:
+        batch.append(
+            SearchDocument(kind=KIND_INVOICE, object_id=row['pk'], body=document_body(row, INVOICE_DOCUMENT_FIELDS))
+        )
+        if len(batch) >= 1000:
+            SearchDocument.objects.bulk_create(batch)
+            batch = []
+    SearchDocument.objects.bulk_create(batch)
+
+
+def unindex_invoices(apps, schema_editor):
+    SearchDocument = apps.get_model('core', 'SearchDocument')
+    SearchDocument.objects.filter(kind=KIND_INVOICE).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice', '0009_invoice_invoice_inv_date_63365f_idx_and_more'),
+        ('core', '0018_searchdocument'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_invoices, unindex_invoices),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:11
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def build_summary(apps, schema_editor):
+    Invoice = apps.get_model('invoice', 'Invoice')
+    Payment = apps.get_model('invoice', 'Payment')
+    ClientReceivableSummary = apps.get_model('invoice', 'ClientReceivableSummary')
+
+    paid = dict(
+        Payment.objects.order_by().values('invoice_id').annotate(total=Sum('amount')).values_list('invoice_id', 'total')
+    )
+    grouped = {}
+    invoices = (
+        Invoice.objects.exclude(status='cancelled')
+        .filter(total_amount__isnull=False)
+        .values_list('pk', 'client_id', 'due_date', 'total_amount')
+    )
+    for pk, client_id, due_date, total in invoices.iterator(chunk_size=2000):
+        pending = total - (paid.get(pk) or Decimal('0'))
+        if pending <= 0:
+            continue
+        outstanding, count = grouped.get((client_id, due_date), (Decimal('0'), 0))
+        grouped[(client_id, due_date)] = (outstanding + pending, count + 1)
+    ClientReceivableSummary.objects.bulk_create(
+        [
+            ClientReceivableSummary(client_id=client_id, due_date=due_date, outstanding=outstanding, invoice_count=count)
+            for (client_id, due_date), (outstanding, count) in grouped.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice', '0010_index_invoice_search_documents'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientReceivableSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_date', models.DateField(blank=True, null=True)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('invoice_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receivable_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('client', 'due_date')},
+            },
+        ),
+        migrations.RunPython(build_summary, migrations.RunPython.noop),
+    ]
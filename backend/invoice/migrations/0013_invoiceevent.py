@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice', '0012_pipelinejob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('created', 'Invoice created'), ('item_added', 'Item added'), ('payment', 'Payment recorded'), ('status_changed', 'Status changed'), ('pipeline_started', 'Pipeline started')], max_length=20)),
+                ('title', models.CharField(max_length=200)),
+                ('ts', models.DateTimeField(default=django.utils.timezone.now)),
+                ('meta', models.JSONField(blank=True, default=dict)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoice_events', to=settings.AUTH_USER_MODEL)),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='invoice.invoice')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['invoice', 'ts', 'id'], name='invoice_inv_invoice_96577a_idx')],
+            },
+        ),
+    ]
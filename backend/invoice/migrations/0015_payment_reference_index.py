@@ -0,0 +1,19 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice', '0014_recurring_invoices'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['reference'], name='invoice_pay_referen_e97f73_idx'),
+        ),
+    ]
@@ -2,12 +2,14 @@
 # Invoices and Payments
 # --------------------------
 from django.db import models
+from django.db.models import Case, DecimalField, Exists, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
-from django.db import transaction
+from django.db import connection, transaction
 from core.models import BaseModel, CustomUser, Service, ClientProfile
 from django.core.exceptions import ValidationError
 import calendar
-import string
+import sqlite3
 from decimal import Decimal
 
 
@@ -72,6 +74,51 @@ class BusinessInfo(BaseModel):
         super().save(*args, **kwargs)
 
 
+MONEY_FIELD = DecimalField(max_digits=12, decimal_places=2)
+CENTS = Decimal("0.01")
+
+
+class InvoiceQuerySet(models.QuerySet):
+    def with_balances(self):
+        """Annotate `paid_total` and `pending_total` computed in SQL.
+
+        The paid sum is a correlated subquery (not a join) so it composes with
+        `.distinct()` search filters without multiplying rows. The values are a
+        snapshot of when the row was loaded: `InvoiceSerializer` reads them on list
+        pages only, while `Invoice.paid_amount`/`pending_amount` always reflect the
+        payments table.
+        """
+        paid = Subquery(
+            Payment.objects.filter(invoice=OuterRef('pk'))
+            .order_by()
+            .values('invoice')
+            .annotate(total=Sum('amount'))
+            .values('total'),
+            output_field=MONEY_FIELD,
+        )
+        return self.annotate(
+            paid_total=Coalesce(paid, Value(Decimal("0")), output_field=MONEY_FIELD),
+        ).annotate(
+            pending_total=Case(
+                When(total_amount__isnull=True, then=Value(None, output_field=MONEY_FIELD)),
+                default=Greatest(
+                    models.F('total_amount') - models.F('paid_total'),
+                    Value(Decimal("0")),
+                    output_field=MONEY_FIELD,
+                ),
+                output_field=MONEY_FIELD,
+            ),
+        )
+
+    def with_pipeline_flag(self):
+        """Annotate `has_pipeline`: whether any item is for a pipeline service."""
+        return self.annotate(
+            has_pipeline=Exists(
+                InvoiceItem.objects.filter(invoice=OuterRef('pk'), service__is_pipeline=True)
+            ),
+        )
+
+
 class Invoice(BaseModel):
     """Invoice snapshot. Immutable after creation.
 
@@ -120,6 +167,28 @@ class Invoice(BaseModel):
     # authorized_by: the user who created/authorized the invoice
     authorized_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='authorized_invoices')
 
+    # template this invoice was generated from (see invoice.recurring); its
+    # period is `start_date`
+    recurring_invoice = models.ForeignKey(
+        'RecurringInvoice', on_delete=models.SET_NULL, null=True, blank=True, related_name='invoices'
+    )
+
+    objects = InvoiceQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # list ordering / keyset pagination
+            models.Index(fields=['-date', '-id']),
+        ]
+        constraints = [
+            # A recurring template bills each period once, even if generation runs twice.
+            models.UniqueConstraint(
+                fields=['recurring_invoice', 'start_date'],
+                condition=models.Q(recurring_invoice__isnull=False),
+                name='invoice_one_per_recurring_period',
+            ),
+        ]
+
     def __str__(self):
         return self.invoice_id or f"Invoice-{self.pk}"
 
@@ -138,66 +207,132 @@ class Invoice(BaseModel):
         return pending if pending > Decimal("0") else Decimal("0")
 
     def _generate_client_code(self, company_name):
-        name = (company_name or '').lower()
-        # keep only letters
-        letters = [c for c in name if c in string.ascii_lowercase]
-        if not letters:
-            return 'xx'
-        # try first two letters
-        candidates = []
-        if len(letters) >= 2:
-            candidates.append(''.join(letters[0:2]))
-        # try replacing second char with subsequent chars
-        for i in range(1, len(letters)):
-            candidates.append(letters[0] + letters[i])
-        # try pairs of letters (i,j)
-        for i in range(len(letters)):
-            for j in range(i+1, len(letters)):
-                candidates.append(letters[i] + letters[j])
-
-        # ensure unique against other client profiles' stored codes
-        from core.models import ClientProfile
-        existing = set(ClientProfile.objects.exclude(client_code__isnull=True).values_list('client_code', flat=True))
-        for cand in candidates:
-            cand = cand[:2]
-            if cand not in existing:
-                return cand
-        # fallback: base + digit
-        for d in range(10):
-            alt = (letters[0] + letters[1])[:1] + str(d)
-            if alt not in existing:
-                return alt
-        return 'zz'
+        """First candidate code for `company_name` not stored on any client profile."""
+        from core.models import CLIENT_CODE_CHUNK_SIZE, ClientProfile, _chunked, client_code_candidates
+
+        for chunk in _chunked(client_code_candidates(company_name), CLIENT_CODE_CHUNK_SIZE):
+            taken = set(ClientProfile.objects.filter(client_code__in=chunk).values_list('client_code', flat=True))
+            for code in chunk:
+                if code not in taken:
+                    return code
+        return 'ZZ'
 
     def _generate_invoice_id(self):
         # client_code must exist on client.profile.client_code or be generated
         client_profile = getattr(self.client, "profile", None)
 
         client_code = None
-        if client_profile and getattr(client_profile, 'client_code', None):
-            client_code = client_profile.client_code
+        if client_profile:
+            # Allocated (and stored on the profile) on the client's first invoice.
+            client_code = client_profile.assign_client_code()
         else:
-            company = client_profile.company_name if client_profile else self.client.get_full_name()
-            client_code = self._generate_client_code(company)
-            # persist to client profile if possible
-            if client_profile:
-                client_profile.client_code = client_code
-                client_profile.save()
+            client_code = self._generate_client_code(self.client.get_full_name())
 
         mon = calendar.month_abbr[self.date.month].upper()[:3]
         yy = str(self.date.year)[-2:]
         return f"{client_code}{self.pk}{mon}{yy}".upper()
 
+    def recalculate_totals(self, save=True):
+        """Recompute `total_amount`/`gst_amount` from items with a single aggregate."""
+        subtotal = InvoiceItem.objects.filter(invoice=self).aggregate(
+            total=Sum(models.F('unit_price') * models.F('quantity'), output_field=MONEY_FIELD)
+        )['total'] or Decimal("0")
+        gst_pct = self.gst_percentage or Decimal("0")
+        gst_amount = (subtotal * gst_pct) / Decimal("100")
+        self.total_amount = subtotal + gst_amount
+        self.gst_amount = gst_amount
+        if save:
+            self.save(update_fields=['total_amount', 'gst_amount', 'updated_at'])
+
+    def add_items(self, items_data, history_user=None):
+        """Insert many items at once and update totals once.
+
+        `items_data` is an iterable of dicts with `service`, `description`,
+        `unit_price` and `quantity`. Unlike saving items one by one, this issues
+        one bulk INSERT (plus one for item history), one totals aggregate, one
+        invoice save and a single `invoice_item_recorded` event.
+        """
+        from simple_history.utils import bulk_create_with_history
+
+        items = [
+            InvoiceItem(
+                invoice=self,
+                service=it.get('service'),
+                description=it.get('description', ''),
+                unit_price=it.get('unit_price'),
+                quantity=it.get('quantity', 1),
+            )
+            for it in items_data
+        ]
+        if not items:
+            return []
+        from . import timeline
+
+        with transaction.atomic():
+            items = bulk_create_with_history(items, InvoiceItem, default_user=history_user)
+            self.recalculate_totals()
+            timeline.record(*[timeline.item_event(it) for it in items])
+        _emit_invoice_items_recorded(self, [it.pk for it in items])
+        return items
+
+    # Core fields that may not change once an invoice exists.
+    IMMUTABLE_FIELDS = ('client_id', 'invoice_id', 'sender_name', 'sender_bank_account_number')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values of immutable fields so `save()` can enforce
+        # immutability without re-reading the row.
+        loaded = dict(zip(field_names, values))
+        instance._loaded_values = {
+            f: loaded[f] for f in cls.IMMUTABLE_FIELDS if f in loaded and loaded[f] is not models.DEFERRED
+        }
+        return instance
+
+    def _original_values(self):
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is not None and len(loaded) == len(self.IMMUTABLE_FIELDS):
+            return loaded
+        # Instance not (fully) loaded from the database: fall back to reading the row.
+        return Invoice.objects.filter(pk=self.pk).values(*self.IMMUTABLE_FIELDS).first()
+
+    def _allocate_pk(self):
+        """Reserve the next primary key from the table's sequence, or None if unsupported.
+
+        Lets the invoice number (which embeds the pk) be computed before the row
+        is inserted. Must run inside the transaction that inserts the row.
+        """
+        table = self._meta.db_table
+        column = self._meta.pk.column
+        vendor = connection.vendor
+        with connection.cursor() as cursor:
+            if vendor == 'postgresql':
+                cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, %s))", [table, column])
+                return cursor.fetchone()[0]
+            if vendor == 'sqlite' and sqlite3.sqlite_version_info >= (3, 35, 0):
+                # AUTOINCREMENT tables keep their counter in sqlite_sequence; the
+                # UPDATE takes the write lock, so concurrent writers are serialized.
+                cursor.execute(
+                    "UPDATE sqlite_sequence SET seq = seq + 1 WHERE name = %s RETURNING seq", [table]
+                )
+                row = cursor.fetchone()
+                if row is not None:
+                    return row[0]
+                cursor.execute(f'SELECT COALESCE(MAX("{column}"), 0) + 1 FROM "{table}"')
+                next_pk = cursor.fetchone()[0]
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, next_pk])
+                return next_pk
+        return None
+
     def save(self, *args, **kwargs):
         # immutable after creation: disallow updates to core fields once created
-        if self.pk:
-            orig = Invoice.objects.filter(pk=self.pk).first()
+        if self.pk and not self._state.adding:
+            orig = self._original_values()
             if orig:
                 # prevent modifying core immutable fields once set (allow total_amount to be
                 # populated the first time invoice items are added)
-                protected = ['client_id', 'invoice_id', 'sender_name', 'sender_bank_account_number']
-                for field in protected:
-                    if getattr(orig, field, None) != getattr(self, field, None):
+                for field in self.IMMUTABLE_FIELDS:
+                    if orig.get(field) != getattr(self, field, None):
                         raise ValidationError('Invoices are immutable once created')
 
                 # NOTE: Totals are derived from InvoiceItem rows and must be allowed to update as
@@ -205,18 +340,37 @@ class Invoice(BaseModel):
                 # as immutable at the model layer.
 
         is_new = self.pk is None
+        if not is_new:
+            if not self.invoice_id and not kwargs.get('update_fields'):
+                # Legacy rows saved before a number was assigned.
+                self.invoice_id = self._generate_invoice_id()
+            super().save(*args, **kwargs)
+            self._loaded_values = {f: getattr(self, f) for f in self.IMMUTABLE_FIELDS}
+            return
+
         # on create, compute totals, gst and snapshot business info
-        if is_new:
-            # calculate total from items if items set later; but items usually created after invoice
-            # we'll compute totals after related InvoiceItem saves via a helper; here set date
-            self.date = timezone.now().date()
+        # calculate total from items if items set later; but items usually created after invoice
+        # we'll compute totals after related InvoiceItem saves via a helper; here set date
+        self.date = timezone.now().date()
 
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            pk = self._allocate_pk()
+            if pk is not None:
+                # Number the invoice before inserting it: one INSERT, one history row.
+                self.pk = pk
+                if not self.invoice_id:
+                    self.invoice_id = self._generate_invoice_id()
+                kwargs['force_insert'] = True
+            super().save(*args, **kwargs)
+
+            # ensure invoice_id set after pk available (backends without a usable sequence)
+            if not self.invoice_id:
+                self.invoice_id = self._generate_invoice_id()
+                super().save(update_fields=['invoice_id'])
 
-        # ensure invoice_id set after pk available
-        if not self.invoice_id:
-            self.invoice_id = self._generate_invoice_id()
-            super().save(update_fields=['invoice_id'])
+            from . import timeline
+            timeline.record(timeline.created_event(self))
+        self._loaded_values = {f: getattr(self, f) for f in self.IMMUTABLE_FIELDS}
 
 
 
@@ -232,54 +386,62 @@ class InvoiceItem(BaseModel):
         return self.unit_price * self.quantity
 
     def save(self, *args, **kwargs):
+        is_new = self._state.adding
         super().save(*args, **kwargs)
         # after saving an item, update invoice totals
         invoice = self.invoice
-        # Use a direct queryset instead of the reverse relation for better static typing support.
-        total = sum(
-            (it.line_total for it in InvoiceItem.objects.filter(invoice=invoice)),
-            Decimal("0"),
-        )
-        gst_pct = getattr(invoice, "gst_percentage", None) or Decimal("0")
-        gst_amount = (total * gst_pct) / Decimal("100")
-        invoice.total_amount = total + gst_amount
-        invoice.gst_amount = gst_amount
-        invoice.save()
-
-        # Realtime event: invoice item recorded
-        try:
-            from kanban.ws import send_to_client_and_user
-            from core.notifications import notify_invoice_event
-
-            client_id = getattr(invoice, "client_id", None)
-            if client_id:
-                send_to_client_and_user(
-                    client_id,
-                    "invoice_item_recorded",
-                    {
-                        "invoice_id": invoice.pk,
-                        "invoice_item_id": self.pk,
-                        "total_amount": str(getattr(invoice, "total_amount", ""))
-                        if getattr(invoice, "total_amount", None) is not None
-                        else None,
-                        "gst_amount": str(getattr(invoice, "gst_amount", ""))
-                        if getattr(invoice, "gst_amount", None) is not None
-                        else None,
-                    },
-                )
-
-                notify_invoice_event(
-                    invoice=invoice,
-                    title="Invoice updated",
-                    body=f"Invoice {invoice.invoice_id or invoice.pk} has a new item",
-                    data={
-                        "event": "invoice_item_recorded",
-                        "invoice_id": invoice.pk,
-                        "invoice_item_id": self.pk,
-                    },
-                )
-        except Exception:
-            pass
+        invoice.recalculate_totals()
+        if is_new:
+            from . import timeline
+            timeline.record(timeline.item_event(self))
+        _emit_invoice_items_recorded(invoice, [self.pk])
+
+
+def _emit_invoice_items_recorded(invoice, item_ids):
+    """Realtime event + push for newly recorded invoice items (one per batch)."""
+    if not item_ids:
+        return
+    try:
+        from kanban.ws import send_to_client_and_user
+        from core.notifications import notify_invoice_event
+
+        client_id = getattr(invoice, "client_id", None)
+        if client_id:
+            send_to_client_and_user(
+                client_id,
+                "invoice_item_recorded",
+                {
+                    "invoice_id": invoice.pk,
+                    # Kept for existing listeners; the batch is in `invoice_item_ids`.
+                    "invoice_item_id": item_ids[-1],
+                    "invoice_item_ids": list(item_ids),
+                    "total_amount": str(getattr(invoice, "total_amount", ""))
+                    if getattr(invoice, "total_amount", None) is not None
+                    else None,
+                    "gst_amount": str(getattr(invoice, "gst_amount", ""))
+                    if getattr(invoice, "gst_amount", None) is not None
+                    else None,
+                },
+            )
+
+            body = (
+                f"Invoice {invoice.invoice_id or invoice.pk} has a new item"
+                if len(item_ids) == 1
+                else f"Invoice {invoice.invoice_id or invoice.pk} has {len(item_ids)} new items"
+            )
+            notify_invoice_event(
+                invoice=invoice,
+                title="Invoice updated",
+                body=body,
+                data={
+                    "event": "invoice_item_recorded",
+                    "invoice_id": invoice.pk,
+                    "invoice_item_id": item_ids[-1],
+                    "invoice_item_ids": list(item_ids),
+                },
+            )
+    except Exception:
+        pass
 
 
 class Payment(BaseModel):
@@ -290,59 +452,283 @@ class Payment(BaseModel):
     paid_at = models.DateTimeField(auto_now_add=True)
     received_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='received_payments')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            # statement reconciliation: duplicate check on stored references
+            models.Index(fields=['reference']),
+        ]
+
     def save(self, *args, **kwargs):
         with transaction.atomic():
-            # Capture current status from DB so we can detect status changes.
-            prev_status = None
-            try:
-                invoice_pk = getattr(self, "invoice_id", None) or getattr(getattr(self, "invoice", None), "pk", None)
-                if invoice_pk is not None:
-                    prev_status = Invoice.objects.filter(pk=invoice_pk).values_list("status", flat=True).first()
-            except Exception:
-                prev_status = None
-
+            is_new = self._state.adding
             super().save(*args, **kwargs)
-            invoice = self.invoice
-            paid = invoice.paid_amount
-            total_amount = invoice.total_amount if invoice.total_amount is not None else Decimal("0")
-            if paid <= Decimal("0"):
-                invoice.status = 'unpaid'
-            elif paid < total_amount:
-                invoice.status = 'partially_paid'
-            else:
-                invoice.status = 'paid'
-            # save status only (invoice is immutable for other fields)
-            Invoice.objects.filter(pk=invoice.pk).update(status=invoice.status)
-
-            # Push + realtime event if status changed
-            try:
-                if prev_status and prev_status != invoice.status:
-                    from kanban.ws import send_to_client_and_user
-                    from core.notifications import notify_invoice_event
-
-                    client_id = getattr(invoice, "client_id", None)
-                    if client_id:
-                        send_to_client_and_user(
-                            client_id,
-                            "invoice_status_changed",
-                            {
-                                "invoice_id": invoice.pk,
-                                "from_status": prev_status,
-                                "to_status": invoice.status,
-                            },
-                        )
-
-                    notify_invoice_event(
-                        invoice=invoice,
-                        title="Invoice status updated",
-                        body=f"Invoice {invoice.invoice_id or invoice.pk} status changed to {invoice.status}",
-                        data={
-                            "event": "invoice_status_changed",
-                            "invoice_id": invoice.pk,
-                            "from_status": prev_status,
-                            "to_status": invoice.status,
-                        },
-                        actor_user_id=getattr(self, "received_by_id", None),
-                    )
-            except Exception:
-                pass
+            from . import timeline
+            timeline.record(timeline.payment_event(self) if is_new else None)
+            changes = sync_invoice_statuses([self.invoice_id], actor_id=self.received_by_id)
+
+        if Payment.invoice.is_cached(self):
+            for change in changes:
+                self.invoice.status = change['to_status']
+        emit_status_changes(changes, actor_id=getattr(self, "received_by_id", None))
+
+
+def payment_status(paid, total_amount):
+    """Invoice status implied by the amount paid so far."""
+    paid = paid or Decimal("0")
+    total_amount = total_amount if total_amount is not None else Decimal("0")
+    if paid <= Decimal("0"):
+        return 'unpaid'
+    if paid < total_amount:
+        return 'partially_paid'
+    return 'paid'
+
+
+def sync_invoice_statuses(invoice_ids, actor_id=None):
+    """Recompute the payment status of `invoice_ids`; return the changes made.
+
+    One query reads the current status and SQL paid total of every invoice;
+    only invoices whose status changes are updated (one UPDATE per new status).
+    Each change is a dict with `invoice_id`, `invoice_number`, `client_id`,
+    `authorized_by_id`, `from_status` and `to_status`, and gets a timeline event.
+    """
+    rows = (
+        Invoice.objects.filter(pk__in=set(invoice_ids))
+        .with_balances()
+        .values('pk', 'invoice_id', 'client_id', 'authorized_by_id', 'status', 'total_amount', 'paid_total')
+    )
+    changes = []
+    by_status = {}
+    for row in rows:
+        new_status = payment_status(row['paid_total'], row['total_amount'])
+        if new_status == row['status']:
+            continue
+        by_status.setdefault(new_status, []).append(row['pk'])
+        changes.append({
+            'invoice_id': row['pk'],
+            'invoice_number': row['invoice_id'],
+            'client_id': row['client_id'],
+            'authorized_by_id': row['authorized_by_id'],
+            'from_status': row['status'],
+            'to_status': new_status,
+        })
+    # save status only (invoice is immutable for other fields)
+    for new_status, pks in by_status.items():
+        Invoice.objects.filter(pk__in=pks).update(status=new_status)
+
+    if changes:
+        from . import timeline
+        timeline.record(*[
+            timeline.status_event(c['invoice_id'], c['from_status'], c['to_status'], actor_id=actor_id)
+            for c in changes
+        ])
+    return changes
+
+
+def emit_status_changes(changes, actor_id=None):
+    """Push + realtime event for each status change from `sync_invoice_statuses`.
+
+    Also queues pipelines that recurring templates start on first payment.
+    """
+    for change in changes:
+        try:
+            from kanban.ws import send_to_client_and_user
+            from core.notifications import notify_invoice_event
+
+            data = {
+                "invoice_id": change['invoice_id'],
+                "from_status": change['from_status'],
+                "to_status": change['to_status'],
+            }
+            if change['client_id']:
+                send_to_client_and_user(change['client_id'], "invoice_status_changed", data)
+
+            notify_invoice_event(
+                invoice=Invoice(
+                    pk=change['invoice_id'],
+                    client_id=change['client_id'],
+                    authorized_by_id=change['authorized_by_id'],
+                ),
+                title="Invoice status updated",
+                body=f"Invoice {change['invoice_number'] or change['invoice_id']} status changed to {change['to_status']}",
+                data={"event": "invoice_status_changed", **data},
+                actor_user_id=actor_id,
+            )
+        except Exception:
+            pass
+
+    try:
+        # Generated retainer invoices may start their pipeline on first payment.
+        from .recurring import start_paid_pipelines
+
+        start_paid_pipelines(changes)
+    except Exception:
+        pass
+
+
+class ClientReceivableSummary(models.Model):
+    """Materialized outstanding balance per client and due date.
+
+    Refreshed per client from invoice/payment signals (`invoice.aging`). Aging
+    buckets are computed from `due_date` at query time, so rows never go stale
+    as days pass.
+    """
+    client = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='receivable_summaries')
+    due_date = models.DateField(blank=True, null=True)
+    outstanding = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0"))
+    invoice_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('client', 'due_date')
+
+    def __str__(self):
+        return f"{self.client_id} {self.due_date}: {self.outstanding}"
+
+
+PIPELINE_JOB_STATUS = [
+    ("pending", "Pending"),
+    ("running", "Running"),
+    ("done", "Done"),
+    ("failed", "Failed"),
+]
+
+
+class PipelineJob(models.Model):
+    """A background run of `invoice.pipeline.start_pipeline` for one invoice.
+
+    At most one pending/running job exists per invoice, so retried requests
+    attach to the job already in flight.
+    """
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='pipeline_jobs')
+    requested_by = models.ForeignKey(
+        CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='pipeline_jobs'
+    )
+    status = models.CharField(max_length=10, choices=PIPELINE_JOB_STATUS, default='pending')
+    total = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['invoice'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='invoice_one_active_pipeline_job',
+            ),
+        ]
+
+    @property
+    def is_active(self):
+        return self.status in ('pending', 'running')
+
+    def __str__(self):
+        return f"PipelineJob({self.pk}, invoice={self.invoice_id}, {self.status})"
+
+
+INVOICE_EVENT_TYPES = [
+    ("created", "Invoice created"),
+    ("item_added", "Item added"),
+    ("payment", "Payment recorded"),
+    ("status_changed", "Status changed"),
+    ("pipeline_started", "Pipeline started"),
+]
+
+
+class InvoiceEvent(models.Model):
+    """Append-only invoice timeline entry, written as things happen (see invoice.timeline).
+
+    The history endpoint reads these with one indexed range scan on (invoice, ts, id).
+    """
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='events')
+    type = models.CharField(max_length=20, choices=INVOICE_EVENT_TYPES)
+    title = models.CharField(max_length=200)
+    ts = models.DateTimeField(default=timezone.now)
+    meta = models.JSONField(default=dict, blank=True)
+    actor = models.ForeignKey(
+        CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='invoice_events'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['invoice', 'ts', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.invoice_id} {self.type} @ {self.ts}"
+
+
+RECURRENCE_INTERVALS = [
+    ("monthly", "Monthly"),
+    ("quarterly", "Quarterly"),
+    ("yearly", "Yearly"),
+]
+RECURRENCE_MONTHS = {"monthly": 1, "quarterly": 3, "yearly": 12}
+
+
+def add_months(value, months):
+    """`value` shifted by `months`, clamped to the end of shorter months."""
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+class RecurringInvoice(BaseModel):
+    """Template for an invoice billed every period (e.g. a monthly retainer).
+
+    Periods are counted from `start_date`, so a template starting on the 31st
+    bills on the last day of shorter months without drifting. `next_run_date`
+    is the start of the next period to bill; `generate_recurring_invoices`
+    turns due templates into invoices (see invoice.recurring).
+    """
+    client = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='recurring_invoices')
+    payment_mode = models.ForeignKey(PaymentMode, on_delete=models.SET_NULL, null=True, blank=True)
+    payment_term = models.ForeignKey(PaymentTerm, on_delete=models.SET_NULL, null=True, blank=True)
+    gst_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal("0"))
+
+    interval = models.CharField(max_length=10, choices=RECURRENCE_INTERVALS, default='monthly')
+    start_date = models.DateField()
+    end_date = models.DateField(blank=True, null=True)
+    next_run_date = models.DateField(blank=True)
+    periods_billed = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    # Start the kanban pipeline once a generated invoice is (partially) paid.
+    auto_start_pipeline = models.BooleanField(default=False)
+
+    authorized_by = models.ForeignKey(
+        CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='authorized_recurring_invoices'
+    )
+    last_run_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'next_run_date']),
+        ]
+
+    def __str__(self):
+        return f"RecurringInvoice({self.pk}, client={self.client_id}, {self.interval})"
+
+    def period_start(self, index):
+        """Start date of the `index`-th period (0-based)."""
+        return add_months(self.start_date, RECURRENCE_MONTHS[self.interval] * index)
+
+    def save(self, *args, **kwargs):
+        if self.next_run_date is None and self.start_date is not None:
+            self.next_run_date = self.period_start(self.periods_billed)
+        super().save(*args, **kwargs)
+
+
+class RecurringInvoiceItem(BaseModel):
+    recurring_invoice = models.ForeignKey(RecurringInvoice, on_delete=models.CASCADE, related_name='items')
+    service = models.ForeignKey(Service, on_delete=models.SET_NULL, null=True, blank=True)
+    description = models.TextField(blank=True, null=True)
+    unit_price = models.DecimalField(max_digits=12, decimal_places=2)
+    quantity = models.IntegerField(default=1)
+
+    @property
+    def line_total(self):
+        return self.unit_price * self.quantity
@@ -0,0 +1,46 @@
+"""Bulk payment recording.
+
+`import_payments` writes many payments across invoices in one transaction: one
+bulk INSERT (plus history rows), one balance read and at most one status UPDATE
+per resulting status via `sync_invoice_statuses`, instead of a full
+`Payment.save` round trip per row.
+"""
+from django.db import transaction
+
+from . import aging, timeline
+from .models import Invoice, Payment, PaymentMode, emit_status_changes, sync_invoice_statuses
+
+
+def import_payments(rows, received_by=None):
+    """Create payments from validated rows; return `(payments, status_changes)`.
+
+    Each row is a dict with `invoice` and optional `payment_mode` (pks),
+    `amount` and `reference`.
+    """
+    from simple_history.utils import bulk_create_with_history
+
+    modes = PaymentMode.objects.in_bulk({row['payment_mode'] for row in rows if row.get('payment_mode')})
+    payments = [
+        Payment(
+            invoice_id=row['invoice'],
+            amount=row['amount'],
+            payment_mode=modes.get(row.get('payment_mode')),
+            reference=row.get('reference') or None,
+            received_by=received_by,
+        )
+        for row in rows
+    ]
+    invoice_ids = {p.invoice_id for p in payments}
+    actor_id = getattr(received_by, 'pk', None)
+
+    with transaction.atomic():
+        payments = bulk_create_with_history(payments, Payment, default_user=received_by)
+        timeline.record(*[timeline.payment_event(p) for p in payments])
+        changes = sync_invoice_statuses(invoice_ids, actor_id=actor_id)
+        # bulk_create sends no post_save, so refresh the receivables summary here.
+        aging.refresh_receivable_summary(
+            Invoice.objects.filter(pk__in=invoice_ids).values_list('client_id', flat=True).distinct()
+        )
+
+    emit_status_changes(changes, actor_id=actor_id)
+    return payments, changes
@@ -0,0 +1,435 @@
+"""Invoice PDF rendering with an on-disk, content-addressed cache.
+
+A rendered PDF is stored under `INVOICE_PDF_CACHE_DIR/<invoice pk>/<key>.pdf`, where
+`key` hashes the `build_invoice_context` output, the template name and mtime and the
+base URL. Anything that changes what the PDF shows (items, payments, business info,
+template edits) therefore changes the key, so stale files are never served.
+Serving a file refreshes its mtime; `prune_pdf_cache` (the `prune_invoice_pdfs`
+command) deletes files unused for `INVOICE_PDF_CACHE_MAX_AGE` seconds. Readers open
+the file before using it and render again if it was pruned in between.
+
+Rendering happens in a pool of warm worker processes (`invoice.pdf_worker`) sized by
+`INVOICE_PDF_WORKERS`; set it to 0 to render inline in the request thread. The cache
+key doubles as the id of an asynchronous render job (`submit_invoice_pdf`), and
+`stream_invoice_pdfs_zip` fans a whole queryset out over the pool for bulk export.
+
+Job state lives in the cache directory so any Django process can answer a poll:
+`<key>.pending` while a render is queued or running, then `<key>.pdf` or
+`<key>.err`. A pending marker older than `INVOICE_PDF_JOB_TIMEOUT` seconds
+belongs to a render whose process died and is ignored.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal
+
+from django.conf import settings
+from django.template.loader import get_template, render_to_string
+
+from . import pdf_worker
+from .utils import build_invoice_context
+
+INVOICE_PDF_TEMPLATE = 'invoice.html'
+
+JOB_DONE = 'done'
+JOB_PENDING = 'pending'
+JOB_FAILED = 'failed'
+JOB_MISSING = 'missing'
+
+
+class InvoicePdfError(Exception):
+    """Raised when WeasyPrint is unavailable or fails to render."""
+    pass
+
+
+def get_cache_dir():
+    return str(getattr(settings, 'INVOICE_PDF_CACHE_DIR', None) or os.path.join(settings.BASE_DIR, 'pdf_cache'))
+
+
+def get_base_url(request=None):
+    # base_url is important so relative URLs (if any) resolve correctly.
+    return request.build_absolute_uri('/') if request is not None else str(settings.BASE_DIR)
+
+
+def _template_mtime(template_name):
+    try:
+        origin = get_template(template_name).origin
+        return os.path.getmtime(origin.name)
+    except Exception:
+        return 0
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        # 75.5 and 75.50 must hash identically.
+        return format(value.normalize(), 'f')
+    return str(value)
+
+
+def compute_cache_key(context, template_name=INVOICE_PDF_TEMPLATE, base_url=''):
+    payload = json.dumps(
+        {
+            'context': context,
+            'template': template_name,
+            'template_mtime': _template_mtime(template_name),
+            'base_url': base_url,
+        },
+        sort_keys=True,
+        default=_json_default,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def cached_pdf_path(invoice_pk, key):
+    return os.path.join(get_cache_dir(), str(invoice_pk), f"{key}.pdf")
+
+
+def get_cache_max_age():
+    return int(getattr(settings, 'INVOICE_PDF_CACHE_MAX_AGE', 7 * 24 * 60 * 60) or 0)
+
+
+def _open_cached(path):
+    """Open a cached PDF and mark it as recently used; None if it isn't there."""
+    try:
+        fh = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return fh
+
+
+def prune_pdf_cache(max_age=None, now=None):
+    """Delete cache files (PDFs, error and pending markers) unused for `max_age` seconds.
+
+    Returns the number of files removed. Requests holding a file open keep
+    reading it; later requests render it again.
+    """
+    max_age = get_cache_max_age() if max_age is None else max_age
+    cutoff = (now or time.time()) - max_age
+    root = get_cache_dir()
+    removed = 0
+    try:
+        invoice_dirs = os.listdir(root)
+    except FileNotFoundError:
+        return 0
+    for invoice_dir in invoice_dirs:
+        directory = os.path.join(root, invoice_dir)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            file_path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(file_path) < cutoff:
+                    os.unlink(file_path)
+                    removed += 1
+            except OSError:
+                # Removed or replaced by a concurrent render.
+                pass
+        try:
+            os.rmdir(directory)
+        except OSError:
+            # Not empty.
+            pass
+    return removed
+
+
+_executor = None
+# Reentrant: a done-callback runs in the submitting thread if the future has
+# already finished, while `_submit` holds the lock.
+_executor_lock = threading.RLock()
+_jobs = {}
+
+
+def get_executor():
+    """Lazily start the warm WeasyPrint pool (None when INVOICE_PDF_WORKERS is 0)."""
+    global _executor
+    workers = int(getattr(settings, 'INVOICE_PDF_WORKERS', 0) or 0)
+    if workers <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                # spawn: workers must not inherit Django state or DB connections.
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=pdf_worker.init_worker,
+            )
+        return _executor
+
+
+def _discard_pool(executor):
+    """Drop a broken pool so the next submit starts a fresh one."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_job_timeout():
+    return int(getattr(settings, 'INVOICE_PDF_JOB_TIMEOUT', 300) or 300)
+
+
+def is_job_pending(path):
+    """Whether some process has a live render queued for `path`."""
+    try:
+        age = time.time() - os.path.getmtime(pdf_worker.pending_path(path))
+    except OSError:
+        return False
+    return age < get_job_timeout()
+
+
+def _mark_pending(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(pdf_worker.pending_path(path), 'w', encoding='utf-8') as fh:
+        fh.write(str(time.time()))
+
+
+def prepare_invoice_pdf(invoice, request=None, template_name=INVOICE_PDF_TEMPLATE):
+    """Return `(key, path, context, base_url)` for an invoice's current state."""
+    context = build_invoice_context(invoice, request=request)
+    base_url = get_base_url(request)
+    key = compute_cache_key(context, template_name=template_name, base_url=base_url)
+    return key, cached_pdf_path(invoice.pk, key), context, base_url
+
+
+def _job_error(future):
+    """The future's exception; cancelled jobs (pool shut down) count as failed."""
+    if future.cancelled():
+        return BrokenProcessPool('PDF render was cancelled')
+    return future.exception()
+
+
+def _on_job_done(executor, path, future):
+    exc = _job_error(future)
+    if exc is None:
+        return
+    # The worker normally records its own failure; a crashed or cancelled
+    # worker never got the chance.
+    pdf_worker.clear_pending(path)
+    if not os.path.exists(pdf_worker.error_path(path)):
+        pdf_worker.write_error(path, exc)
+    if isinstance(exc, BrokenProcessPool):
+        _discard_pool(executor)
+
+
+def _submit(key, path, html, base_url):
+    executor = get_executor()
+    if executor is None:
+        return None
+    with _executor_lock:
+        future = _jobs.get(key)
+        if future is None or (future.done() and _job_error(future) is not None):
+            try:
+                os.unlink(pdf_worker.error_path(path))
+            except OSError:
+                pass
+            _mark_pending(path)
+            try:
+                future = executor.submit(pdf_worker.render_to_file, html, base_url, path)
+            except BrokenProcessPool:
+                _discard_pool(executor)
+                executor = get_executor()
+                future = executor.submit(pdf_worker.render_to_file, html, base_url, path)
+            future.add_done_callback(lambda f, executor=executor: _on_job_done(executor, path, f))
+            _jobs[key] = future
+        # Finished jobs are tracked by their output files; keep only live futures.
+        for k in [k for k, f in _jobs.items() if f.done() and k != key]:
+            del _jobs[k]
+        return future
+
+
+def render_invoice_pdf(invoice, request=None, template_name=INVOICE_PDF_TEMPLATE):
+    """Return the path of the invoice PDF, rendering it only on a cache miss."""
+    key, path, context, base_url = prepare_invoice_pdf(invoice, request=request, template_name=template_name)
+    if os.path.exists(path):
+        return path
+
+    html = render_to_string(template_name, context)
+    try:
+        future = _submit(key, path, html, base_url)
+        if future is not None:
+            return future.result()
+        return pdf_worker.render_to_file(html, base_url, path)
+    except Exception as exc:
+        raise InvoicePdfError(str(exc)) from exc
+
+
+def open_invoice_pdf(invoice, request=None, template_name=INVOICE_PDF_TEMPLATE):
+    """Open the invoice PDF for reading, rendering it on a cache miss.
+
+    The file can be pruned between the cache check and the open; it is then
+    rendered again instead of failing the request.
+    """
+    for _ in range(2):
+        fh = _open_cached(render_invoice_pdf(invoice, request=request, template_name=template_name))
+        if fh is not None:
+            return fh
+    raise InvoicePdfError('Rendered PDF was removed before it could be read')
+
+
+def submit_invoice_pdf(invoice, request=None, template_name=INVOICE_PDF_TEMPLATE):
+    """Queue a background render and return `(job_id, status)`.
+
+    Idempotent: the job id is the content hash, so resubmitting an unchanged
+    invoice returns the same job (or `done` when the PDF is already cached).
+    """
+    key, path, context, base_url = prepare_invoice_pdf(invoice, request=request, template_name=template_name)
+    if os.path.exists(path):
+        return key, JOB_DONE
+    if key not in _jobs and is_job_pending(path):
+        # Already queued by another process.
+        return key, JOB_PENDING
+
+    html = render_to_string(template_name, context)
+    if _submit(key, path, html, base_url) is None:
+        # No pool configured: render now so the job is complete when polled.
+        try:
+            pdf_worker.render_to_file(html, base_url, path)
+        except Exception:
+            return key, JOB_FAILED
+        return key, JOB_DONE
+    return key, JOB_PENDING
+
+
+def get_job_status(invoice_pk, job_id):
+    """Return `(status, path_or_error)` for a render job.
+
+    Status is read from the cache directory, so it is the same from any Django
+    process.
+    """
+    path = cached_pdf_path(invoice_pk, job_id)
+    if os.path.exists(path):
+        return JOB_DONE, path
+    future = _jobs.get(job_id)
+    if (future is not None and not future.done()) or is_job_pending(path):
+        return JOB_PENDING, None
+    err_path = pdf_worker.error_path(path)
+    if os.path.exists(err_path):
+        try:
+            with open(err_path, encoding='utf-8') as fh:
+                return JOB_FAILED, fh.read()
+        except OSError:
+            return JOB_FAILED, None
+    if future is not None and _job_error(future) is not None:
+        return JOB_FAILED, str(_job_error(future))
+    return JOB_MISSING, None
+
+
+def open_job_pdf(invoice, job_id, request=None):
+    """Open the output of render job `job_id`, or None if it is no longer available.
+
+    A pruned output is rendered again when the invoice still hashes to `job_id`;
+    if the invoice changed since, the job is gone and a new one must be submitted.
+    """
+    fh = _open_cached(cached_pdf_path(invoice.pk, job_id))
+    if fh is None and prepare_invoice_pdf(invoice, request=request)[0] == job_id:
+        fh = open_invoice_pdf(invoice, request=request)
+    return fh
+
+
+def invoice_pdf_filename(invoice):
+    return f"invoice_{invoice.invoice_id or invoice.pk}.pdf"
+
+
+def iter_invoice_pdfs(invoices, request=None, window=None, template_name=INVOICE_PDF_TEMPLATE):
+    """Yield `(invoice, path, error)` for each invoice, as renders complete.
+
+    Cached PDFs are yielded immediately; misses are rendered on the worker pool
+    with at most `window` renders in flight, so memory stays bounded however many
+    invoices are selected. Order follows completion, not the queryset.
+    """
+    executor = get_executor()
+    if window is None:
+        window = max(2, 2 * int(getattr(settings, 'INVOICE_PDF_WORKERS', 0) or 0))
+    in_flight = {}
+
+    def drain(block_until):
+        while len(in_flight) > block_until:
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                invoice = in_flight.pop(future)
+                exc = _job_error(future)
+                yield invoice, (None if exc else future.result()), exc
+
+    for invoice in invoices:
+        key, path, context, base_url = prepare_invoice_pdf(invoice, request=request, template_name=template_name)
+        if os.path.exists(path):
+            yield invoice, path, None
+            continue
+        html = render_to_string(template_name, context)
+        if executor is None:
+            try:
+                yield invoice, pdf_worker.render_to_file(html, base_url, path), None
+            except Exception as exc:
+                yield invoice, None, exc
+            continue
+        in_flight[_submit(key, path, html, base_url)] = invoice
+        yield from drain(window - 1)
+
+    yield from drain(0)
+
+
+class _ZipSink:
+    """Write-only, non-seekable buffer that `zipfile` streams into."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_invoice_pdfs_zip(invoices, request=None):
+    """Generate a ZIP of invoice PDFs chunk by chunk (for `StreamingHttpResponse`).
+
+    Each entry is written as soon as its render completes; invoices that fail to
+    render are listed in a trailing `errors.txt` entry instead of aborting. A
+    PDF pruned before it could be added is rendered again.
+    """
+    sink = _ZipSink()
+    failures = []
+    # PDFs are already compressed, so store entries as-is.
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for invoice, path, error in iter_invoice_pdfs(invoices, request=request):
+            pdf_file = None
+            if error is None and path is not None:
+                pdf_file = _open_cached(path)
+                if pdf_file is None:
+                    try:
+                        pdf_file = open_invoice_pdf(invoice, request=request)
+                    except InvoicePdfError as exc:
+                        error = exc
+            if pdf_file is None:
+                failures.append(f"{invoice.invoice_id or invoice.pk}: {error}")
+                continue
+            with pdf_file, zf.open(invoice_pdf_filename(invoice), 'w') as entry:
+                shutil.copyfileobj(pdf_file, entry)
+            yield sink.pop()
+        if failures:
+            zf.writestr('errors.txt', "\n".join(failures) + "\n")
+    yield sink.pop()
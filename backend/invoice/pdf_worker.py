@@ -0,0 +1,92 @@
+"""Process-pool side of invoice PDF rendering.
+
+This module must not import Django: it is loaded by `spawn`-ed worker processes
+(see `invoice.pdf.get_executor`). Each worker imports WeasyPrint and builds its
+font configuration once in `init_worker`, then reuses it for every
+`render_to_file` call. The template's <style> blocks stay inline, so the cascade
+is exactly what a plain `HTML(...).write_pdf()` produces.
+"""
+import os
+import tempfile
+
+_font_config = None
+
+
+def init_worker():
+    """Warm the worker: import WeasyPrint and set up its font configuration."""
+    global _font_config
+    try:
+        from weasyprint.text.fonts import FontConfiguration
+
+        _font_config = FontConfiguration()
+    except Exception:
+        # Fall back to WeasyPrint's per-render default.
+        _font_config = None
+
+
+def error_path(path):
+    return f"{os.path.splitext(path)[0]}.err"
+
+
+def pending_path(path):
+    return f"{os.path.splitext(path)[0]}.pending"
+
+
+def clear_pending(path):
+    try:
+        os.unlink(pending_path(path))
+    except OSError:
+        pass
+
+
+def write_pdf_file(path, pdf_bytes):
+    """Atomically write `pdf_bytes` to `path`.
+
+    Older renders of the invoice are left in place: a request may still be about
+    to read them. `invoice.pdf.prune_pdf_cache` removes them once unused.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(pdf_bytes)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def html_to_pdf(html, base_url):
+    from weasyprint import HTML
+
+    if _font_config is not None:
+        return HTML(string=html, base_url=base_url).write_pdf(font_config=_font_config)
+    return HTML(string=html, base_url=base_url).write_pdf()
+
+
+def render_to_file(html, base_url, path):
+    """Render `html` to `path`; on failure leave a `.err` marker next to it and re-raise.
+
+    The job's `.pending` marker is removed either way.
+    """
+    try:
+        write_pdf_file(path, html_to_pdf(html, base_url))
+    except Exception as exc:
+        write_error(path, exc)
+        raise
+    finally:
+        clear_pending(path)
+    return path
+
+
+def write_error(path, exc):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(error_path(path), 'w', encoding='utf-8') as fh:
+            fh.write(str(exc))
+    except OSError:
+        pass
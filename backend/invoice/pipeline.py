@@ -0,0 +1,283 @@
+"""Kanban pipeline generation for invoices.
+
+Pipeline services carry a `pipeline_config` list of `{"prefix": ..., "count": n}`
+entries; starting an invoice's pipeline creates `count * quantity` ContentItems
+titled `<prefix>-001`, `<prefix>-002`, ... per invoice item. Generation is
+idempotent: titles that already exist for the invoice and service are skipped.
+
+All missing items are planned in memory from one query of existing titles and
+written with `bulk_create_with_history` in a single transaction. Large runs can
+be queued as a `PipelineJob` (`enqueue_pipeline_job`), executed on a background
+thread that broadcasts `pipeline_progress` events after each batch.
+"""
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from core.models import CustomUser
+
+PIPELINE_BATCH_SIZE = 500
+# A pending/running job not updated for this long is assumed dead and may be retried.
+PIPELINE_JOB_STALE_AFTER = timedelta(minutes=10)
+
+
+class PipelineError(Exception):
+    """Raised when an invoice's pipeline cannot be started."""
+    pass
+
+
+def get_system_user():
+    email = getattr(settings, "SYSTEM_USER_EMAIL", None) or "system@tarviz.local"
+    user = CustomUser.objects.filter(email=email).first()
+    if user:
+        return user
+
+    user = CustomUser(
+        email=email,
+        first_name="System",
+        last_name="User",
+        type="superadmin",
+        is_staff=True,
+        is_superuser=True,
+    )
+    try:
+        user.set_unusable_password()
+    except Exception:
+        pass
+    user.save()
+    return user
+
+
+def pipeline_items(invoice):
+    """Invoice items whose service is a pipeline service (raises PipelineError if not startable)."""
+    # Allow starting for "paid" or "partially_paid" invoices
+    if invoice.status not in ['paid', 'partially_paid']:
+        raise PipelineError("Pipeline can only be started for paid or partially paid invoices.")
+
+    items = invoice.items.select_related('service').all()
+    found = [it for it in items if getattr(it.service, 'is_pipeline', False)]
+    if not found:
+        raise PipelineError("No pipeline services found on this invoice.")
+    return found
+
+
+def planned_titles(items):
+    """Yield `(service, title)` for every item the pipeline config calls for."""
+    for it in items:
+        svc = it.service
+        config = getattr(svc, 'pipeline_config', None) or []
+        if not isinstance(config, list):
+            continue
+
+        quantity = int(getattr(it, 'quantity', 1) or 1)
+
+        for entry in config:
+            if not isinstance(entry, dict):
+                continue
+            prefix = (entry.get('prefix') or '').strip()
+            try:
+                base_count = int(entry.get('count') or 0)
+            except Exception:
+                base_count = 0
+            if not prefix or base_count <= 0:
+                continue
+
+            # Total items to create = base_count * quantity
+            for i in range(1, base_count * quantity + 1):
+                yield svc, f"{prefix}-{i:03d}"
+
+
+def build_missing_items(invoice, items, created_by=None):
+    """Unsaved ContentItems for titles the invoice doesn't have yet (one query)."""
+    from kanban.models import ContentItem
+
+    service_ids = {it.service_id for it in items}
+    seen = set(
+        ContentItem.objects.filter(invoice=invoice, service_id__in=service_ids)
+        .values_list('service_id', 'title')
+    )
+    missing = []
+    for svc, title in planned_titles(items):
+        if (svc.pk, title) in seen:
+            continue
+        seen.add((svc.pk, title))
+        missing.append(
+            ContentItem(
+                title=title,
+                client_id=invoice.client_id,
+                service=svc,
+                invoice=invoice,
+                created_by=created_by,
+                due_date=invoice.start_date or None,
+                platforms=list(getattr(svc, 'platforms', None) or []),
+            )
+        )
+    return missing
+
+
+def mark_started(invoice):
+    """Set `started_at` the first time the pipeline runs (best-effort)."""
+    from kanban.models import ContentItem
+    from . import timeline
+
+    if invoice.started_at is not None:
+        return
+    try:
+        with transaction.atomic():
+            invoice.started_at = timezone.now()
+            invoice.save(update_fields=["started_at"])
+            timeline.record(timeline.pipeline_event(invoice, ContentItem.objects.filter(invoice=invoice).count()))
+    except Exception:
+        invoice.started_at = None
+
+
+def start_pipeline(invoice, history_user=None, batch_size=PIPELINE_BATCH_SIZE, on_progress=None):
+    """Create the invoice's missing pipeline ContentItems; return the created items.
+
+    `history_user` is recorded on the items' history rows (the system user is
+    always the `created_by`). Without `on_progress` everything is written in one
+    transaction; with it, each batch commits separately and
+    `on_progress(created, total)` is called after it, so a job can report
+    progress (an interrupted run is completed by simply running it again).
+    """
+    from simple_history.utils import bulk_create_with_history
+    from kanban.models import ContentItem, next_sync_revision
+
+    items = pipeline_items(invoice)
+    system_user = get_system_user()
+    missing = build_missing_items(invoice, items, created_by=system_user)
+    history_user = history_user or system_user
+
+    if on_progress is None:
+        with transaction.atomic():
+            created = []
+            if missing:
+                _set_sync_revision(missing, next_sync_revision())
+                created = bulk_create_with_history(
+                    missing, ContentItem, batch_size=batch_size, default_user=history_user
+                )
+            mark_started(invoice)
+        return created
+
+    created = []
+    on_progress(0, len(missing))
+    for start in range(0, len(missing), batch_size):
+        with transaction.atomic():
+            batch = missing[start:start + batch_size]
+            _set_sync_revision(batch, next_sync_revision())
+            created += bulk_create_with_history(batch, ContentItem, default_user=history_user)
+        on_progress(len(created), len(missing))
+    mark_started(invoice)
+    return created
+
+
+def _set_sync_revision(items, revision):
+    # bulk_create skips ContentItem.save, which stamps the delta-sync revision.
+    for item in items:
+        item.sync_revision = revision
+
+
+def job_payload(job):
+    return {
+        "job_id": job.pk,
+        "invoice_id": job.invoice_id,
+        "status": job.status,
+        "created": job.created_count,
+        "total": job.total,
+        "error": job.error,
+    }
+
+
+def send_job_progress(job, client_id=None):
+    """Push a `pipeline_progress` event to the invoice's client group and to staff."""
+    try:
+        from kanban.ws import send_to_client, send_to_staff
+
+        payload = job_payload(job)
+        if client_id:
+            send_to_client(client_id, "pipeline_progress", payload)
+        send_to_staff("pipeline_progress", payload)
+    except Exception:
+        pass
+
+
+def _fail_stale_jobs(invoice):
+    from .models import PipelineJob
+
+    cutoff = timezone.now() - PIPELINE_JOB_STALE_AFTER
+    PipelineJob.objects.filter(
+        invoice=invoice, status__in=['pending', 'running'], updated_at__lt=cutoff
+    ).update(status='failed', error='Job stopped responding', finished_at=timezone.now())
+
+
+def enqueue_pipeline_job(invoice, requested_by=None):
+    """Return `(job, created)`: a new background job, or the one already in flight.
+
+    Validation (status, pipeline services) happens here so callers get a
+    PipelineError synchronously. The job starts after the current transaction
+    commits.
+    """
+    from .models import PipelineJob
+
+    pipeline_items(invoice)
+    _fail_stale_jobs(invoice)
+
+    active = PipelineJob.objects.filter(invoice=invoice, status__in=['pending', 'running']).first()
+    if active is not None:
+        return active, False
+    try:
+        with transaction.atomic():
+            job = PipelineJob.objects.create(invoice=invoice, requested_by=requested_by)
+    except IntegrityError:
+        # Lost a race with a concurrent request: attach to its job.
+        return PipelineJob.objects.get(invoice=invoice, status__in=['pending', 'running']), False
+
+    if getattr(settings, 'PIPELINE_JOBS_IN_BACKGROUND', True):
+        transaction.on_commit(lambda: threading.Thread(
+            target=run_pipeline_job, args=(job.pk,), name=f"pipeline-job-{job.pk}", daemon=True
+        ).start())
+    else:
+        transaction.on_commit(lambda: run_pipeline_job(job.pk))
+        if not transaction.get_connection().in_atomic_block:
+            # Already ran (autocommit executes on_commit callbacks immediately).
+            job.refresh_from_db()
+    return job, True
+
+
+def run_pipeline_job(job_id):
+    """Execute a PipelineJob, saving and broadcasting progress after each batch."""
+    from .models import Invoice, PipelineJob
+
+    try:
+        updated = PipelineJob.objects.filter(pk=job_id, status='pending').update(
+            status='running', updated_at=timezone.now()
+        )
+        if not updated:
+            return
+        job = PipelineJob.objects.select_related('requested_by').get(pk=job_id)
+        invoice = Invoice.objects.get(pk=job.invoice_id)
+        client_id = invoice.client_id
+
+        def on_progress(created, total):
+            job.created_count = created
+            job.total = total
+            job.save(update_fields=['created_count', 'total', 'updated_at'])
+            send_job_progress(job, client_id)
+
+        try:
+            start_pipeline(invoice, history_user=job.requested_by, on_progress=on_progress)
+        except Exception as exc:
+            job.status = 'failed'
+            job.error = str(exc)
+        else:
+            job.status = 'done'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+        send_job_progress(job, client_id)
+    finally:
+        if getattr(settings, 'PIPELINE_JOBS_IN_BACKGROUND', True):
+            # Background threads get their own connection; don't leak it.
+            connection.close()
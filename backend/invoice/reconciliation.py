@@ -0,0 +1,348 @@
+"""Bank statement reconciliation.
+
+A CSV bank export is read line by line (`read_statement`) and each credit is
+matched against an in-memory index of open invoices (`OpenInvoiceIndex`) built
+from one query. Matching tries, in order:
+
+- `exact`: a word of the description/reference equals an invoice number.
+- `normalized`: an invoice number appears once separators are removed
+  (e.g. "NEFT/AB-12-OCT-26/..." or "INVAB12OCT26").
+- `client_amount`: a word equals a client code and exactly one of that client's
+  open invoices has the line's amount pending.
+- `amount`: exactly one open invoice has the line's amount pending. This is
+  only ever proposed, never committed automatically.
+
+Amounts of committable matches are deducted from the index as lines are
+processed, so two lines can't both settle the same balance. Within each chunk
+of lines the committable methods run first and `amount` guesses after, on what
+is left; guesses deduct nothing, so they never block a later line that names
+its invoice. A committed line stores its bank reference (or, without one, its
+date and description) as `Payment.reference`; lines whose stored reference
+was already recorded are reported as duplicates, so uploading a statement
+twice doesn't pay it twice. Committing hands the matched lines to
+`import_payments`, i.e. one bulk insert and one status pass.
+"""
+import codecs
+import csv
+import re
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from core.models import ClientProfile
+
+from .aging import open_invoices
+from .models import CENTS, Payment
+from .payments import import_payments
+
+RECONCILE_CHUNK_SIZE = 1000
+
+MATCH_EXACT = 'exact'
+MATCH_NORMALIZED = 'normalized'
+MATCH_CLIENT_AMOUNT = 'client_amount'
+MATCH_AMOUNT = 'amount'
+# Methods trusted enough to create payments when committing.
+AUTO_COMMIT_METHODS = (MATCH_EXACT, MATCH_NORMALIZED, MATCH_CLIENT_AMOUNT)
+
+# Normalized header -> statement field. Headers are lowercased with
+# everything but letters and digits removed.
+STATEMENT_COLUMNS = {
+    'date': 'date',
+    'txndate': 'date',
+    'transactiondate': 'date',
+    'valuedate': 'date',
+    'postingdate': 'date',
+    'description': 'description',
+    'narration': 'description',
+    'particulars': 'description',
+    'remarks': 'description',
+    'details': 'description',
+    'transactiondetails': 'description',
+    'reference': 'reference',
+    'ref': 'reference',
+    'refno': 'reference',
+    'referenceno': 'reference',
+    'chequeno': 'reference',
+    'chqrefno': 'reference',
+    'utr': 'reference',
+    'utrno': 'reference',
+    'transactionid': 'reference',
+    'amount': 'amount',
+    'credit': 'credit',
+    'creditamount': 'credit',
+    'deposit': 'credit',
+    'deposits': 'credit',
+    'depositamt': 'credit',
+    'depositamount': 'credit',
+    'cr': 'credit',
+}
+
+# <digits><MON><YY>, the tail of an invoice number (see Invoice._generate_invoice_id).
+INVOICE_NUMBER_TAIL = re.compile(r'\d+[A-Z]{3}\d{2}')
+CLIENT_CODE_LENGTHS = (2, 3, 4)
+WORD = re.compile(r'[A-Z0-9]+')
+NON_ALNUM = re.compile(r'[^A-Z0-9]+')
+
+
+class StatementError(Exception):
+    """Raised when an uploaded file isn't a usable bank statement."""
+    pass
+
+
+def _normalize_header(name):
+    return re.sub(r'[^a-z0-9]+', '', (name or '').lower())
+
+
+def parse_amount(value):
+    """Decimal amount from a statement cell ("1,234.50", "(20.00)", "500 CR"); None if blank."""
+    text = (value or '').strip().upper()
+    if not text:
+        return None
+    negative = (text.startswith('(') and text.endswith(')')) or text.endswith('DR') or text.startswith('-')
+    text = re.sub(r'[^0-9.]', '', text.replace('DR', '').replace('CR', ''))
+    if not text:
+        return None
+    try:
+        amount = Decimal(text).quantize(CENTS)
+    except InvalidOperation:
+        return None
+    return -amount if negative else amount
+
+
+def read_statement(lines):
+    """Yield one dict per credit line of a CSV statement.
+
+    `lines` is any iterable of text lines (e.g. `codecs.iterdecode(upload, ...)`),
+    consumed lazily. Each dict has `line` (1-based row number in the file),
+    `date`, `description`, `reference` and `amount` (a positive Decimal);
+    debits and rows without an amount are skipped.
+    """
+    reader = csv.reader(lines)
+    columns = None
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        if columns is None:
+            # Banks often put account details above the table: the header is
+            # the first row naming an amount or credit column.
+            mapped = {}
+            for i, name in enumerate(row):
+                field = STATEMENT_COLUMNS.get(_normalize_header(name))
+                if field and field not in mapped:
+                    mapped[field] = i
+            if 'amount' in mapped or 'credit' in mapped:
+                columns = mapped
+            elif reader.line_num > 50:
+                raise StatementError("No amount or credit column found in the statement header")
+            continue
+
+        def cell(field):
+            i = columns.get(field)
+            return row[i].strip() if i is not None and i < len(row) else ''
+
+        amount = parse_amount(cell('credit')) if 'credit' in columns else parse_amount(cell('amount'))
+        if amount is None or amount <= 0:
+            continue
+        yield {
+            'line': reader.line_num,
+            'date': cell('date'),
+            'description': cell('description'),
+            'reference': cell('reference'),
+            'amount': amount,
+        }
+
+    if columns is None:
+        raise StatementError("No amount or credit column found in the statement header")
+
+
+def read_uploaded_statement(upload, encoding='utf-8-sig'):
+    """`read_statement` over an uploaded file, decoded chunk by chunk."""
+    return read_statement(codecs.iterdecode(upload, encoding, errors='replace'))
+
+
+class OpenInvoiceIndex:
+    """Open invoices keyed by number, client code and pending amount.
+
+    Built from a single query; `settle` deducts a matched amount so later
+    lines see the remaining balance.
+    """
+
+    def __init__(self, queryset=None):
+        self.invoices = {}
+        self.by_number = {}
+        self.by_amount = {}
+        self.by_client = {}
+        self.client_codes = {}
+
+        rows = open_invoices(queryset).values('pk', 'invoice_id', 'client_id', 'pending_total')
+        for row in rows.iterator(chunk_size=RECONCILE_CHUNK_SIZE):
+            entry = {
+                'invoice': row['pk'],
+                'invoice_number': row['invoice_id'] or '',
+                'client_id': row['client_id'],
+                'pending': row['pending_total'].quantize(CENTS),
+            }
+            self.invoices[entry['invoice']] = entry
+            if entry['invoice_number']:
+                self.by_number[entry['invoice_number'].upper()] = entry
+            self.by_client.setdefault(entry['client_id'], []).append(entry)
+            self.by_amount.setdefault(entry['pending'], set()).add(entry['invoice'])
+
+        codes = ClientProfile.objects.filter(
+            user_id__in=list(self.by_client), client_code__isnull=False
+        ).exclude(client_code='').values_list('client_code', 'user_id')
+        self.client_codes = {code.upper(): user_id for code, user_id in codes}
+
+    def settle(self, entry, amount):
+        bucket = self.by_amount.get(entry['pending'])
+        if bucket is not None:
+            bucket.discard(entry['invoice'])
+        entry['pending'] = max(entry['pending'] - amount, Decimal('0'))
+        if entry['pending'] > 0:
+            self.by_amount.setdefault(entry['pending'], set()).add(entry['invoice'])
+
+    def _open(self, entry):
+        return entry if entry is not None and entry['pending'] > 0 else None
+
+    def match(self, text, amount, by_amount=True):
+        """Return `(entry, method)` for a statement line, or `(None, None)`.
+
+        With `by_amount=False` only the committable methods are tried.
+        """
+        text = text.upper()
+        words = WORD.findall(text)
+
+        for word in words:
+            entry = self._open(self.by_number.get(word))
+            if entry:
+                return entry, MATCH_EXACT
+
+        compact = NON_ALNUM.sub('', text)
+        for tail in INVOICE_NUMBER_TAIL.finditer(compact):
+            for length in CLIENT_CODE_LENGTHS:
+                if tail.start() < length:
+                    break
+                entry = self._open(self.by_number.get(compact[tail.start() - length:tail.end()]))
+                if entry:
+                    return entry, MATCH_NORMALIZED
+
+        for word in words:
+            client_id = self.client_codes.get(word)
+            if client_id is None:
+                continue
+            candidates = [e for e in self.by_client.get(client_id, ()) if e['pending'] == amount]
+            if len(candidates) == 1:
+                return candidates[0], MATCH_CLIENT_AMOUNT
+
+        if by_amount:
+            return self.match_amount(amount)
+        return None, None
+
+    def match_amount(self, amount):
+        bucket = self.by_amount.get(amount)
+        if bucket and len(bucket) == 1:
+            return self.invoices[next(iter(bucket))], MATCH_AMOUNT
+        return None, None
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def statement_reference(line):
+    """What a committed line stores as `Payment.reference` (None if the line has nothing)."""
+    reference = line['reference'] or ' '.join(part for part in (line['date'], line['description']) if part)
+    return reference[:200] or None
+
+
+def reconcile(lines, index=None):
+    """Match statement lines (from `read_statement`); yield one result dict per line.
+
+    Results carry the line fields plus `status` ("matched", "unmatched" or
+    "duplicate") and, when matched, `method`, `invoice`, `invoice_number`,
+    `client_id` and `pending_before`. Recorded payment references are looked
+    up once per chunk of lines.
+    """
+    index = OpenInvoiceIndex() if index is None else index
+    seen = set()
+    occurrences = Counter()
+    for chunk in _chunks(lines, RECONCILE_CHUNK_SIZE):
+        keys = {statement_reference(line) for line in chunk} - {None}
+        recorded = Counter(
+            Payment.objects.filter(reference__in=keys).values_list('reference', 'amount')
+        ) if keys else Counter()
+        recorded_references = {reference for reference, _ in recorded}
+
+        results = []
+        for line in chunk:
+            result = dict(line)
+            results.append(result)
+            key = statement_reference(line)
+            if line['reference']:
+                # Bank references are unique: seen before, or repeated within
+                # this statement, means the same credit.
+                duplicate = key in recorded_references or key in seen
+                seen.add(key)
+            elif key:
+                # Date and description can repeat for distinct credits: the nth
+                # identical line is a duplicate only if n were already recorded.
+                occurrences[key, line['amount']] += 1
+                duplicate = occurrences[key, line['amount']] <= recorded[key, line['amount']]
+            else:
+                duplicate = False
+            if duplicate:
+                result['status'] = 'duplicate'
+                continue
+            entry, method = index.match(f"{line['description']} {line['reference']}", line['amount'], by_amount=False)
+            if entry is not None:
+                _matched(result, entry, method)
+                index.settle(entry, line['amount'])
+
+        for result in results:
+            if 'status' not in result:
+                entry, method = index.match_amount(result['amount'])
+                if entry is None:
+                    result['status'] = 'unmatched'
+                else:
+                    _matched(result, entry, method)
+        yield from results
+
+
+def _matched(result, entry, method):
+    result.update(
+        status='matched',
+        method=method,
+        invoice=entry['invoice'],
+        invoice_number=entry['invoice_number'],
+        client_id=entry['client_id'],
+        pending_before=entry['pending'],
+    )
+
+
+def payment_rows(results, payment_mode=None, methods=AUTO_COMMIT_METHODS):
+    """`import_payments` rows for matched results whose method is in `methods`."""
+    rows = []
+    for result in results:
+        if result['status'] != 'matched' or result['method'] not in methods:
+            continue
+        rows.append({
+            'invoice': result['invoice'],
+            'amount': result['amount'],
+            'payment_mode': payment_mode,
+            'reference': statement_reference(result),
+        })
+    return rows
+
+
+def commit_matches(results, received_by=None, payment_mode=None, methods=AUTO_COMMIT_METHODS):
+    """Create payments for the committable matches; return `(payments, status_changes)`."""
+    rows = payment_rows(results, payment_mode=payment_mode, methods=methods)
+    if not rows:
+        return [], []
+    return import_payments(rows, received_by=received_by)
@@ -0,0 +1,196 @@
+"""Recurring invoice generation.
+
+`generate_due_invoices` bills every active `RecurringInvoice` whose
+`next_run_date` has arrived, in one transaction per run: each invoice is
+inserted once with its totals already computed from the template items, all
+items of all invoices go in one bulk insert (plus history), and the templates
+are advanced with one bulk update. Missed periods are caught up one invoice
+per period. A unique constraint on (template, `start_date`) keeps a period
+from being billed twice.
+
+Templates with `auto_start_pipeline` get their kanban pipeline started when a
+generated invoice receives its first payment (pipelines only run for paid or
+partially paid invoices), see `start_paid_pipelines`.
+"""
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import BusinessInfo, Invoice, InvoiceItem, RecurringInvoice, _emit_invoice_items_recorded
+
+RECURRING_BATCH_SIZE = 500
+
+
+@dataclass
+class GenerationResult:
+    invoices: list[Invoice] = field(default_factory=list)
+    templates: int = 0
+    skipped_periods: int = 0
+
+
+def due_templates(as_of):
+    """Active templates with a period starting on or before `as_of`."""
+    return (
+        RecurringInvoice.objects.filter(is_active=True, next_run_date__lte=as_of)
+        .filter(Q(end_date__isnull=True) | Q(end_date__gte=F('next_run_date')))
+        .order_by('next_run_date', 'id')
+    )
+
+
+def due_periods(template, as_of):
+    """Start dates of the template's unbilled periods up to `as_of` (and `end_date`)."""
+    index = template.periods_billed
+    period = template.next_run_date
+    while period <= as_of and (template.end_date is None or period <= template.end_date):
+        yield period
+        index += 1
+        period = template.period_start(index)
+
+
+def sender_snapshot():
+    # Read from the database, not core/cache.py: the snapshot is permanent.
+    bi = BusinessInfo.objects.order_by('-created_at').first()
+    if not bi:
+        return {}
+    return {
+        'sender_name': bi.name,
+        'sender_logo': bi.logo,
+        'sender_address': bi.address,
+        'sender_phone': bi.phone,
+        'sender_email': bi.email,
+        'sender_bank_account_name': bi.bank_account_name,
+        'sender_bank_account_number': bi.bank_account_number,
+        'sender_bank_name': bi.bank_name,
+        'sender_ifsc': bi.ifsc,
+    }
+
+
+def build_invoice(template, items, period, snapshot):
+    """Unsaved invoice for one period, with totals computed from `items`."""
+    subtotal = sum((it.unit_price * it.quantity for it in items), Decimal("0"))
+    gst_pct = template.gst_percentage or Decimal("0")
+    gst_amount = (subtotal * gst_pct) / Decimal("100")
+    term = template.payment_term
+    return Invoice(
+        client_id=template.client_id,
+        payment_mode_id=template.payment_mode_id,
+        payment_term=term,
+        gst_percentage=gst_pct,
+        gst_amount=gst_amount,
+        total_amount=subtotal + gst_amount,
+        start_date=period,
+        due_date=period + timedelta(days=term.days) if term and term.days else None,
+        authorized_by_id=template.authorized_by_id,
+        recurring_invoice=template,
+        **snapshot,
+    )
+
+
+def generate_due_invoices(as_of=None, history_user=None, batch_size=RECURRING_BATCH_SIZE):
+    """Create the invoices for every due period; return a `GenerationResult`."""
+    from simple_history.utils import bulk_create_with_history, bulk_update_with_history
+    from . import timeline
+
+    as_of = as_of or timezone.localdate()
+    now = timezone.now()
+    result = GenerationResult()
+    snapshot = sender_snapshot()
+
+    with transaction.atomic():
+        templates = list(
+            due_templates(as_of)
+            .select_for_update(of=('self',))
+            .select_related('client__profile', 'payment_term', 'authorized_by')
+            .prefetch_related('items__service')
+        )
+        if not templates:
+            return result
+        billed = set(
+            Invoice.objects.filter(recurring_invoice__in=templates)
+            .values_list('recurring_invoice_id', 'start_date')
+        )
+
+        invoice_items = []
+        for template in templates:
+            items = list(template.items.all())
+            for period in due_periods(template, as_of):
+                if (template.pk, period) in billed:
+                    result.skipped_periods += 1
+                else:
+                    invoice = build_invoice(template, items, period, snapshot)
+                    # Reuse loaded relations so numbering and timeline events don't re-query them.
+                    invoice.client = template.client
+                    invoice.authorized_by = template.authorized_by
+                    invoice.save()
+                    result.invoices.append(invoice)
+                    invoice_items += [
+                        InvoiceItem(
+                            invoice=invoice,
+                            service=it.service,
+                            description=it.description,
+                            unit_price=it.unit_price,
+                            quantity=it.quantity,
+                        )
+                        for it in items
+                    ]
+                template.periods_billed += 1
+                template.next_run_date = template.period_start(template.periods_billed)
+
+            if template.end_date is not None and template.next_run_date > template.end_date:
+                template.is_active = False
+            template.last_run_at = now
+            template.updated_at = now
+
+        if invoice_items:
+            invoice_items = bulk_create_with_history(
+                invoice_items, InvoiceItem, batch_size=batch_size, default_user=history_user
+            )
+            timeline.record(*[timeline.item_event(it) for it in invoice_items])
+        bulk_update_with_history(
+            templates,
+            RecurringInvoice,
+            ['next_run_date', 'periods_billed', 'is_active', 'last_run_at', 'updated_at'],
+            batch_size=batch_size,
+            default_user=history_user,
+        )
+        result.templates = len(templates)
+
+    items_by_invoice = {}
+    for it in invoice_items:
+        items_by_invoice.setdefault(it.invoice_id, []).append(it.pk)
+    for invoice in result.invoices:
+        _emit_invoice_items_recorded(invoice, items_by_invoice.get(invoice.pk, []))
+    return result
+
+
+def start_paid_pipelines(changes, requested_by=None):
+    """Queue pipelines for generated invoices whose first payment just landed.
+
+    `changes` are status changes from `sync_invoice_statuses`; only invoices of
+    templates with `auto_start_pipeline` whose pipeline hasn't started are
+    considered (one query, skipped when no invoice became payable).
+    """
+    from .pipeline import PipelineError, enqueue_pipeline_job
+
+    invoice_ids = [
+        c['invoice_id'] for c in changes
+        if c['from_status'] == 'unpaid' and c['to_status'] in ('paid', 'partially_paid')
+    ]
+    if not invoice_ids:
+        return []
+    jobs = []
+    invoices = Invoice.objects.filter(
+        pk__in=invoice_ids, recurring_invoice__auto_start_pipeline=True, started_at__isnull=True
+    )
+    for invoice in invoices:
+        try:
+            job, _ = enqueue_pipeline_job(invoice, requested_by=requested_by)
+        except PipelineError:
+            # No pipeline services on this invoice.
+            continue
+        jobs.append(job)
+    return jobs
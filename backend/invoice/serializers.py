@@ -1,5 +1,9 @@
+from decimal import Decimal
+
+from django.db import transaction
 from rest_framework import serializers
 from .models import Invoice, InvoiceItem, PaymentMode, PaymentTerm, BusinessInfo, Payment
+from .models import CENTS, RecurringInvoice, RecurringInvoiceItem
 from core.serializers import UserSerializer
 from core.models import CustomUser
 
@@ -52,6 +56,33 @@ class PaymentSerializer(serializers.ModelSerializer):
         )
 
 
+class PaymentImportRowSerializer(serializers.Serializer):
+    """One row of a bulk payment import (ids are resolved in bulk by the view)."""
+    invoice = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal("0.01"))
+    payment_mode = serializers.IntegerField(required=False, allow_null=True)
+    reference = serializers.CharField(max_length=200, required=False, allow_blank=True, allow_null=True)
+
+
+class PaymentImportSerializer(serializers.Serializer):
+    payments = PaymentImportRowSerializer(many=True, allow_empty=False)
+
+    def validate_payments(self, rows):
+        invoice_ids = {row['invoice'] for row in rows}
+        mode_ids = {row['payment_mode'] for row in rows if row.get('payment_mode') is not None}
+        known_invoices = set(Invoice.objects.filter(pk__in=invoice_ids).values_list('pk', flat=True))
+        known_modes = set(PaymentMode.objects.filter(pk__in=mode_ids).values_list('pk', flat=True))
+        errors = {}
+        for i, row in enumerate(rows):
+            if row['invoice'] not in known_invoices:
+                errors[i] = {'invoice': [f"Invalid pk \"{row['invoice']}\" - object does not exist."]}
+            elif row.get('payment_mode') is not None and row['payment_mode'] not in known_modes:
+                errors[i] = {'payment_mode': [f"Invalid pk \"{row['payment_mode']}\" - object does not exist."]}
+        if errors:
+            raise serializers.ValidationError(errors)
+        return rows
+
+
 class InvoiceSerializer(serializers.ModelSerializer):
     items = InvoiceItemSerializer(many=True)
     # accept client id on write, but produce a dict on read via to_representation
@@ -89,11 +120,26 @@ class InvoiceSerializer(serializers.ModelSerializer):
             return None
         return {'id': u.id, 'first_name': u.first_name, 'last_name': u.last_name, 'email': u.email}
 
+    def _balance(self, obj, annotation):
+        # List rows are serialized straight from `with_balances()`, so its totals
+        # are current there; other actions may have written payments since the
+        # instance was loaded and read the model properties instead.
+        view = self.context.get('view')
+        if getattr(view, 'action', None) != 'list' or not hasattr(obj, annotation):
+            return None
+        value = getattr(obj, annotation)
+        # Quantized because SQLite returns aggregate decimals without a fixed scale.
+        return value.quantize(CENTS) if value is not None else None
+
     def get_paid_amount(self, obj):
-        return obj.paid_amount
+        paid = self._balance(obj, 'paid_total')
+        return paid if paid is not None else obj.paid_amount
 
     def get_pending_amount(self, obj):
-        return obj.pending_amount
+        if obj.total_amount is None:
+            return None
+        pending = self._balance(obj, 'pending_total')
+        return pending if pending is not None else obj.pending_amount
 
     def get_status_label(self, obj):
         try:
@@ -102,8 +148,13 @@ class InvoiceSerializer(serializers.ModelSerializer):
             return obj.status
 
     def get_has_pipeline(self, obj):
+        # Annotated by `Invoice.objects.with_pipeline_flag()` on the viewset queryset.
+        annotated = getattr(obj, 'has_pipeline', None)
+        if annotated is not None:
+            return bool(annotated)
         try:
-            for it in obj.items.select_related('service').all():
+            # Plain `.all()` so a prefetched `items__service` is reused.
+            for it in obj.items.all():
                 svc = getattr(it, 'service', None)
                 if svc and getattr(svc, 'is_pipeline', False):
                     return True
@@ -124,6 +175,8 @@ class InvoiceSerializer(serializers.ModelSerializer):
             except BusinessInfo.DoesNotExist:
                 bi = None
         else:
+            # Not the cached copy: the snapshot is permanent, and another worker's
+            # cache may still hold the previous bank details.
             bi = BusinessInfo.objects.order_by('-created_at').first()
 
         if bi:
@@ -141,18 +194,8 @@ class InvoiceSerializer(serializers.ModelSerializer):
 
         invoice = Invoice.objects.create(**validated_data, **sender_snapshot)
 
-        # create invoice items
-        for it in items_data:
-            InvoiceItem.objects.create(
-                invoice=invoice,
-                service=it.get('service'),
-                description=it.get('description', ''),
-                unit_price=it.get('unit_price'),
-                quantity=it.get('quantity', 1),
-            )
-
-        # refresh from db to ensure totals are updated
-        invoice.refresh_from_db()
+        # bulk-create invoice items; totals are computed once and set on `invoice`
+        invoice.add_items(items_data, history_user=validated_data.get('authorized_by'))
         return invoice
 
     def to_representation(self, instance):
@@ -167,3 +210,67 @@ class InvoiceSerializer(serializers.ModelSerializer):
         }
         return rep
 
+
+class RecurringInvoiceItemSerializer(serializers.ModelSerializer):
+    service_name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RecurringInvoiceItem
+        fields = ('id', 'service', 'service_name', 'description', 'unit_price', 'quantity', 'line_total')
+        read_only_fields = ('line_total',)
+
+    def get_service_name(self, obj):
+        return obj.service.name if obj.service else None
+
+
+class RecurringInvoiceSerializer(serializers.ModelSerializer):
+    """Recurring invoice template; `items` are replaced as a whole on update."""
+    items = RecurringInvoiceItemSerializer(many=True)
+    client = serializers.PrimaryKeyRelatedField(queryset=CustomUser.objects.filter(type='client'))
+    payment_mode = serializers.PrimaryKeyRelatedField(queryset=PaymentMode.objects.all(), allow_null=True, required=False)
+    payment_term = serializers.PrimaryKeyRelatedField(queryset=PaymentTerm.objects.all(), allow_null=True, required=False)
+
+    class Meta:
+        model = RecurringInvoice
+        fields = (
+            'id', 'client', 'items', 'payment_mode', 'payment_term', 'gst_percentage',
+            'interval', 'start_date', 'end_date', 'next_run_date', 'periods_billed',
+            'is_active', 'auto_start_pipeline', 'authorized_by', 'last_run_at',
+            'created_at', 'updated_at',
+        )
+        read_only_fields = ('next_run_date', 'periods_billed', 'authorized_by', 'last_run_at')
+
+    def validate(self, attrs):
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date and end_date and end_date < start_date:
+            raise serializers.ValidationError({'end_date': 'end_date must not be before start_date.'})
+        if self.instance is not None and self.instance.periods_billed and 'start_date' in attrs \
+                and attrs['start_date'] != self.instance.start_date:
+            raise serializers.ValidationError({'start_date': 'start_date cannot change once periods have been billed.'})
+        return attrs
+
+    def _replace_items(self, template, items_data):
+        template.items.all().delete()
+        RecurringInvoiceItem.objects.bulk_create(
+            [RecurringInvoiceItem(recurring_invoice=template, **item) for item in items_data]
+        )
+
+    def create(self, validated_data):
+        items_data = validated_data.pop('items', [])
+        with transaction.atomic():
+            template = RecurringInvoice.objects.create(**validated_data)
+            self._replace_items(template, items_data)
+        return template
+
+    def update(self, instance, validated_data):
+        items_data = validated_data.pop('items', None)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if 'start_date' in validated_data:
+            instance.next_run_date = instance.period_start(instance.periods_billed)
+        with transaction.atomic():
+            instance.save()
+            if items_data is not None:
+                self._replace_items(instance, items_data)
+        return instance
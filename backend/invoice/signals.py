@@ -1,5 +1,70 @@
 """Invoice signals.
 
 Realtime notifications for invoice items are emitted from `InvoiceItem.save()`
-after totals are updated, so this module is intentionally empty.
+after totals are updated. This module keeps invoice search documents
+(`core.search`), the receivables summary (`invoice.aging`) and the cached
+reference data (`core.cache`) in sync.
 """
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core import cache as reference_cache
+from core import search
+
+from . import aging
+from .models import BusinessInfo, Invoice, Payment, PaymentMode, PaymentTerm
+
+# Saves limited to other fields (totals, status, ...) leave the search text unchanged.
+SEARCH_FIELDS = {'invoice_id', 'client', 'client_id'}
+# Fields that change what a client owes, and when.
+RECEIVABLE_FIELDS = {'total_amount', 'gst_amount', 'due_date', 'status', 'client', 'client_id'}
+# Cached reference dataset (`core.cache`) each model feeds.
+REFERENCE_DATASETS = {
+    BusinessInfo: reference_cache.BUSINESS_INFO,
+    PaymentMode: reference_cache.PAYMENT_MODES,
+    PaymentTerm: reference_cache.PAYMENT_TERMS,
+}
+
+
+@receiver(post_save, sender=Invoice, dispatch_uid='invoice_search_index')
+def index_invoice(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields and not SEARCH_FIELDS.intersection(update_fields)):
+        return
+    search.reindex_invoices(Invoice.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Invoice, dispatch_uid='invoice_search_unindex')
+def unindex_invoice(sender, instance, **kwargs):
+    search.delete_documents(search.KIND_INVOICE, [instance.pk])
+
+
+@receiver(post_save, sender=Invoice, dispatch_uid='invoice_receivables_refresh')
+def refresh_receivables_for_invoice(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields and not RECEIVABLE_FIELDS.intersection(update_fields)):
+        return
+    aging.refresh_receivable_summary([instance.client_id])
+
+
+@receiver(post_delete, sender=Invoice, dispatch_uid='invoice_receivables_delete')
+def refresh_receivables_for_deleted_invoice(sender, instance, **kwargs):
+    aging.refresh_receivable_summary([instance.client_id])
+
+
+@receiver(post_save, sender=Payment, dispatch_uid='payment_receivables_refresh')
+@receiver(post_delete, sender=Payment, dispatch_uid='payment_receivables_delete')
+def refresh_receivables_for_payment(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    client_id = Invoice.objects.filter(pk=instance.invoice_id).values_list('client_id', flat=True).first()
+    aging.refresh_receivable_summary([client_id])
+
+
+
+@receiver(post_save, sender=BusinessInfo, dispatch_uid='business_info_cache')
+@receiver(post_delete, sender=BusinessInfo, dispatch_uid='business_info_cache_delete')
+@receiver(post_save, sender=PaymentMode, dispatch_uid='payment_modes_cache')
+@receiver(post_delete, sender=PaymentMode, dispatch_uid='payment_modes_cache_delete')
+@receiver(post_save, sender=PaymentTerm, dispatch_uid='payment_terms_cache')
+@receiver(post_delete, sender=PaymentTerm, dispatch_uid='payment_terms_cache_delete')
+def invalidate_reference_data(sender, **kwargs):
+    reference_cache.bump(REFERENCE_DATASETS[sender])
@@ -1,3 +1,610 @@
-from django.test import TestCase
+import calendar
+import csv
+import io
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.models import ClientProfile, CustomUser, Service, ServiceCategory
+from core.pagination import KeysetPagination
+from invoice import pdf, pdf_worker, reconciliation, timeline
+from invoice.models import Invoice, InvoiceEvent, InvoiceItem, Payment, PipelineJob
+from invoice.models import RecurringInvoice, RecurringInvoiceItem, add_months
+from invoice.recurring import generate_due_invoices
+from kanban.models import ContentItem
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class InvoiceListQueryCountTests(TestCase):
+    url = '/api/invoice/invoices/?page_size=1000'
+
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(
+            email='manager@example.com', password='x', first_name='Mia', last_name='Ng', type='manager'
+        )
+        self.client_user = CustomUser.objects.create_user(
+            email='client@example.com', password='x', first_name='Acme', last_name='Co', type='client'
+        )
+        category = ServiceCategory.objects.create(name='Social')
+        self.pipeline_service = Service.objects.create(
+            name='Posts', description='', category=category, is_pipeline=True
+        )
+        self.plain_service = Service.objects.create(name='Audit', description='', category=category)
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def _make_invoices(self, n):
+        for i in range(n):
+            invoice = Invoice.objects.create(client=self.client_user)
+            service = self.pipeline_service if i % 2 else self.plain_service
+            InvoiceItem.objects.create(invoice=invoice, service=service, unit_price=Decimal('100'), quantity=1)
+            Payment.objects.create(invoice=invoice, amount=Decimal('40'))
+
+    def _list_query_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.api.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries), resp.data['invoices']
+
+    def test_query_count_is_flat_as_invoices_grow(self):
+        self._make_invoices(2)
+        small_count, _ = self._list_query_count()
+
+        self._make_invoices(10)
+        large_count, invoices = self._list_query_count()
+
+        self.assertEqual(len(invoices), 12)
+        self.assertEqual(small_count, large_count)
+
+    def test_annotated_fields_match_model_values(self):
+        self._make_invoices(2)
+        _, invoices = self._list_query_count()
+
+        by_pk = {inv['id']: inv for inv in invoices}
+        for invoice in Invoice.objects.all():
+            row = by_pk[invoice.pk]
+            has_pipeline = any(it.service.is_pipeline for it in invoice.items.all())
+            self.assertEqual(row['has_pipeline'], has_pipeline)
+            self.assertEqual(Decimal(str(row['paid_amount'])), invoice.paid_amount)
+            self.assertEqual(Decimal(str(row['pending_amount'])), invoice.pending_amount)
+
+    def test_loaded_instance_balances_follow_new_payments(self):
+        self._make_invoices(1)
+        invoice = Invoice.objects.with_balances().get()
+        Payment.objects.create(invoice=invoice, amount=Decimal('25'))
+
+        self.assertEqual(invoice.paid_amount, Decimal('65'))
+        resp = self.api.get(f'/api/invoice/invoices/{invoice.pk}/')
+        self.assertEqual(Decimal(str(resp.data['invoice']['paid_amount'])), Decimal('65'))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class InvoiceKeysetPaginationTests(TestCase):
+    url = '/api/invoice/invoices/'
+
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(email='manager@example.com', password='x', type='manager')
+        self.client_user = CustomUser.objects.create_user(email='client@example.com', password='x', type='client')
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def test_pages_follow_the_cursor_without_overlap(self):
+        invoices = [Invoice.objects.create(client=self.client_user) for _ in range(5)]
+
+        first = self.api.get(self.url, {'pagination': 'cursor', 'page_size': 3})
+        second = self.api.get(self.url, {'pagination': 'cursor', 'page_size': 3, 'cursor': first.data['cursor']})
+
+        ids = [row['id'] for row in first.data['invoices'] + second.data['invoices']]
+        self.assertEqual(ids, [invoice.pk for invoice in reversed(invoices)])
+        self.assertIsNone(second.data['cursor'])
+
+    def test_cursor_values_that_dont_fit_the_fields_are_not_found(self):
+        cursor = KeysetPagination().encode_cursor(['not-a-date', 1])
+
+        resp = self.api.get(self.url, {'cursor': cursor})
+
+        self.assertEqual(resp.status_code, 404)
+
+    def test_relevance_ordering_is_rejected_with_cursor_pagination(self):
+        resp = self.api.get(self.url, {'pagination': 'cursor', 'search': 'acme', 'ordering': 'relevance'})
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(resp.data['success'])
+
+
+class InvoiceAddItemsTests(TestCase):
+    def test_many_items_update_the_invoice_totals_once(self):
+        client_user = CustomUser.objects.create_user(email='client@example.com', password='x', type='client')
+        invoice = Invoice.objects.create(client=client_user, gst_percentage=Decimal('18'))
+        items_data = [{'description': f'line {i}', 'unit_price': Decimal('10'), 'quantity': i} for i in range(1, 6)]
+
+        with mock.patch('invoice.models._emit_invoice_items_recorded') as emit:
+            with CaptureQueriesContext(connection) as ctx:
+                items = invoice.add_items(items_data)
+
+        invoice_updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "invoice_invoice"')]
+        self.assertEqual(len(invoice_updates), 1)
+        emit.assert_called_once_with(invoice, [item.pk for item in items])
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.gst_amount, Decimal('27.00'))
+        self.assertEqual(invoice.total_amount, Decimal('177.00'))
+        self.assertEqual(InvoiceEvent.objects.filter(invoice=invoice, type='item_added').count(), 5)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CsvExportTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(email='manager@example.com', password='x', type='manager')
+        self.client_user = CustomUser.objects.create_user(email='client@example.com', password='x', type='client')
+        self.other_client = CustomUser.objects.create_user(email='other@example.com', password='x', type='client')
+        self.api = APIClient()
+
+    def _invoice(self, client, paid=None):
+        invoice = Invoice.objects.create(client=client)
+        InvoiceItem.objects.create(invoice=invoice, unit_price=Decimal('100'), quantity=1)
+        if paid:
+            Payment.objects.create(invoice=invoice, amount=Decimal(paid), reference=f'REF-{invoice.pk}')
+        invoice.refresh_from_db()
+        return invoice
+
+    def _export(self, url, user):
+        self.api.force_authenticate(user)
+        resp = self.api.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'text/csv')
+        self.assertTrue(resp.streaming)
+        return list(csv.DictReader(io.StringIO(b''.join(resp.streaming_content).decode())))
+
+    def test_invoice_export_has_a_row_per_invoice_with_sql_balances(self):
+        paid = self._invoice(self.client_user, paid='40')
+        unpaid = self._invoice(self.other_client)
+
+        rows = {int(row['id']): row for row in self._export('/api/invoice/invoices/export/', self.staff)}
+
+        self.assertEqual(set(rows), {paid.pk, unpaid.pk})
+        self.assertEqual(rows[paid.pk]['invoice_number'], paid.invoice_id)
+        self.assertEqual(Decimal(rows[paid.pk]['paid_amount']), paid.paid_amount)
+        self.assertEqual(Decimal(rows[paid.pk]['pending_amount']), paid.pending_amount)
+        self.assertEqual(Decimal(rows[unpaid.pk]['paid_amount']), Decimal('0'))
+
+    def test_client_payment_export_lists_only_their_payments(self):
+        own = self._invoice(self.client_user, paid='40')
+        self._invoice(self.other_client, paid='25')
+
+        rows = self._export('/api/invoice/payments/export/', self.client_user)
+
+        self.assertEqual([row['invoice_number'] for row in rows], [own.invoice_id])
+        self.assertEqual(rows[0]['amount'], '40.00')
+        self.assertEqual(rows[0]['reference'], f'REF-{own.pk}')
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AgingReportTests(TestCase):
+    url = '/api/invoice/invoices/aging/'
+
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(email='manager@example.com', password='x', type='manager')
+        self.client_user = CustomUser.objects.create_user(email='client@example.com', password='x', type='client')
+        self.as_of = date(2026, 6, 30)
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def _invoice(self, days_past_due, paid=None, status=None):
+        due_date = None if days_past_due is None else self.as_of - timedelta(days=days_past_due)
+        invoice = Invoice.objects.create(client=self.client_user, due_date=due_date)
+        InvoiceItem.objects.create(invoice=invoice, unit_price=Decimal('100'), quantity=1)
+        if paid:
+            invoice.refresh_from_db()
+            amount = invoice.total_amount if paid == 'all' else Decimal(paid)
+            Payment.objects.create(invoice=invoice, amount=amount)
+        invoice = Invoice.objects.get(pk=invoice.pk)
+        if status:
+            invoice.status = status
+            invoice.save(update_fields=['status'])
+        return invoice
+
+    def test_outstanding_amounts_fall_into_days_past_due_buckets(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            current = [self._invoice(None), self._invoice(0)]
+            days_1_30 = [self._invoice(1), self._invoice(30, paid='40')]
+            days_31_60 = [self._invoice(31)]
+            days_90_plus = [self._invoice(91)]
+            self._invoice(45, paid='all')
+            self._invoice(45, status='cancelled')
+
+        for source in ('live', 'summary'):
+            resp = self.api.get(self.url, {'as_of': self.as_of.isoformat(), 'source': source})
+            self.assertEqual(resp.status_code, 200)
+            client, = resp.data['clients']
+            self.assertEqual(client['invoice_count'], 6)
+            self.assertEqual(client['current'], sum(i.pending_amount for i in current))
+            self.assertEqual(client['1_30'], sum(i.pending_amount for i in days_1_30))
+            self.assertEqual(client['31_60'], sum(i.pending_amount for i in days_31_60))
+            self.assertEqual(client['61_90'], Decimal('0'))
+            self.assertEqual(client['90_plus'], sum(i.pending_amount for i in days_90_plus))
+            self.assertEqual(resp.data['totals']['total'], client['total'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PipelineGenerationTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(email='manager@example.com', password='x', type='manager')
+        self.client_user = CustomUser.objects.create_user(email='client@example.com', password='x', type='client')
+        category = ServiceCategory.objects.create(name='Social')
+        service = Service.objects.create(
+            name='Posts', description='', category=category, is_pipeline=True,
+            pipeline_config=[{'prefix': 'post', 'count': 3}],
+        )
+        self.invoice = Invoice.objects.create(client=self.client_user)
+        InvoiceItem.objects.create(invoice=self.invoice, service=service, unit_price=Decimal('50'), quantity=2)
+        Payment.objects.create(invoice=self.invoice, amount=Decimal('100'))
+        self.url = f'/api/invoice/invoices/{self.invoice.pk}/start_pipeline/'
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def test_items_are_created_in_one_insert_and_only_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            first = self.api.post(self.url)
+        inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "kanban_contentitem"')]
+        second = self.api.post(self.url)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data['titles'], [f'post-{i:03d}' for i in range(1, 7)])
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(second.data['created'], 0)
+        self.assertEqual(ContentItem.objects.filter(invoice=self.invoice).count(), 6)
+        self.invoice.refresh_from_db()
+        self.assertIsNotNone(self.invoice.started_at)
+
+    def test_unpaid_invoice_is_rejected(self):
+        Payment.objects.filter(invoice=self.invoice).delete()
+        Invoice.objects.filter(pk=self.invoice.pk).update(status='unpaid')
+
+        resp = self.api.post(self.url)
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(ContentItem.objects.filter(invoice=self.invoice).exists())
+
+    @override_settings(PIPELINE_JOBS_IN_BACKGROUND=False)
+    def test_async_job_reports_progress_until_done(self):
+        with mock.patch('invoice.pipeline.send_job_progress') as progress:
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.api.post(f'{self.url}?async=1')
+
+        self.assertEqual(resp.status_code, 202)
+        job = PipelineJob.objects.get(pk=resp.data['job_id'])
+        self.assertEqual((job.status, job.created_count, job.total), ('done', 6, 6))
+        reported = [(call.args[0].status, call.args[0].created_count) for call in progress.call_args_list]
+        self.assertEqual(reported[-1], ('done', 6))
+        status_resp = self.api.get(resp.data['status_url'])
+        self.assertEqual((status_resp.data['status'], status_resp.data['created']), ('done', 6))
+        self.assertEqual(ContentItem.objects.filter(invoice=self.invoice).count(), 6)
+
+    def test_request_while_a_job_is_running_attaches_to_it(self):
+        running = PipelineJob.objects.create(invoice=self.invoice, status='running')
+
+        resp = self.api.post(f'{self.url}?async=1')
+
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp.data['job_id'], running.pk)
+        self.assertEqual(PipelineJob.objects.filter(invoice=self.invoice).count(), 1)
+
+
+class InvoiceNumberingTests(TestCase):
+    def setUp(self):
+        self.client_user = CustomUser.objects.create_user(email='client@example.com', password='x', type='client')
+        ClientProfile.objects.create(user=self.client_user, company_name='Acme')
+
+    def _expected_number(self, invoice):
+        return f"AC{invoice.pk}{calendar.month_abbr[invoice.date.month].upper()}{str(invoice.date.year)[-2:]}"
+
+    def test_first_invoice_in_an_empty_table_is_numbered_with_its_saved_pk(self):
+        self.assertFalse(Invoice.objects.exists())
+
+        invoice = Invoice.objects.create(client=self.client_user)
+
+        stored = Invoice.objects.get()
+        self.assertEqual(stored.pk, invoice.pk)
+        self.assertEqual(stored.invoice_id, self._expected_number(stored))
+        # Numbered before the INSERT: no follow-up UPDATE in the history.
+        self.assertEqual(stored.history.count(), 1)
+
+    def test_sequential_invoices_get_consecutive_pks(self):
+        invoices = [Invoice.objects.create(client=self.client_user) for _ in range(3)]
+
+        pks = [invoice.pk for invoice in invoices]
+        self.assertEqual(pks, list(range(pks[0], pks[0] + 3)))
+        for invoice in invoices:
+            invoice.refresh_from_db()
+            self.assertEqual(invoice.invoice_id, self._expected_number(invoice))
+
+    def test_reserved_pks_are_not_reused_by_plain_inserts(self):
+        numbered = Invoice.objects.create(client=self.client_user)
+
+        Invoice.objects.bulk_create([Invoice(client=self.client_user, invoice_id='MANUAL')])
+        plain = Invoice.objects.get(invoice_id='MANUAL')
+        after = Invoice.objects.create(client=self.client_user)
+
+        self.assertGreater(plain.pk, numbered.pk)
+        self.assertGreater(after.pk, plain.pk)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class InvoiceTimelineBackfillTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(email='manager@example.com', password='x', type='manager')
+        self.client_user = CustomUser.objects.create_user(email='client@example.com', password='x', type='client')
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def test_backfill_skips_events_recorded_after_the_table_existed(self):
+        invoice = Invoice.objects.create(client=self.client_user)
+        InvoiceItem.objects.create(invoice=invoice, unit_price=Decimal('100'), quantity=1)
+        # An invoice from before the timeline: no events at all.
+        InvoiceEvent.objects.filter(invoice=invoice).delete()
+        payment = Payment.objects.create(invoice=invoice, amount=Decimal('40'))
+
+        resp = self.api.get(f'/api/invoice/invoices/{invoice.pk}/history/')
+        self.assertEqual(resp.status_code, 200)
+        events = InvoiceEvent.objects.filter(invoice=invoice)
+        self.assertEqual(events.filter(type='created').count(), 1)
+        self.assertEqual(events.filter(type='item_added').count(), 1)
+        self.assertEqual([e.meta['payment_id'] for e in events.filter(type='payment')], [payment.pk])
+
+    def test_failed_event_write_is_logged_and_does_not_break_the_caller(self):
+        invoice = Invoice.objects.create(client=self.client_user)
+        event = InvoiceEvent(invoice=invoice, type='payment', title='Payment')
+
+        with mock.patch.object(InvoiceEvent.objects, 'bulk_create', side_effect=DatabaseError('disk full')):
+            with self.assertLogs('invoice.timeline', 'ERROR'):
+                timeline.record(event)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PaymentBulkImportTests(TestCase):
+    url = '/api/invoice/payments/bulk_import/'
+
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(email='manager@example.com', password='x', type='manager')
+        self.client_user = CustomUser.objects.create_user(email='client@example.com', password='x', type='client')
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def _invoice(self):
+        invoice = Invoice.objects.create(client=self.client_user)
+        InvoiceItem.objects.create(invoice=invoice, unit_price=Decimal('100'), quantity=1)
+        return invoice
+
+    def test_payments_are_inserted_together_and_statuses_recomputed_per_invoice(self):
+        settled, partial, untouched = self._invoice(), self._invoice(), self._invoice()
+        rows = [
+            {'invoice': settled.pk, 'amount': '40.00'},
+            {'invoice': settled.pk, 'amount': '60.00', 'reference': 'UTR-1'},
+            {'invoice': partial.pk, 'amount': '30.00'},
+        ]
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.api.post(self.url, {'payments': rows}, format='json')
+        inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "invoice_payment"')]
+
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data['created'], 3)
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            {(c['invoice_id'], c['to_status']) for c in resp.data['status_changes']},
+            {(settled.pk, 'paid'), (partial.pk, 'partially_paid')},
+        )
+        statuses = dict(Invoice.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {settled.pk: 'paid', partial.pk: 'partially_paid', untouched.pk: 'unpaid'})
+        self.assertEqual(InvoiceEvent.objects.filter(type='payment').count(), 3)
+        self.assertEqual(Payment.objects.get(reference='UTR-1').received_by, self.staff)
+
+    def test_an_unknown_invoice_rejects_the_whole_import(self):
+        invoice = self._invoice()
+        rows = [{'invoice': invoice.pk, 'amount': '40.00'}, {'invoice': 999999, 'amount': '10.00'}]
+
+        resp = self.api.post(self.url, {'payments': rows}, format='json')
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn(1, resp.data['errors']['payments'])
+        self.assertFalse(Payment.objects.exists())
+
+
+class RecurringInvoiceGenerationTests(TestCase):
+    def setUp(self):
+        self.client_user = CustomUser.objects.create_user(email='client@example.com', password='x', type='client')
+
+    def _template(self, **fields):
+        template = RecurringInvoice.objects.create(
+            client=self.client_user, start_date=date(2026, 1, 31), gst_percentage=Decimal('10'), **fields
+        )
+        RecurringInvoiceItem.objects.create(
+            recurring_invoice=template, description='Retainer', unit_price=Decimal('100'), quantity=2
+        )
+        return template
+
+    def test_add_months_clamps_to_the_end_of_shorter_months(self):
+        self.assertEqual(add_months(date(2026, 1, 31), 1), date(2026, 2, 28))
+        self.assertEqual(add_months(date(2028, 1, 31), 1), date(2028, 2, 29))
+        self.assertEqual(add_months(date(2026, 1, 31), 2), date(2026, 3, 31))
+        self.assertEqual(add_months(date(2026, 11, 30), 3), date(2027, 2, 28))
+        self.assertEqual(add_months(date(2026, 12, 15), 12), date(2027, 12, 15))
+
+    def test_missed_periods_are_billed_once_each_without_drifting(self):
+        template = self._template()
+
+        result = generate_due_invoices(as_of=date(2026, 4, 15))
+        again = generate_due_invoices(as_of=date(2026, 4, 15))
+
+        self.assertEqual(
+            [invoice.start_date for invoice in result.invoices],
+            [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31)],
+        )
+        self.assertEqual(again.invoices, [])
+        for invoice in Invoice.objects.filter(recurring_invoice=template):
+            self.assertEqual(invoice.total_amount, Decimal('220.00'))
+            self.assertEqual(invoice.gst_amount, Decimal('20.00'))
+            self.assertEqual(list(invoice.items.values_list('unit_price', 'quantity')), [(Decimal('100.00'), 2)])
+        template.refresh_from_db()
+        self.assertEqual((template.periods_billed, template.next_run_date), (3, date(2026, 4, 30)))
+
+    def test_already_billed_periods_are_skipped(self):
+        template = self._template()
+        generate_due_invoices(as_of=date(2026, 2, 1))
+        RecurringInvoice.objects.filter(pk=template.pk).update(periods_billed=0, next_run_date=date(2026, 1, 31))
+
+        result = generate_due_invoices(as_of=date(2026, 2, 1))
+
+        self.assertEqual((len(result.invoices), result.skipped_periods), (0, 1))
+        self.assertEqual(Invoice.objects.filter(recurring_invoice=template).count(), 1)
+
+    def test_template_past_its_end_date_is_deactivated(self):
+        template = self._template(end_date=date(2026, 2, 28))
+
+        result = generate_due_invoices(as_of=date(2026, 6, 1))
+
+        self.assertEqual(len(result.invoices), 2)
+        template.refresh_from_db()
+        self.assertFalse(template.is_active)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class StatementReconciliationTests(TestCase):
+    url = '/api/invoice/payments/reconcile/'
+
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(email='manager@example.com', password='x', type='manager')
+        self.client_user = CustomUser.objects.create_user(email='client@example.com', password='x', type='client')
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def _invoice(self, amount):
+        invoice = Invoice.objects.create(client=self.client_user)
+        InvoiceItem.objects.create(invoice=invoice, unit_price=Decimal(amount), quantity=1)
+        invoice.refresh_from_db()
+        return invoice
+
+    def _upload(self, text):
+        statement = SimpleUploadedFile('statement.csv', text.encode(), content_type='text/csv')
+        return self.api.post(self.url, {'file': statement, 'commit': '1'}, format='multipart')
+
+    def test_reuploading_a_statement_without_references_records_nothing(self):
+        invoice = self._invoice('100')
+        text = f"Date,Narration,Credit\n2026-10-01,NEFT {invoice.invoice_id},40\n"
+
+        first = self._upload(text)
+        second = self._upload(text)
+
+        self.assertEqual(first.data['created'], 1)
+        self.assertEqual(second.data['summary']['duplicate'], 1)
+        self.assertEqual(second.data['created'], 0)
+        self.assertEqual(Payment.objects.filter(invoice=invoice).count(), 1)
+
+    def test_amount_guess_does_not_block_a_line_naming_the_invoice(self):
+        invoice = self._invoice('60')
+        lines = [
+            {'line': 2, 'date': '', 'description': 'transfer', 'reference': '', 'amount': Decimal('60.00')},
+            {'line': 3, 'date': '', 'description': invoice.invoice_id, 'reference': '', 'amount': Decimal('60.00')},
+        ]
+
+        results = list(reconciliation.reconcile(lines))
+
+        self.assertEqual([(r['status'], r.get('method')) for r in results], [('unmatched', None), ('matched', 'exact')])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, INVOICE_PDF_WORKERS=0)
+class InvoicePdfCacheTests(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        settings_override = override_settings(INVOICE_PDF_CACHE_DIR=cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        renderer = mock.patch.object(pdf_worker, 'html_to_pdf', return_value=b'%PDF-1.4 test')
+        self.html_to_pdf = renderer.start()
+        self.addCleanup(renderer.stop)
+
+        self.staff = CustomUser.objects.create_user(email='manager@example.com', password='x', type='manager')
+        self.client_user = CustomUser.objects.create_user(email='client@example.com', password='x', type='client')
+        self.invoice = Invoice.objects.create(client=self.client_user)
+        InvoiceItem.objects.create(invoice=self.invoice, unit_price=Decimal('100'), quantity=1)
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def test_a_new_render_keeps_files_other_requests_were_handed(self):
+        first = pdf.render_invoice_pdf(self.invoice)
+        InvoiceItem.objects.create(invoice=self.invoice, unit_price=Decimal('50'), quantity=1)
+        second = pdf.render_invoice_pdf(self.invoice)
+
+        self.assertNotEqual(first, second)
+        self.assertTrue(os.path.exists(first))
+        self.assertTrue(os.path.exists(second))
+
+    def test_download_renders_again_when_the_cached_file_was_pruned(self):
+        url = f'/api/invoice/invoices/{self.invoice.pk}/generate_pdf/'
+        self.assertEqual(self.api.get(url).status_code, 200)
+        self.assertEqual(pdf.prune_pdf_cache(max_age=0, now=time.time() + 1), 1)
+
+        resp = self.api.get(url)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b''.join(resp.streaming_content), b'%PDF-1.4 test')
+        self.assertEqual(self.html_to_pdf.call_count, 2)
+
+    def test_prune_keeps_recently_served_files(self):
+        stale = pdf.render_invoice_pdf(self.invoice)
+        old = time.time() - pdf.get_cache_max_age() - 60
+        os.utime(stale, (old, old))
+        pdf.open_invoice_pdf(self.invoice).close()
+
+        self.assertEqual(pdf.prune_pdf_cache(), 0)
+        os.utime(stale, (old, old))
+        self.assertEqual(pdf.prune_pdf_cache(), 1)
+        self.assertFalse(os.path.exists(os.path.dirname(stale)))
+
+    def test_zip_export_renders_again_when_a_file_is_pruned_mid_stream(self):
+        iter_invoice_pdfs = pdf.iter_invoice_pdfs
+
+        def pruned_before_zipping(*args, **kwargs):
+            for invoice, path, error in iter_invoice_pdfs(*args, **kwargs):
+                os.unlink(path)
+                yield invoice, path, error
+
+        with mock.patch.object(pdf, 'iter_invoice_pdfs', pruned_before_zipping):
+            archive = b''.join(pdf.stream_invoice_pdfs_zip([self.invoice]))
+
+        with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+            self.assertEqual(zf.namelist(), [pdf.invoice_pdf_filename(self.invoice)])
+            self.assertEqual(zf.read(pdf.invoice_pdf_filename(self.invoice)), b'%PDF-1.4 test')
+
+    def test_job_queued_by_another_process_is_pending_until_it_times_out(self):
+        key, path, _, _ = pdf.prepare_invoice_pdf(self.invoice)
+        pdf._mark_pending(path)
+
+        self.assertEqual(pdf.submit_invoice_pdf(self.invoice), (key, pdf.JOB_PENDING))
+        self.assertEqual(pdf.get_job_status(self.invoice.pk, key), (pdf.JOB_PENDING, None))
+        self.html_to_pdf.assert_not_called()
+
+        lost = time.time() - pdf.get_job_timeout() - 1
+        os.utime(pdf_worker.pending_path(path), (lost, lost))
+        self.assertEqual(pdf.get_job_status(self.invoice.pk, key), (pdf.JOB_MISSING, None))
+
+    def test_failed_job_is_reported_from_its_error_file(self):
+        self.html_to_pdf.side_effect = OSError('no pango')
+
+        key, job_status = pdf.submit_invoice_pdf(self.invoice)
+
+        self.assertEqual(job_status, pdf.JOB_FAILED)
+        self.assertEqual(pdf.get_job_status(self.invoice.pk, key), (pdf.JOB_FAILED, 'no pango'))
+        self.assertFalse(os.path.exists(pdf_worker.pending_path(pdf.cached_pdf_path(self.invoice.pk, key))))
@@ -0,0 +1,155 @@
+"""Invoice timeline events.
+
+Events are appended to `InvoiceEvent` when they happen: `Invoice.save` (created),
+`InvoiceItem.save` / `Invoice.add_items` (item added), `Payment.save` (payment
+and status change) and pipeline start. Invoices created before the table
+existed are backfilled from their payments and items the first time their
+history is read (`ensure_backfilled`), skipping anything already recorded since.
+"""
+import logging
+
+from django.db import transaction
+
+from .models import INVOICE_EVENT_TYPES, Invoice, InvoiceEvent
+
+logger = logging.getLogger(__name__)
+
+EVENT_CREATED = 'created'
+EVENT_ITEM_ADDED = 'item_added'
+EVENT_PAYMENT = 'payment'
+EVENT_STATUS_CHANGED = 'status_changed'
+EVENT_PIPELINE_STARTED = 'pipeline_started'
+
+TITLES = dict(INVOICE_EVENT_TYPES)
+# Meta key identifying the source row of an event, for backfill dedupe.
+SOURCE_KEYS = {EVENT_ITEM_ADDED: 'item_id', EVENT_PAYMENT: 'payment_id'}
+
+
+def user_label(user):
+    if user is None:
+        return None
+    first = (getattr(user, 'first_name', '') or '').strip()
+    last = (getattr(user, 'last_name', '') or '').strip()
+    name = (f"{first} {last}").strip()
+    return name or getattr(user, 'email', None) or getattr(user, 'pk', None)
+
+
+def _event(invoice_id, type, meta, ts=None, actor_id=None):
+    event = InvoiceEvent(invoice_id=invoice_id, type=type, title=TITLES[type], meta=meta, actor_id=actor_id)
+    if ts is not None:
+        event.ts = ts
+    return event
+
+
+def created_event(invoice):
+    creator = invoice.authorized_by if invoice.authorized_by_id else None
+    return _event(
+        invoice.pk,
+        EVENT_CREATED,
+        {
+            "invoice_id": invoice.pk,
+            "invoice_number": invoice.invoice_id,
+            "created_by": user_label(creator),
+            "created_by_id": invoice.authorized_by_id,
+        },
+        ts=invoice.created_at,
+        actor_id=invoice.authorized_by_id,
+    )
+
+
+def item_event(item):
+    return _event(
+        item.invoice_id,
+        EVENT_ITEM_ADDED,
+        {
+            "item_id": item.pk,
+            "service": getattr(item.service, 'name', None) if item.service_id else None,
+            "description": item.description,
+            "unit_price": str(item.unit_price),
+            "quantity": item.quantity,
+        },
+        ts=item.created_at,
+    )
+
+
+def payment_event(payment):
+    return _event(
+        payment.invoice_id,
+        EVENT_PAYMENT,
+        {
+            "payment_id": payment.pk,
+            "amount": str(payment.amount),
+            "reference": payment.reference,
+            "payment_mode": payment.payment_mode.name if payment.payment_mode_id else None,
+            "received_by": user_label(payment.received_by) if payment.received_by_id else None,
+        },
+        ts=payment.paid_at,
+        actor_id=payment.received_by_id,
+    )
+
+
+def status_event(invoice_id, from_status, to_status, actor_id=None):
+    return _event(
+        invoice_id,
+        EVENT_STATUS_CHANGED,
+        {"from_status": from_status, "to_status": to_status},
+        actor_id=actor_id,
+    )
+
+
+def pipeline_event(invoice, created_items):
+    return _event(
+        invoice.pk,
+        EVENT_PIPELINE_STARTED,
+        {"created_items": created_items},
+        ts=invoice.started_at,
+    )
+
+
+def record(*events):
+    """Append events (best-effort: the timeline must never break the write it describes)."""
+    events = [e for e in events if e is not None]
+    if not events:
+        return
+    try:
+        with transaction.atomic():
+            InvoiceEvent.objects.bulk_create(events)
+    except Exception:
+        logger.exception("Could not record %d invoice timeline event(s)", len(events))
+
+
+def ensure_backfilled(invoice):
+    """Build the timeline of an invoice that predates `InvoiceEvent` (once)."""
+    if InvoiceEvent.objects.filter(invoice=invoice, type=EVENT_CREATED).exists():
+        return
+    with transaction.atomic():
+        # Lock the invoice so concurrent first reads don't both backfill.
+        Invoice.objects.select_for_update().filter(pk=invoice.pk).values_list('pk', flat=True).first()
+        if InvoiceEvent.objects.filter(invoice=invoice, type=EVENT_CREATED).exists():
+            return
+        # Items, payments and pipeline starts after the table existed were
+        # recorded as they happened; only synthesize the ones that weren't.
+        recorded = {EVENT_ITEM_ADDED: set(), EVENT_PAYMENT: set(), EVENT_PIPELINE_STARTED: set()}
+        existing = InvoiceEvent.objects.filter(invoice=invoice, type__in=list(recorded)).values_list('type', 'meta')
+        for type, meta in existing:
+            recorded[type].add((meta or {}).get(SOURCE_KEYS.get(type)))
+        events = [created_event(invoice)]
+        items = invoice.items.select_related('service').order_by('created_at', 'id')
+        events += [item_event(it) for it in items if it.pk not in recorded[EVENT_ITEM_ADDED]]
+        payments = invoice.payments.select_related('payment_mode', 'received_by').order_by('paid_at', 'id')
+        events += [payment_event(p) for p in payments if p.pk not in recorded[EVENT_PAYMENT]]
+        if invoice.started_at is not None and not recorded[EVENT_PIPELINE_STARTED]:
+            from kanban.models import ContentItem
+
+            events.append(pipeline_event(invoice, ContentItem.objects.filter(invoice=invoice).count()))
+        InvoiceEvent.objects.bulk_create(events)
+
+
+def serialize(event):
+    return {
+        "id": event.pk,
+        "type": event.type,
+        "title": event.title,
+        "ts": event.ts.isoformat() if event.ts else None,
+        "meta": event.meta,
+    }
@@ -11,6 +11,7 @@ from .views import (
     PaymentModesDropdownView,
     PaymentTermsDropdownView,
     PaidInvoicesDropdownView,
+    RecurringInvoiceViewSet,
 )
 
 router = DefaultRouter()
@@ -18,6 +19,7 @@ router.register(r'invoices', InvoiceViewSet, basename='invoices')
 router.register(r'payment-modes', PaymentModeViewSet, basename='payment-modes')
 router.register(r'payment-terms', PaymentTermViewSet, basename='payment-terms')
 router.register(r'payments', PaymentViewSet, basename='payments')
+router.register(r'recurring-invoices', RecurringInvoiceViewSet, basename='recurring-invoices')
 
 urlpatterns = [
     path('', include(router.urls)),
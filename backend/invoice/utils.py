@@ -1,7 +1,7 @@
 from urllib import request
 from django.template.loader import render_to_string
 from django.utils import timezone
-from invoice.models import BusinessInfo
+from core import cache as reference_cache
 
 def _fmt_money(v):
     try:
@@ -17,7 +17,7 @@ def build_invoice_context(invoice, request=None):
     with `render_invoice_html`.
     """
     # sender/company snapshot fields
-    business = BusinessInfo.objects.first()
+    business = reference_cache.business_info()
     logo_url = None
     if business and business.logo:
         raw_logo = str(business.logo)
@@ -4,51 +4,65 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.template.loader import render_to_string
-from django.http import HttpResponse
-from django.conf import settings
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
+from django.urls import reverse
 from .utils import render_invoice_html, build_invoice_context
-
-from .models import Invoice, PaymentMode, PaymentTerm, BusinessInfo, Payment, INVOICE_STATUS
+from .aging import aging_report, aging_report_from_summary
+from .pipeline import PipelineError, enqueue_pipeline_job, job_payload, start_pipeline as start_invoice_pipeline
+from .exports import iter_invoices_csv, iter_payments_csv
+from .payments import import_payments
+from .recurring import generate_due_invoices
+from .pdf import (
+    open_invoice_pdf,
+    open_job_pdf,
+    submit_invoice_pdf,
+    get_job_status,
+    stream_invoice_pdfs_zip,
+    InvoicePdfError,
+    JOB_DONE,
+    JOB_FAILED,
+    JOB_MISSING,
+)
+
+from .models import Invoice, InvoiceEvent, PaymentMode, PaymentTerm, BusinessInfo, Payment, PipelineJob, INVOICE_STATUS
+from .models import RecurringInvoice
+from . import reconciliation, timeline
 from core.models import CustomUser, ClientProfile
 from .serializers import InvoiceSerializer, PaymentModeSerializer, PaymentTermSerializer, BusinessInfoSerializer, PaymentSerializer
+from .serializers import PaymentImportSerializer, RecurringInvoiceSerializer
 from core.permissions import IsOwnerOrAdmin
 from rest_framework import mixins
 from rest_framework import routers
 from rest_framework.viewsets import GenericViewSet
-from kanban.models import ContentItem
-from core.pagination import StandardResultsSetPagination
-from django.db.models import Q
+from core.pagination import StandardResultsSetPagination, KeysetPagination, KeysetPaginationOptInMixin
+from core import cache as reference_cache
+from core import search as search_index
+import csv
 from datetime import timedelta
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def _csv_response(rows, name):
+    stamp = timezone.localdate().strftime('%Y%m%d')
+    response = StreamingHttpResponse(rows, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename={name}_{stamp}.csv'
+    return response
 
 
-def _get_system_user():
-    email = getattr(settings, "SYSTEM_USER_EMAIL", None) or "system@tarviz.local"
-    user = CustomUser.objects.filter(email=email).first()
-    if user:
-        return user
-
-    user = CustomUser(
-        email=email,
-        first_name="System",
-        last_name="User",
-        type="superadmin",
-        is_staff=True,
-        is_superuser=True,
-    )
-    try:
-        user.set_unusable_password()
-    except Exception:
-        pass
-    user.save()
-    return user
-
-class InvoiceViewSet(viewsets.ModelViewSet):
+class InvoiceViewSet(KeysetPaginationOptInMixin, viewsets.ModelViewSet):
     queryset = Invoice.objects.all().select_related('client', 'authorized_by').prefetch_related('items__service')
     serializer_class = InvoiceSerializer
     pagination_class = StandardResultsSetPagination
+    # ?pagination=cursor switches to keyset pages on the (-date, -id) index.
+    keyset_ordering = ('-date', '-id')
     # permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        # Paid/pending and the pipeline flag are computed in SQL so list pages
+        # don't query payments/items per row.
+        return super().get_queryset().with_balances().with_pipeline_flag()
+
     def create(self, request, *args, **kwargs):
         """Create an invoice and record the creator in authorized_by."""
         serializer = self.get_serializer(data=request.data)
@@ -58,22 +72,18 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             return Response({"success": True, "invoice": InvoiceSerializer(invoice).data}, status=status.HTTP_201_CREATED)
         return Response({"success": False, "errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
-    def list(self, request, *args, **kwargs):
-        """List invoices - clients see only their own invoices, staff see all"""
+    def filter_list_queryset(self, request, queryset):
+        """Apply the list endpoint's visibility, search and filter query params.
+
+        Shared by `list` and the export actions so they select the same invoices.
+        """
         if request.user.type == 'client':
-            queryset = self.get_queryset().filter(client=request.user)
-        else:
-            queryset = self.get_queryset()
+            queryset = queryset.filter(client=request.user)
 
         search = (request.query_params.get('search') or request.query_params.get('q') or '').strip()
         if search:
-            queryset = queryset.filter(
-                Q(invoice_id__icontains=search)
-                | Q(client__first_name__icontains=search)
-                | Q(client__last_name__icontains=search)
-                | Q(client__email__icontains=search)
-                | Q(client__profile__company_name__icontains=search)
-            ).distinct()
+            # Indexed lookup on the denormalized search documents (see core.search).
+            queryset = search_index.filter_queryset(queryset, search_index.KIND_INVOICE, search)
 
         # Filters (backend-driven)
         status_value = request.query_params.get('status') or None
@@ -102,7 +112,20 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             except Exception:
                 pass
 
-        queryset = queryset.order_by('-date', '-id')
+        if search and request.query_params.get('ordering') == 'relevance':
+            queryset = search_index.annotate_rank(queryset, search_index.KIND_INVOICE, search)
+            return search_index.order_by_rank(queryset, '-date', '-id')
+        return queryset.order_by('-date', '-id')
+
+    def list(self, request, *args, **kwargs):
+        """List invoices - clients see only their own invoices, staff see all"""
+        if self.use_keyset_pagination() and request.query_params.get('ordering') == 'relevance':
+            # Cursors follow (-date, -id); rank order can't be resumed from one.
+            return Response(
+                {"success": False, "error": "ordering=relevance can't be combined with cursor pagination"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        queryset = self.filter_list_queryset(request, self.get_queryset())
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -124,22 +147,36 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(invoice)
         return Response({"success": True, "invoice": serializer.data})
 
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get', 'post'])
     def generate_pdf(self, request, pk=None):
-        """Generate PDF invoice and return as downloadable file"""
+        """Generate PDF invoice and return as downloadable file.
+
+        With `?async=1` the render is queued on the PDF worker pool instead and a
+        job id is returned; poll `pdf_jobs/<job_id>/` for status and the file.
+        """
         invoice = self.get_object()
         if request.user.type == 'client' and invoice.client != request.user:
             return Response({"success": False, "error": "You don't have permission to download this invoice"}, status=status.HTTP_403_FORBIDDEN)
 
-        html = render_invoice_html(invoice, request=request, template_name='invoice.html')
+        if str(request.query_params.get('async') or '').lower() in ('1', 'true', 'yes'):
+            job_id, job_status = submit_invoice_pdf(invoice, request=request)
+            return Response(
+                {
+                    "success": job_status != JOB_FAILED,
+                    "job_id": job_id,
+                    "status": job_status,
+                    "status_url": request.build_absolute_uri(
+                        reverse('invoices-pdf-job', kwargs={'pk': invoice.pk, 'job_id': job_id})
+                    ),
+                },
+                status=status.HTTP_202_ACCEPTED,
+            )
 
-        # base_url is important so relative URLs (if any) resolve correctly.
-        base_url = request.build_absolute_uri('/') if request is not None else str(settings.BASE_DIR)
+        # Rendered PDFs are cached on disk keyed by the invoice context, so repeat
+        # downloads skip WeasyPrint entirely.
         try:
-            from weasyprint import HTML
-
-            pdf_bytes = HTML(string=html, base_url=base_url).write_pdf()
-        except Exception:
+            pdf_file = open_invoice_pdf(invoice, request=request)
+        except InvoicePdfError:
             return Response(
                 {
                     "success": False,
@@ -154,10 +191,103 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 status=500,
             )
 
-        response = HttpResponse(pdf_bytes, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename=invoice_{invoice.invoice_id}.pdf'
+        return FileResponse(
+            pdf_file,
+            as_attachment=True,
+            filename=f'invoice_{invoice.invoice_id}.pdf',
+            content_type='application/pdf',
+        )
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream invoices (with SQL-computed balances) as CSV, using the list filters."""
+        queryset = self.filter_list_queryset(request, Invoice.objects.all())
+        return _csv_response(iter_invoices_csv(queryset), 'invoices')
+
+    @action(detail=False, methods=['get'])
+    def aging(self, request):
+        """Accounts-receivable aging: per-client outstanding totals by days past due.
+
+        Query params: `as_of` (YYYY-MM-DD, default today), `client_id` (staff only),
+        `source=summary` to read the materialized `ClientReceivableSummary`.
+        """
+        as_of = timezone.localdate()
+        if request.query_params.get('as_of'):
+            as_of = parse_date(request.query_params['as_of'])
+            if as_of is None:
+                return Response(
+                    {"success": False, "error": "as_of must be a date (YYYY-MM-DD)"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        client_ids = None
+        if request.user.type == 'client':
+            client_ids = [request.user.pk]
+        elif request.query_params.get('client_id') not in (None, '', 'All'):
+            try:
+                client_ids = [int(request.query_params['client_id'])]
+            except (TypeError, ValueError):
+                return Response(
+                    {"success": False, "error": "client_id must be an integer"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        if request.query_params.get('source') == 'summary':
+            report = aging_report_from_summary(as_of, client_ids=client_ids)
+        else:
+            queryset = Invoice.objects.all()
+            if client_ids is not None:
+                queryset = queryset.filter(client_id__in=client_ids)
+            report = aging_report(as_of, queryset=queryset)
+        return Response({"success": True, **report})
+
+    @action(detail=False, methods=['get'])
+    def export_pdfs(self, request):
+        """Stream a ZIP of invoice PDFs selected with the same filters as `list`.
+
+        PDFs render in parallel on the worker pool and are written to the archive
+        as they complete, so memory use doesn't grow with the number of invoices.
+        """
+        queryset = self.filter_list_queryset(request, self.get_queryset())
+        stamp = timezone.localdate().strftime('%Y%m%d')
+        response = StreamingHttpResponse(
+            stream_invoice_pdfs_zip(queryset.iterator(chunk_size=100), request=request),
+            content_type='application/zip',
+        )
+        response['Content-Disposition'] = f'attachment; filename=invoices_{stamp}.zip'
         return response
 
+    @action(detail=True, methods=['get'], url_path=r'pdf_jobs/(?P<job_id>[0-9a-f]{64})')
+    def pdf_job(self, request, pk=None, job_id=None):
+        """Status of an async PDF render; `?download=1` returns the PDF once done."""
+        invoice = self.get_object()
+        if request.user.type == 'client' and invoice.client != request.user:
+            return Response({"success": False, "error": "You don't have permission to download this invoice"}, status=status.HTTP_403_FORBIDDEN)
+
+        job_status, detail = get_job_status(invoice.pk, job_id)
+        if job_status == JOB_DONE and str(request.query_params.get('download') or '').lower() in ('1', 'true', 'yes'):
+            try:
+                pdf_file = open_job_pdf(invoice, job_id, request=request)
+            except InvoicePdfError:
+                pdf_file, job_status = None, JOB_FAILED
+            if pdf_file is not None:
+                return FileResponse(
+                    pdf_file,
+                    as_attachment=True,
+                    filename=f'invoice_{invoice.invoice_id}.pdf',
+                    content_type='application/pdf',
+                )
+            if job_status == JOB_DONE:
+                # Pruned, and the invoice has changed since the job was submitted.
+                job_status = JOB_MISSING
+
+        body = {"success": job_status not in (JOB_FAILED, JOB_MISSING), "job_id": job_id, "status": job_status}
+        if job_status == JOB_FAILED:
+            body["errors"] = {"error": "PDF generation failed."}
+        if job_status == JOB_MISSING:
+            return Response(body, status=status.HTTP_404_NOT_FOUND)
+        return Response(body)
+
     @action(detail=True, methods=['get'])
     def preview(self, request, pk=None):
         """Return invoice preview data and rendered HTML for frontend preview."""
@@ -176,93 +306,58 @@ class InvoiceViewSet(viewsets.ModelViewSet):
 
         Idempotent: re-calling will only create missing items.
         Now respects invoice item quantity, and allows partially paid invoices too.
+        With `?async=1` generation runs as a background `PipelineJob` that emits
+        `pipeline_progress` websocket events; poll `pipeline_jobs/<job_id>/`.
         """
         invoice = self.get_object()
+        user = request.user if request.user.is_authenticated else None
 
-        # Allow starting for "paid" or "partially_paid" invoices
-        if invoice.status not in ['paid', 'partially_paid']:
-            return Response(
-                {"success": False, "error": "Pipeline can only be started for paid or partially paid invoices."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        items = invoice.items.select_related('service').all()
-        pipeline_items = [it for it in items if getattr(it.service, 'is_pipeline', False)]
-        if not pipeline_items:
+        if str(request.query_params.get('async') or '').lower() in ('1', 'true', 'yes'):
+            try:
+                job, _ = enqueue_pipeline_job(invoice, requested_by=user)
+            except PipelineError as exc:
+                return Response({"success": False, "error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
             return Response(
-                {"success": False, "error": "No pipeline services found on this invoice."},
-                status=status.HTTP_400_BAD_REQUEST,
+                {
+                    "success": True,
+                    **job_payload(job),
+                    "status_url": reverse('invoices-pipeline-job', kwargs={'pk': invoice.pk, 'job_id': job.pk}),
+                },
+                status=status.HTTP_202_ACCEPTED,
             )
 
-        created = 0
-        created_titles = []
-        for it in pipeline_items:
-            svc = it.service
-            config = getattr(svc, 'pipeline_config', None) or []
-            if not isinstance(config, list):
-                continue
-
-            quantity = int(getattr(it, 'quantity', 1) or 1)
-
-            for entry in config:
-                if not isinstance(entry, dict):
-                    continue
-                prefix = (entry.get('prefix') or '').strip()
-                try:
-                    base_count = int(entry.get('count') or 0)
-                except Exception:
-                    base_count = 0
-                if not prefix or base_count <= 0:
-                    continue
-
-                # Total items to create = base_count * quantity
-                total_count = base_count * quantity
-                titles = [f"{prefix}-{i:03d}" for i in range(1, total_count + 1)]
-
-                existing = set(
-                    ContentItem.objects.filter(
-                        invoice=invoice,
-                        service=svc,
-                        title__in=titles,
-                    ).values_list('title', flat=True)
-                )
-
-                for title in titles:
-                    if title in existing:
-                        continue
-                    ContentItem.objects.create(
-                        title=title,
-                        client=invoice.client,
-                        service=svc,
-                        invoice=invoice,
-                        created_by=_get_system_user(),
-                        due_date=invoice.start_date or None,
-                        platforms=(getattr(svc, 'platforms', None) or []),
-                    )
-                    created += 1
-                    created_titles.append(title)
-
-        # Mark invoice as started (first time only).
-        if invoice.started_at is None:
-            try:
-                invoice.started_at = timezone.now()
-                invoice.save(update_fields=["started_at"])
-            except Exception:
-                # best-effort
-                pass
+        try:
+            created_items = start_invoice_pipeline(invoice, history_user=user)
+        except PipelineError as exc:
+            return Response({"success": False, "error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response(
             {
                 "success": True,
-                "created": created,
-                "titles": created_titles,
+                "created": len(created_items),
+                "titles": [item.title for item in created_items],
             },
             status=status.HTTP_200_OK,
         )
 
+    @action(detail=True, methods=['get'], url_path=r'pipeline_jobs/(?P<job_id>[0-9]+)')
+    def pipeline_job(self, request, pk=None, job_id=None):
+        """Status and progress of a background pipeline job."""
+        invoice = self.get_object()
+        if request.user.type == 'client' and invoice.client != request.user:
+            return Response({"success": False, "error": "You don't have permission to view this invoice"}, status=status.HTTP_403_FORBIDDEN)
+        job = PipelineJob.objects.filter(pk=job_id, invoice=invoice).first()
+        if job is None:
+            return Response({"success": False, "error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"success": True, **job_payload(job)})
+
     @action(detail=True, methods=['get'])
     def history(self, request, pk=None):
-        """Return a timeline for an invoice including who created it."""
+        """Return a timeline for an invoice including who created it.
+
+        Reads the precomputed `InvoiceEvent` rows oldest first. `?pagination=cursor`
+        (with `page_size`) pages them; follow `next` for the rest.
+        """
         invoice = self.get_object()
 
         if request.user.type == 'client' and invoice.client != request.user:
@@ -271,90 +366,19 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        # Payments
-        payments_qs = invoice.payments.select_related('payment_mode', 'received_by').order_by('paid_at', 'id')
-        payments = PaymentSerializer(payments_qs, many=True).data
-
-        # Pipeline info
-        pipeline_started_at = getattr(invoice, 'started_at', None)
-        pipeline_started = pipeline_started_at is not None
-        pipeline_created_count = 0
-        if pipeline_started:
-            try:
-                pipeline_created_count = ContentItem.objects.filter(invoice=invoice).count()
-            except Exception:
-                pipeline_created_count = 0
-
-        events = []
-
-        created_at = getattr(invoice, 'created_at', None)
-        creator = getattr(invoice, 'authorized_by', None)
-        creator_label = None
-        if creator is not None:
-            first = (getattr(creator, 'first_name', '') or '').strip()
-            last = (getattr(creator, 'last_name', '') or '').strip()
-            name = (f"{first} {last}").strip()
-            creator_label = name or getattr(creator, 'email', None) or str(getattr(creator, 'pk', ''))
-
-        events.append(
-            {
-                "type": "created",
-                "title": "Invoice created",
-                "ts": created_at.isoformat() if created_at else None,
-                "meta": {
-                    "invoice_id": invoice.pk,
-                    "invoice_number": invoice.invoice_id,
-                    "created_by": creator_label,
-                    "created_by_id": getattr(creator, 'pk', None) if creator is not None else None,
-                },
-            }
-        )
-
-        for p in payments:
-            received_by = None
-            try:
-                rb = p.get('received_by')
-                if isinstance(rb, dict):
-                    first = (rb.get('first_name') or '').strip()
-                    last = (rb.get('last_name') or '').strip()
-                    name = (f"{first} {last}").strip()
-                    received_by = name or rb.get('email') or rb.get('id')
-                else:
-                    received_by = rb
-            except Exception:
-                received_by = None
-
-            events.append(
-                {
-                    "type": "payment",
-                    "title": "Payment recorded",
-                    "ts": p.get('paid_at'),
-                    "meta": {
-                        "payment_id": p.get('id'),
-                        "amount": str(p.get('amount')),
-                        "reference": p.get('reference'),
-                        "payment_mode": (p.get('payment_mode_detail') or {}).get('name') if isinstance(p.get('payment_mode_detail'), dict) else None,
-                        "received_by": received_by,
-                    },
-                }
-            )
-
-        if pipeline_started:
-            events.append(
-                {
-                    "type": "pipeline_started",
-                    "title": "Pipeline started",
-                    "ts": pipeline_started_at.isoformat() if pipeline_started_at else None,
-                    "meta": {
-                        "created_items": pipeline_created_count,
-                    },
-                }
-            )
-
-        def _sort_key(e):
-            return (e.get('ts') is None, e.get('ts') or '')
-
-        events = sorted(events, key=_sort_key)
+        # Legacy invoices get their timeline built once, on first read.
+        timeline.ensure_backfilled(invoice)
+        events_qs = InvoiceEvent.objects.filter(invoice=invoice).order_by('ts', 'id')
+
+        extra = {}
+        if request.query_params.get('pagination') == 'cursor' or 'cursor' in request.query_params:
+            paginator = KeysetPagination()
+            paginator.ordering = ('ts', 'id')
+            page = paginator.paginate_queryset(events_qs, request)
+            events = [timeline.serialize(e) for e in page]
+            extra = {"next": paginator.get_next_link(), "cursor": paginator.next_cursor}
+        else:
+            events = [timeline.serialize(e) for e in events_qs]
 
         return Response(
             {
@@ -367,6 +391,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                     "status": getattr(invoice, 'status', None),
                 },
                 "events": events,
+                **extra,
             },
             status=status.HTTP_200_OK,
         )
@@ -389,7 +414,7 @@ class SenderInfoView(APIView):
     # permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        bi = BusinessInfo.objects.order_by('-created_at').first()
+        bi = reference_cache.business_info()
         if not bi:
             return Response({'detail': 'No sender info configured'}, status=404)
         return Response(BusinessInfoSerializer(bi).data)
@@ -422,23 +447,7 @@ class ClientsDropdownView(APIView):
     # permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        qs = CustomUser.objects.filter(type="client").values(
-            "id",
-            "first_name",
-            "last_name",
-            "email",
-            "profile__company_name",
-        )
-        data = []
-        for row in qs:
-            company_name = row.get("profile__company_name")
-            if company_name:
-                name = company_name
-            else:
-                full_name = f"{row.get('first_name') or ''} {row.get('last_name') or ''}".strip()
-                name = full_name or row.get("email") or str(row.get("id"))
-            data.append({"id": row.get("id"), "name": name})
-        return Response(data)
+        return Response(reference_cache.client_choices())
 
 
 class PaidInvoicesDropdownView(APIView):
@@ -492,23 +501,175 @@ class PaymentModesDropdownView(APIView):
     # permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        items = PaymentMode.objects.all().values('id', 'name')
-        return Response(list(items))
+        return Response(reference_cache.payment_modes())
 
 
 class PaymentTermsDropdownView(APIView):
     # permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        items = PaymentTerm.objects.all().values('id', 'name')
-        return Response(list(items))
+        return Response(reference_cache.payment_terms())
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(KeysetPaginationOptInMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all().select_related('invoice', 'payment_mode', 'received_by')
     serializer_class = PaymentSerializer
+    # Unpaginated by default; ?pagination=cursor pages on the (-created_at, -id) index.
+    keyset_ordering = ('-created_at', '-id')
     # permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
         serializer.save(received_by=self.request.user)
 
+    @action(detail=False, methods=['post'])
+    def bulk_import(self, request):
+        """Record many payments (across invoices) in one transaction.
+
+        Body: `{"payments": [{"invoice": <pk>, "amount": "100.00", "payment_mode": <pk>, "reference": "..."}]}`.
+        Invoice statuses are recomputed once per invoice.
+        """
+        if request.user.type == 'client':
+            return Response({"success": False, "error": "Only staff can import payments"}, status=status.HTTP_403_FORBIDDEN)
+        serializer = PaymentImportSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"success": False, "errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        payments, changes = import_payments(serializer.validated_data['payments'], received_by=request.user)
+        return Response(
+            {
+                "success": True,
+                "created": len(payments),
+                "payment_ids": [p.pk for p in payments],
+                "status_changes": [
+                    {k: c[k] for k in ('invoice_id', 'from_status', 'to_status')} for c in changes
+                ],
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=False, methods=['post'])
+    def reconcile(self, request):
+        """Match a CSV bank statement (multipart `file`) against open invoices.
+
+        Returns one result per credit line (matched / unmatched / duplicate).
+        With `commit=1`, payments are created in bulk for the exact, normalized
+        and client+amount matches (amount-only matches are only proposed);
+        `payment_mode` (pk) is applied to every created payment.
+        """
+        if request.user.type == 'client':
+            return Response({"success": False, "error": "Only staff can reconcile statements"}, status=status.HTTP_403_FORBIDDEN)
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"success": False, "error": "file is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        payment_mode = request.data.get('payment_mode') or None
+        if payment_mode is not None:
+            try:
+                payment_mode = PaymentMode.objects.get(pk=int(payment_mode)).pk
+            except (ValueError, TypeError, PaymentMode.DoesNotExist):
+                return Response({"success": False, "error": "Invalid payment_mode"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = list(reconciliation.reconcile(reconciliation.read_uploaded_statement(upload)))
+        except (reconciliation.StatementError, csv.Error) as exc:
+            return Response({"success": False, "error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        summary = {"lines": len(results), "matched": 0, "unmatched": 0, "duplicate": 0, "methods": {}}
+        for result in results:
+            summary[result['status']] += 1
+            if result['status'] == 'matched':
+                summary['methods'][result['method']] = summary['methods'].get(result['method'], 0) + 1
+
+        data = {"success": True, "summary": summary, "results": results}
+        if str(request.data.get('commit', '')).lower() in ('1', 'true', 'yes'):
+            payments, changes = reconciliation.commit_matches(results, received_by=request.user, payment_mode=payment_mode)
+            data.update(
+                created=len(payments),
+                payment_ids=[p.pk for p in payments],
+                status_changes=[{k: c[k] for k in ('invoice_id', 'from_status', 'to_status')} for c in changes],
+            )
+        return Response(data, status=status.HTTP_201_CREATED if data.get('created') else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream payments as CSV.
+
+        Filters: `invoice`, `client_id`, `start_date`/`end_date` (on `paid_at` date).
+        """
+        queryset = Payment.objects.all()
+        if request.user.type == 'client':
+            queryset = queryset.filter(invoice__client=request.user)
+
+        invoice_id = request.query_params.get('invoice') or None
+        client_id = request.query_params.get('client_id') or request.query_params.get('client') or None
+        start_date = request.query_params.get('start_date') or request.query_params.get('date_start') or None
+        end_date = request.query_params.get('end_date') or request.query_params.get('date_end') or None
+
+        if invoice_id:
+            try:
+                queryset = queryset.filter(invoice_id=int(invoice_id))
+            except Exception:
+                pass
+        if client_id and client_id != 'All' and request.user.type != 'client':
+            try:
+                queryset = queryset.filter(invoice__client_id=int(client_id))
+            except Exception:
+                pass
+        if start_date:
+            try:
+                queryset = queryset.filter(paid_at__date__gte=start_date)
+            except Exception:
+                pass
+        if end_date:
+            try:
+                queryset = queryset.filter(paid_at__date__lte=end_date)
+            except Exception:
+                pass
+
+        return _csv_response(iter_payments_csv(queryset.order_by('paid_at', 'id')), 'payments')
+
+
+class RecurringInvoiceViewSet(viewsets.ModelViewSet):
+    """Recurring invoice templates (monthly retainers etc.), see invoice.recurring."""
+    queryset = RecurringInvoice.objects.all().select_related('client', 'payment_term').prefetch_related('items__service')
+    serializer_class = RecurringInvoiceSerializer
+    pagination_class = StandardResultsSetPagination
+    # permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = super().get_queryset().order_by('next_run_date', 'id')
+        if self.request.user.type == 'client':
+            return queryset.filter(client=self.request.user)
+        client_id = self.request.query_params.get('client_id') or None
+        if client_id and client_id != 'All':
+            try:
+                queryset = queryset.filter(client_id=int(client_id))
+            except Exception:
+                pass
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(authorized_by=self.request.user)
+
+    @action(detail=False, methods=['post'])
+    def generate(self, request):
+        """Generate invoices for all due templates now (what the scheduled command does).
+
+        Optional `as_of` (YYYY-MM-DD, default today) bills periods starting on or before it.
+        """
+        if request.user.type == 'client':
+            return Response({"success": False, "error": "Only staff can generate invoices"}, status=status.HTTP_403_FORBIDDEN)
+        as_of = request.data.get('as_of') or request.query_params.get('as_of')
+        if as_of:
+            as_of = parse_date(str(as_of))
+            if as_of is None:
+                return Response({"success": False, "error": "as_of must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = generate_due_invoices(as_of=as_of, history_user=request.user)
+        return Response({
+            "success": True,
+            "templates": result.templates,
+            "created": len(result.invoices),
+            "skipped_periods": result.skipped_periods,
+            "invoice_ids": [inv.pk for inv in result.invoices],
+        })
@@ -0,0 +1,190 @@
+"""Content item activity feed rendered from django-simple-history rows.
+
+Each entry describes one history row by diffing it against the item's
+previous row. Pages are read newest first by `history_id`: one query fetches
+the page's ids plus the id just below it, which is the baseline for the
+oldest entry's diff. History rows never change, so a rendered entry is cached
+under its own and its predecessor's `history_id`. Only rows missing from the
+cache are loaded and diffed. Cached entries hold the user's id, not their
+name: names are looked up for each response (one query), so a renamed user
+shows up at once. `activity_entries` renders the whole history the same way,
+for callers that don't page.
+"""
+from typing import Any
+
+from django.core.cache import cache
+
+from core.models import CustomUser
+
+from .models import APPROVAL_STATUS, KANBAN_COLUMNS
+
+ACTIVITY_PAGE_SIZE = 50
+ACTIVITY_MAX_PAGE_SIZE = 200
+ACTIVITY_CACHE_TIMEOUT = 60 * 60 * 24
+# Bump when the wording of entries changes so cached renders are dropped.
+ACTIVITY_CACHE_VERSION = 2
+
+TRACKED_FIELDS = [
+    "title",
+    "column",
+    "priority",
+    "due_date",
+    "assigned_to_id",
+    "approval_status",
+    "revise_requested",
+    "revise_count",
+    "post_action",
+    "scheduled_at",
+    "posted_at",
+    "invoice_id",
+    "service_id",
+]
+
+COLUMN_LABELS = dict(KANBAN_COLUMNS)
+APPROVAL_LABELS = dict(APPROVAL_STATUS)
+
+
+def format_user(u: Any) -> str:
+    # Only show "System" when the change was made without a user context
+    # (e.g., background tasks).
+    if not u:
+        return "System"
+    try:
+        first_name = (getattr(u, "first_name", "") or "").strip()
+        if first_name:
+            return first_name
+        email = (getattr(u, "email", "") or "").strip()
+        if email:
+            return email
+        return str(getattr(u, "pk", "")) or "User"
+    except Exception:
+        return "User"
+
+
+def _get_val(obj: Any, field: str):
+    try:
+        return getattr(obj, field)
+    except Exception:
+        return None
+
+
+def describe_change(current: Any, previous: Any) -> str:
+    # history_type: + created, ~ changed, - deleted
+    ht = getattr(current, "history_type", "~")
+    if ht == "+":
+        return "Created the task"
+    if ht == "-":
+        return "Deleted the task"
+
+    changes = {}
+    if previous is not None:
+        for f in TRACKED_FIELDS:
+            a = _get_val(current, f)
+            b = _get_val(previous, f)
+            if a != b:
+                changes[f] = (b, a)
+
+    # Prefer meaningful summaries
+    if "column" in changes:
+        new_col = changes["column"][1]
+        return f"Moved to {COLUMN_LABELS.get(new_col, new_col)}"
+    if "approval_status" in changes:
+        new_val = changes["approval_status"][1]
+        return f"Approval status set to {APPROVAL_LABELS.get(new_val, new_val)}"
+    if "assigned_to_id" in changes:
+        return "Updated assignee"
+    if "scheduled_at" in changes:
+        new_dt = changes["scheduled_at"][1]
+        if new_dt:
+            try:
+                return f"Scheduled for {new_dt.isoformat()}"
+            except Exception:
+                return "Scheduled"
+        return "Removed schedule"
+    if "revise_requested" in changes and changes["revise_requested"][1] is True:
+        return "Requested revision"
+    if changes:
+        # Generic but still helpful
+        fields = ", ".join(list(changes.keys())[:3])
+        extra = "" if len(changes) <= 3 else f" (+{len(changes) - 3} more)"
+        return f"Updated {fields}{extra}"
+    return "Updated the task"
+
+
+def render_entry(current: Any, previous: Any) -> dict:
+    """Cacheable entry; `with_user_names` swaps `user_id` for the display name."""
+    return {
+        "id": str(current.history_id),
+        "user_id": getattr(current, "history_user_id", None),
+        "action": describe_change(current, previous),
+        "timestamp": current.history_date.isoformat() if getattr(current, "history_date", None) else "",
+    }
+
+
+def with_user_names(entries):
+    user_ids = {entry["user_id"] for entry in entries if entry["user_id"]}
+    users = CustomUser.objects.only("pk", "first_name", "email").in_bulk(user_ids) if user_ids else {}
+    return [
+        {
+            "id": entry["id"],
+            "user": format_user(users.get(entry["user_id"])),
+            "action": entry["action"],
+            "timestamp": entry["timestamp"],
+        }
+        for entry in entries
+    ]
+
+
+def _cache_key(history_id, previous_id):
+    return f"kanban_activity:v{ACTIVITY_CACHE_VERSION}:{history_id}:{previous_id or 0}"
+
+
+def _render(item, ids, count=None):
+    """Entries for the first `count` of `ids` (newest first, default all).
+
+    The id after each one is its diff baseline; a rendered id with none after
+    it is the item's oldest row.
+    """
+    page = ids[:count] if count is not None else ids
+    previous_of = {hid: (ids[i + 1] if i + 1 < len(ids) else None) for i, hid in enumerate(page)}
+    keys = {hid: _cache_key(hid, previous_of[hid]) for hid in page}
+    cached = cache.get_many(list(keys.values()))
+    missing = [hid for hid in page if keys[hid] not in cached]
+    if missing:
+        needed = set(missing) | {previous_of[hid] for hid in missing if previous_of[hid]}
+        rows = {
+            row.history_id: row
+            for row in item.history.filter(history_id__in=needed)
+        }
+        rendered = {}
+        for hid in missing:
+            previous_id = previous_of[hid]
+            rendered[keys[hid]] = render_entry(rows[hid], rows.get(previous_id) if previous_id else None)
+        cache.set_many(rendered, ACTIVITY_CACHE_TIMEOUT)
+        cached.update(rendered)
+    return with_user_names([cached[keys[hid]] for hid in page])
+
+
+def _history_ids(history):
+    return history.order_by("-history_id").values_list("history_id", flat=True)
+
+
+def activity_entries(item):
+    """The item's whole history, newest first."""
+    return _render(item, list(_history_ids(item.history.all())))
+
+
+def activity_page(item, before=None, page_size=ACTIVITY_PAGE_SIZE):
+    """Return `(entries, next_before)` for the item's history, newest first.
+
+    `before` is a `history_id` cursor (entries strictly older are returned);
+    `next_before` is the cursor for the following page, or None at the start.
+    """
+    history = item.history.all()
+    if before is not None:
+        history = history.filter(history_id__lt=before)
+    # The extra id is the diff baseline of the page's oldest row and tells
+    # whether another page follows.
+    ids = list(_history_ids(history)[: page_size + 1])
+    next_before = ids[page_size - 1] if len(ids) > page_size else None
+    return _render(item, ids, page_size), next_before
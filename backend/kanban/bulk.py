@@ -0,0 +1,131 @@
+"""Bulk move / assign / schedule for content items.
+
+The single-item actions save, write a history row and send a websocket event
+and push notification per card. Here the whole selection is written with one
+`bulk_update` plus one bulk history insert, in one transaction. After commit,
+one `content_items_bulk_updated` event goes to each affected client, and each
+recipient gets a single push summarizing their cards.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from core.notifications import FcmMessage, notify_users
+
+from .models import KANBAN_COLUMNS, ContentItem, next_sync_revision
+from .ws import send_to_client_and_user
+
+BULK_MAX_ITEMS = 200
+BULK_EVENT = "content_items_bulk_updated"
+
+
+def _apply(items, user, fields, action, summary):
+    """Save `fields` of the already-modified `items` in bulk and emit coalesced events."""
+    from simple_history.utils import bulk_update_with_history
+
+    now = timezone.now()
+    with transaction.atomic():
+        # bulk_update skips auto_now and ContentItem.save; delta sync
+        # (`changes`) needs the new revision, one for the whole selection.
+        revision = next_sync_revision()
+        for item in items:
+            item.updated_at = now
+            item.sync_revision = revision
+        bulk_update_with_history(
+            items, ContentItem, list(fields) + ["updated_at", "sync_revision"], default_user=user
+        )
+        transaction.on_commit(lambda: emit_bulk_events(items, user, fields, action, summary))
+    return items
+
+
+def emit_bulk_events(items, user, fields, action, summary):
+    """One websocket event per client and one push per recipient for a bulk change."""
+    by_client = {}
+    by_recipient = {}
+    for item in items:
+        by_client.setdefault(item.client_id, []).append(item)
+        for user_id in (item.client_id, item.assigned_to_id):
+            if user_id and user_id != getattr(user, "pk", None):
+                by_recipient.setdefault(user_id, []).append(item)
+
+    for client_id, client_items in by_client.items():
+        try:
+            send_to_client_and_user(
+                client_id,
+                BULK_EVENT,
+                {
+                    "action": action,
+                    "content_item_ids": [item.pk for item in client_items],
+                    "items": [
+                        {"content_item_id": item.pk, **{f: _json(getattr(item, f)) for f in fields}}
+                        for item in client_items
+                    ],
+                },
+            )
+        except Exception:
+            pass
+
+    for user_id, user_items in by_recipient.items():
+        try:
+            count = len(user_items)
+            notify_users(
+                user_ids=[user_id],
+                message=FcmMessage(
+                    title="Cards updated",
+                    body=summary(count),
+                    data={
+                        "event": BULK_EVENT,
+                        "action": action,
+                        "content_item_ids": ",".join(str(item.pk) for item in user_items),
+                    },
+                ),
+            )
+        except Exception:
+            pass
+
+
+def _json(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def _cards(count):
+    return "1 card" if count == 1 else f"{count} cards"
+
+
+def bulk_move(items, user, target_column):
+    label = dict(KANBAN_COLUMNS).get(target_column, target_column)
+    fields = ["column"]
+    for item in items:
+        item.column = target_column
+        # Same rule as ContentItem.move_to.
+        if target_column == "client_approval":
+            item.approval_status = "pending"
+    if target_column == "client_approval":
+        fields.append("approval_status")
+    return _apply(items, user, fields, "move", lambda n: f"{_cards(n)} moved to {label}")
+
+
+def bulk_assign(items, user, assignee):
+    for item in items:
+        item.assigned_to = assignee
+    name = (assignee.first_name or assignee.email) if assignee else None
+    return _apply(
+        items,
+        user,
+        ["assigned_to_id"],
+        "assign",
+        lambda n: f"{_cards(n)} assigned to {name}" if name else f"{_cards(n)} unassigned",
+    )
+
+
+def bulk_schedule(items, user, scheduled_at):
+    for item in items:
+        item.scheduled_at = scheduled_at
+        item.post_action = "schedule"
+        item.column = "scheduled"
+    return _apply(
+        items,
+        user,
+        ["scheduled_at", "post_action", "column"],
+        "schedule",
+        lambda n: f"{_cards(n)} scheduled for {scheduled_at:%Y-%m-%d %H:%M}",
+    )
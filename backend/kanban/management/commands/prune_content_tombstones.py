@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from kanban.sync import TOMBSTONE_RETENTION, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete content item tombstones older than the delta-sync retention "
+        f"({TOMBSTONE_RETENTION.days} days); clients with older watermarks reload their board."
+    )
+
+    def handle(self, *args, **options):
+        count = prune_tombstones()
+        self.stdout.write(f"Pruned {count} tombstones")
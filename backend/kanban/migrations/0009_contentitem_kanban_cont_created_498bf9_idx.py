@@ -0,0 +1,21 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_alter_customuser_type_and_more'),
+        ('invoice', '0009_invoice_invoice_inv_date_63365f_idx_and_more'),
+        ('kanban', '0008_alter_contentitem_priority_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contentitem',
+            index=models.Index(fields=['-created_at', '-id'], name='kanban_cont_created_498bf9_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_sequencecounter'),
+        ('invoice', '0014_recurring_invoices'),
+        ('kanban', '0009_contentitem_kanban_cont_created_498bf9_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contentitem',
+            index=models.Index(fields=['client', 'column', '-created_at', '-id'], name='kanban_cont_client__b28334_idx'),
+        ),
+    ]
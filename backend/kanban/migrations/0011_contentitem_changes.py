@@ -0,0 +1,35 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:30
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_sequencecounter'),
+        ('invoice', '0014_recurring_invoices'),
+        ('kanban', '0010_contentitem_board_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentItemTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_item_id', models.BigIntegerField()),
+                ('client_id', models.BigIntegerField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='contentitem',
+            index=models.Index(fields=['updated_at', 'id'], name='kanban_cont_updated_8b004c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contentitemtombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='kanban_cont_deleted_642813_idx'),
+        ),
+    ]
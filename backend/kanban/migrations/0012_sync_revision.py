@@ -0,0 +1,44 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_sequencecounter'),
+        ('invoice', '0014_recurring_invoices'),
+        ('kanban', '0011_contentitem_changes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='contentitem',
+            name='kanban_cont_updated_8b004c_idx',
+        ),
+        migrations.AddField(
+            model_name='contentitem',
+            name='sync_revision',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='contentitemtombstone',
+            name='sync_revision',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='historicalcontentitem',
+            name='sync_revision',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='contentitem',
+            index=models.Index(fields=['sync_revision', 'id'], name='kanban_cont_sync_re_dc41ab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contentitemtombstone',
+            index=models.Index(fields=['sync_revision', 'id'], name='kanban_cont_sync_re_049b76_idx'),
+        ),
+    ]
@@ -1,7 +1,7 @@
 from django.conf import settings
-from django.db import models
+from django.db import connection, models, transaction
 from django.utils import timezone
-from core.models import BaseModel, CustomUser, Service
+from core.models import BaseModel, CustomUser, SequenceCounter, Service
 
 
 KANBAN_COLUMNS = [
@@ -110,8 +110,25 @@ class ContentItem(BaseModel):
     post_error = models.TextField(blank=True, null=True)
     external_post_id = models.CharField(max_length=255, blank=True, null=True)
 
+    # delta sync (`changes`): revision of the last write, see next_sync_revision
+    sync_revision = models.BigIntegerField(default=0, editable=False)
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"]),
+            # board: per-column counts and newest-first pages for one client
+            models.Index(fields=["client", "column", "-created_at", "-id"]),
+            # delta sync (`changes`): rows written after a watermark
+            models.Index(fields=["sync_revision", "id"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            self.sync_revision = next_sync_revision()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "sync_revision"}
+            super().save(*args, **kwargs)
 
     def can_move(self, user, target_column):
         """Check if user can move item to target_column"""
@@ -256,3 +273,67 @@ class ContentItemCommentRead(BaseModel):
             models.Index(fields=["content_item", "user"]),
             models.Index(fields=["user", "last_read_at"]),
         ]
+
+
+class ContentItemTombstone(models.Model):
+    """A deleted ContentItem, kept so delta sync (`content-items/changes/`) can report it.
+
+    Plain id columns rather than foreign keys: the item is gone, and the client
+    may be being deleted in the same transaction.
+    """
+    content_item_id = models.BigIntegerField()
+    client_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+    sync_revision = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["deleted_at", "id"]),
+            models.Index(fields=["sync_revision", "id"]),
+        ]
+
+    def __str__(self):
+        return f"ContentItem {self.content_item_id} deleted @ {self.deleted_at}"
+
+
+SYNC_REVISION_COUNTER = "kanban:sync"
+
+
+def next_sync_revision():
+    """Allocate the delta-sync revision for a write to content items.
+
+    Must run inside the transaction that writes the rows. On PostgreSQL the
+    revision is that transaction's id (`txid_current()`), so writers take no
+    shared lock; `kanban.sync.current_revision` puts the watermark below the
+    oldest transaction still running. Elsewhere (SQLite in development) writers
+    already queue on the database lock, so a counter bumped in the transaction
+    is handed out in commit order.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT txid_current()")
+            return cursor.fetchone()[0]
+    return SequenceCounter.next_value(SYNC_REVISION_COUNTER)
+
+
+def with_unread_comments_count(queryset, user):
+    """Annotate ContentItems with `unread_comments_count` for `user`.
+
+    `last_read_at` comes from a correlated subquery on ContentItemCommentRead and
+    comments newer than it are counted in the same query; items the user never
+    opened count all their comments.
+    """
+    if not getattr(user, "is_authenticated", False):
+        return queryset
+    last_read_at = ContentItemCommentRead.objects.filter(
+        content_item=models.OuterRef("pk"), user=user
+    ).values("last_read_at")[:1]
+    return queryset.annotate(
+        comments_last_read_at=models.Subquery(last_read_at),
+    ).annotate(
+        unread_comments_count=models.Count(
+            "comments",
+            filter=models.Q(comments_last_read_at__isnull=True)
+            | models.Q(comments__created_at__gt=models.F("comments_last_read_at")),
+        ),
+    )
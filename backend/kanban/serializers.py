@@ -2,6 +2,8 @@ from rest_framework import serializers
 from .models import ContentItem, KANBAN_COLUMNS, MediaAsset, ContentComment
 from kanban.ws import send_to_client_and_user
 from core.notifications import notify_content_item_event
+from core.models import CustomUser
+from .bulk import BULK_MAX_ITEMS, bulk_assign, bulk_move, bulk_schedule
 
 class ContentItemMoveSerializer(serializers.Serializer):
     target_column = serializers.ChoiceField(choices=[col[0] for col in KANBAN_COLUMNS])
@@ -112,6 +114,67 @@ class ContentItemApprovalSerializer(serializers.Serializer):
         return item
 
 
+class ContentItemBulkSerializer(serializers.Serializer):
+    """Base for bulk actions: `ids` must all be items the user can see (all or nothing)."""
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=BULK_MAX_ITEMS)
+    staff_only = True
+
+    def validate_ids(self, ids):
+        ids = list(dict.fromkeys(ids))
+        user = self.context['request'].user
+        qs = ContentItem.objects.filter(pk__in=ids)
+        if user.type == "client":
+            qs = qs.filter(client=user)
+        found = {item.pk: item for item in qs}
+        missing = [pk for pk in ids if pk not in found]
+        if missing:
+            raise serializers.ValidationError(f"Content items not found: {', '.join(map(str, missing))}")
+        self.items = [found[pk] for pk in ids]
+        return ids
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        if self.staff_only and getattr(user, "type", None) not in ["superadmin", "manager"]:
+            raise serializers.ValidationError({"error": "Permission denied."})
+        return attrs
+
+
+class ContentItemBulkMoveSerializer(ContentItemBulkSerializer):
+    target_column = serializers.ChoiceField(choices=[col[0] for col in KANBAN_COLUMNS])
+    # Per-item rules come from ContentItem.can_move.
+    staff_only = False
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        user = self.context['request'].user
+        denied = [item.pk for item in self.items if not item.can_move(user, attrs['target_column'])]
+        if denied:
+            raise serializers.ValidationError(
+                {"error": "Permission denied to move these items.", "ids": denied}
+            )
+        return attrs
+
+    def save(self):
+        return bulk_move(self.items, self.context['request'].user, self.validated_data['target_column'])
+
+
+class ContentItemBulkAssignSerializer(ContentItemBulkSerializer):
+    assigned_to = serializers.PrimaryKeyRelatedField(
+        queryset=CustomUser.objects.exclude(type="client"), allow_null=True
+    )
+
+    def save(self):
+        return bulk_assign(self.items, self.context['request'].user, self.validated_data['assigned_to'])
+
+
+class ContentItemBulkScheduleSerializer(ContentItemBulkSerializer):
+    scheduled_at = serializers.DateTimeField()
+
+    def save(self):
+        return bulk_schedule(self.items, self.context['request'].user, self.validated_data['scheduled_at'])
+
+
+
 from rest_framework import serializers
 from kanban.models import ContentItem, KANBAN_COLUMNS, APPROVAL_STATUS, ContentItemCommentRead
 from core.models import CustomUser, Service
@@ -277,6 +340,10 @@ class ContentItemSerializer(serializers.ModelSerializer):
         if not user or not getattr(user, 'is_authenticated', False):
             return 0
 
+        # Annotated by ContentItemViewSet.get_queryset (see with_unread_comments_count).
+        if hasattr(obj, 'unread_comments_count'):
+            return obj.unread_comments_count
+
         last_read_at = (
             ContentItemCommentRead.objects.filter(content_item=obj, user=user)
             .values_list('last_read_at', flat=True)
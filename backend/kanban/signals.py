@@ -0,0 +1,13 @@
+"""Kanban signals: record tombstones for deleted content items (delta sync)."""
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import ContentItem, ContentItemTombstone, next_sync_revision
+
+
+@receiver(post_delete, sender=ContentItem, dispatch_uid='content_item_tombstone')
+def record_content_item_tombstone(sender, instance, **kwargs):
+    # post_delete runs inside the delete's transaction, which holds the revision.
+    ContentItemTombstone.objects.create(
+        content_item_id=instance.pk, client_id=instance.client_id, sync_revision=next_sync_revision()
+    )
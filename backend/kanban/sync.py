@@ -0,0 +1,95 @@
+"""Delta sync for kanban boards (`GET content-items/changes/?since=<watermark>`).
+
+A client keeps the `watermark` from its last sync and asks only for what
+changed after it:
+
+- `items`: content items written after the watermark, oldest change first,
+  paged with a keyset cursor on (sync_revision, id) so rows written while
+  paging move to the end instead of being skipped.
+- `archived`: ids of changed items that are now archived.
+- `deleted`: ids from `ContentItemTombstone`, written when an item is deleted.
+
+Every write to content items stamps a `sync_revision` (`next_sync_revision`)
+and the watermark is a revision up to which every write is already visible,
+read before the items so a write that commits late is never skipped:
+
+- PostgreSQL: the revision is the writing transaction's id and the watermark
+  sits just below the xmin of the current snapshot, i.e. the oldest
+  transaction still running. Writers don't lock anything shared; a long
+  transaction only holds the watermark back, so later syncs may return some
+  items again.
+- SQLite: writers are serialized by the database lock, so a counter bumped in
+  the writing transaction is committed in order and its value is the
+  watermark.
+
+Tombstones older than `TOMBSTONE_RETENTION` are pruned and the highest pruned
+revision is remembered; a watermark below it gets `reset: true` and the client
+reloads the board.
+"""
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from core.models import SequenceCounter
+
+from .models import SYNC_REVISION_COUNTER, ContentItemTombstone
+
+TOMBSTONE_RETENTION = timedelta(days=30)
+SYNC_ORDERING = ("sync_revision", "id")
+PRUNED_REVISION_COUNTER = f"{SYNC_REVISION_COUNTER}:pruned"
+
+
+def parse_watermark(value):
+    """Revision from a `watermark` string; None if missing or invalid."""
+    value = (value or "").strip()
+    return int(value) if value.isdigit() else None
+
+
+def _counter_value(name):
+    return SequenceCounter.objects.filter(name=name).values_list("value", flat=True).first() or 0
+
+
+def current_revision():
+    """The watermark of a sync starting now: every revision up to it is visible."""
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()) - 1")
+            return cursor.fetchone()[0]
+    return _counter_value(SYNC_REVISION_COUNTER)
+
+
+def is_expired(since, watermark):
+    """Whether a sync can't continue from `since`.
+
+    Deletes after it may have been pruned, or it is ahead of `watermark`, so
+    it wasn't issued by this database (e.g. before a restore).
+    """
+    return since > watermark or since < _counter_value(PRUNED_REVISION_COUNTER)
+
+
+def changed_items(queryset, since):
+    """Items of `queryset` written after revision `since`, oldest first."""
+    return queryset.filter(sync_revision__gt=since).order_by(*SYNC_ORDERING)
+
+
+def deleted_ids(since, client_id=None):
+    tombstones = ContentItemTombstone.objects.filter(sync_revision__gt=since)
+    if client_id is not None:
+        tombstones = tombstones.filter(client_id=client_id)
+    ids = tombstones.order_by(*SYNC_ORDERING).values_list("content_item_id", flat=True)
+    return list(dict.fromkeys(ids))
+
+
+def prune_tombstones(now=None):
+    cutoff = (now or timezone.now()) - TOMBSTONE_RETENTION
+    expired = ContentItemTombstone.objects.filter(deleted_at__lt=cutoff)
+    last = expired.order_by("-sync_revision").values_list("sync_revision", flat=True).first()
+    if last is None:
+        return 0
+    SequenceCounter.objects.get_or_create(name=PRUNED_REVISION_COUNTER)
+    SequenceCounter.objects.filter(name=PRUNED_REVISION_COUNTER).update(value=Greatest(F("value"), last))
+    deleted, _ = expired.delete()
+    return deleted
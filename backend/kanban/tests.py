@@ -1,3 +1,406 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import CustomUser, Service, ServiceCategory
+from invoice.models import Invoice
+from kanban import sync
+from kanban.models import KANBAN_COLUMNS, ContentComment, ContentItem, ContentItemCommentRead
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ContentItemListUnreadCommentsTests(TestCase):
+    url = '/api/kanban/content-items/'
+
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(
+            email='manager@example.com', password='x', first_name='Mia', last_name='Ng', type='manager'
+        )
+        self.client_user = CustomUser.objects.create_user(
+            email='client@example.com', password='x', first_name='Acme', last_name='Co', type='client'
+        )
+        category = ServiceCategory.objects.create(name='Social')
+        self.service = Service.objects.create(name='Posts', description='', category=category)
+        self.invoice = Invoice.objects.create(client=self.client_user)
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def _make_items(self, n, comments=3):
+        items = []
+        for i in range(n):
+            item = ContentItem.objects.create(
+                title=f'Post {i}', client=self.client_user, service=self.service, invoice=self.invoice,
+                created_by=self.staff, platforms=['instagram'],
+            )
+            for c in range(comments):
+                ContentComment.objects.create(
+                    content_item=item, author=self.client_user, role='client', text=f'comment {c}'
+                )
+            items.append(item)
+        return items
+
+    def _list(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.api.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries), {row['id']: row for row in resp.data}
+
+    def test_query_count_is_flat_as_items_grow(self):
+        self._make_items(2)
+        small_count, _ = self._list()
+
+        self._make_items(10)
+        large_count, rows = self._list()
+
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(small_count, large_count)
+
+    def test_unread_counts_follow_last_read_at(self):
+        never_read, read_all, read_some = self._make_items(3)
+        ContentItemCommentRead.objects.create(
+            content_item=read_all, user=self.staff, last_read_at=timezone.now() + timedelta(seconds=1)
+        )
+        first, second, _ = read_some.comments.order_by('created_at')
+        ContentComment.objects.filter(pk=first.pk).update(created_at=timezone.now() - timedelta(hours=2))
+        ContentComment.objects.filter(pk=second.pk).update(created_at=timezone.now() - timedelta(hours=2))
+        ContentItemCommentRead.objects.create(
+            content_item=read_some, user=self.staff, last_read_at=timezone.now() - timedelta(hours=1)
+        )
+        # Another user's read marker doesn't affect the staff user's counts.
+        ContentItemCommentRead.objects.create(
+            content_item=never_read, user=self.client_user, last_read_at=timezone.now() + timedelta(seconds=1)
+        )
+
+        _, rows = self._list()
+
+        self.assertEqual(rows[never_read.pk]['unread_comments_count'], 3)
+        self.assertEqual(rows[read_all.pk]['unread_comments_count'], 0)
+        self.assertEqual(rows[read_some.pk]['unread_comments_count'], 1)
+
+    def test_item_lookups_outside_listing_skip_the_unread_count(self):
+        item, = self._make_items(1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.api.post(f'{self.url}{item.pk}/comments/mark-read/')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if 'GROUP BY' in q['sql']])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ContentItemDeltaSyncTests(TestCase):
+    url = '/api/kanban/content-items/changes/'
+
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(email='manager@example.com', password='x', type='manager')
+        self.client_user = CustomUser.objects.create_user(email='client@example.com', password='x', type='client')
+        self.invoice = Invoice.objects.create(client=self.client_user)
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def _item(self, title):
+        return ContentItem.objects.create(
+            title=title, client=self.client_user, invoice=self.invoice, created_by=self.staff
+        )
+
+    def _sync(self, since=None):
+        resp = self.api.get(self.url, {'since': since} if since is not None else {})
+        self.assertEqual(resp.status_code, 200)
+        return resp.data
+
+    def test_writes_after_the_watermark_are_returned(self):
+        moved, deleted, untouched = self._item('a'), self._item('b'), self._item('c')
+        watermark = self._sync()['watermark']
+
+        # updated_at isn't written here; only the revision marks the change.
+        moved.title = 'a2'
+        moved.save(update_fields=['title'])
+        deleted_pk = deleted.pk
+        deleted.delete()
+
+        data = self._sync(watermark)
+        self.assertFalse(data['reset'])
+        self.assertEqual([row['id'] for row in data['items']], [moved.pk])
+        self.assertEqual(data['deleted'], [deleted_pk])
+        self.assertEqual(self._sync(data['watermark'])['items'], [])
+        self.assertNotIn(untouched.pk, [row['id'] for row in data['items']])
+
+    def test_watermark_older_than_pruned_tombstones_resets(self):
+        watermark = self._sync()['watermark']
+        self._item('a').delete()
+        sync.prune_tombstones(now=timezone.now() + sync.TOMBSTONE_RETENTION + timedelta(days=1))
+
+        self.assertTrue(self._sync(watermark)['reset'])
+
+    def test_deletes_are_scoped_by_the_client_alias_too(self):
+        other_client = CustomUser.objects.create_user(email='other@example.com', password='x', type='client')
+        other_item = ContentItem.objects.create(
+            title='x', client=other_client, invoice=Invoice.objects.create(client=other_client), created_by=self.staff
+        )
+        own_item = self._item('a')
+        watermark = self._sync()['watermark']
+        own_pk, other_pk = own_item.pk, other_item.pk
+        own_item.delete()
+        other_item.delete()
+
+        resp = self.api.get(self.url, {'since': watermark, 'client': self.client_user.pk})
+
+        self.assertEqual(resp.data['deleted'], [own_pk])
+        self.assertNotIn(other_pk, resp.data['deleted'])
+
+    def test_watermark_ahead_of_the_database_resets(self):
+        watermark = int(self._sync()['watermark'])
+
+        self.assertTrue(self._sync(watermark + 1000)['reset'])
+        self.assertFalse(self._sync(watermark)['reset'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SQLite serializes writers on the database lock')
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ContentItemConcurrentSyncTests(TransactionTestCase):
+    url = '/api/kanban/content-items/changes/'
+
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(email='manager@example.com', password='x', type='manager')
+        self.client_user = CustomUser.objects.create_user(email='client@example.com', password='x', type='client')
+        self.invoice = Invoice.objects.create(client=self.client_user)
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def _item(self, title):
+        return ContentItem.objects.create(
+            title=title, client=self.client_user, invoice=self.invoice, created_by=self.staff
+        )
+
+    def _sync(self, since):
+        resp = self.api.get(self.url, {'since': since})
+        self.assertEqual(resp.status_code, 200)
+        return resp.data
+
+    def _rename_in_thread(self, item, title, hold=None):
+        """Rename `item` on another connection; with `hold`, commit only once it is set."""
+        written = threading.Event()
+
+        def run():
+            try:
+                with transaction.atomic():
+                    row = ContentItem.objects.get(pk=item.pk)
+                    row.title = title
+                    row.save(update_fields=['title'])
+                    written.set()
+                    if hold is not None:
+                        hold.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.assertTrue(written.wait(10), 'writer blocked behind the open transaction')
+        return thread
+
+    def test_concurrent_writers_dont_wait_and_a_late_commit_is_not_skipped(self):
+        slow, fast = self._item('slow'), self._item('fast')
+        watermark = self._sync('0')['watermark']
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        slow_writer = self._rename_in_thread(slow, 'slow2', hold=release)
+        self._rename_in_thread(fast, 'fast2').join(10)
+        first = self._sync(watermark)
+        release.set()
+        slow_writer.join(10)
+        second = self._sync(first['watermark'])
+
+        self.assertEqual([row['id'] for row in first['items']], [fast.pk])
+        self.assertIn(slow.pk, [row['id'] for row in second['items']])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ContentItemActivityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = CustomUser.objects.create_user(
+            email='manager@example.com', password='x', first_name='Mia', type='manager'
+        )
+        self.client_user = CustomUser.objects.create_user(email='client@example.com', password='x', type='client')
+        invoice = Invoice.objects.create(client=self.client_user)
+        item = ContentItem(title='a', client=self.client_user, invoice=invoice, created_by=self.staff)
+        item._history_user = self.staff
+        item.save()
+        for field, value in [('title', 'b'), ('column', 'content_writing'), ('priority', 'high')]:
+            setattr(item, field, value)
+            item.save()
+        self.url = f'/api/kanban/content-items/{item.pk}/activity/'
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def _get(self, **params):
+        resp = self.api.get(self.url, params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.data
+
+    def test_unpaged_response_is_the_whole_history(self):
+        data = self._get()
+
+        self.assertEqual(set(data), {'success', 'history'})
+        self.assertEqual(
+            [entry['action'] for entry in data['history']],
+            ['Updated priority', 'Moved to Content Writing', 'Updated title', 'Created the task'],
+        )
+        self.assertEqual(set(data['history'][0]), {'id', 'user', 'action', 'timestamp'})
+
+    def test_pages_split_the_history_and_diff_across_the_boundary(self):
+        first = self._get(page_size=2)
+        second = self._get(page_size=2, before=first['cursor'])
+
+        # The oldest entry of the first page is diffed against the first row
+        # of the next one.
+        self.assertEqual([e['action'] for e in first['history']], ['Updated priority', 'Moved to Content Writing'])
+        self.assertTrue(first['has_more'])
+        self.assertEqual([e['action'] for e in second['history']], ['Updated title', 'Created the task'])
+        self.assertFalse(second['has_more'])
+        self.assertIsNone(second['cursor'])
+        self.assertEqual(first['history'] + second['history'], self._get()['history'])
+
+    def test_cached_entries_show_the_current_user_name(self):
+        self.assertEqual(self._get()['history'][-1]['user'], 'Mia')
+        self.staff.first_name = 'Maria'
+        self.staff.save()
+
+        self.assertEqual(self._get()['history'][-1]['user'], 'Maria')
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ContentItemBulkActionTests(TestCase):
+    url = '/api/kanban/content-items/bulk-move/'
+
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(email='manager@example.com', password='x', type='manager')
+        self.client_a = CustomUser.objects.create_user(email='a@example.com', password='x', type='client')
+        self.client_b = CustomUser.objects.create_user(email='b@example.com', password='x', type='client')
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def _item(self, client, **fields):
+        invoice = Invoice.objects.create(client=client)
+        return ContentItem.objects.create(
+            title='t', client=client, invoice=invoice, created_by=self.staff, **fields
+        )
+
+    def test_an_unknown_id_rejects_the_whole_selection(self):
+        item = self._item(self.client_a)
+
+        resp = self.api.post(self.url, {'ids': [item.pk, 999999], 'target_column': 'ready'}, format='json')
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(resp.data['success'])
+        item.refresh_from_db()
+        self.assertEqual(item.column, 'backlog')
+        self.assertEqual(item.history.count(), 1)
+
+    def test_one_denied_move_moves_nothing(self):
+        writer = CustomUser.objects.create_user(email='writer@example.com', password='x', type='content_writer')
+        allowed = self._item(self.client_a, column='content_writing')
+        denied = self._item(self.client_a, column='backlog')
+        self.api.force_authenticate(writer)
+
+        resp = self.api.post(
+            self.url, {'ids': [allowed.pk, denied.pk], 'target_column': 'design_creative'}, format='json'
+        )
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.data['errors']['ids'], [str(denied.pk)])
+        allowed.refresh_from_db()
+        self.assertEqual(allowed.column, 'content_writing')
+
+    def test_move_writes_every_item_and_sends_one_event_per_client(self):
+        items = [
+            self._item(self.client_a, approval_status='approved'),
+            self._item(self.client_a, approval_status='approved'),
+            self._item(self.client_b, approval_status='approved'),
+        ]
+        revision_before = max(item.sync_revision for item in items)
+
+        with mock.patch('kanban.bulk.send_to_client_and_user') as send, mock.patch('kanban.bulk.notify_users'):
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.api.post(
+                    self.url,
+                    {'ids': [item.pk for item in items], 'target_column': 'client_approval'},
+                    format='json',
+                )
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['updated'], 3)
+        for item in items:
+            item.refresh_from_db()
+            self.assertEqual(item.column, 'client_approval')
+            self.assertEqual(item.approval_status, 'pending')
+            self.assertGreater(item.sync_revision, revision_before)
+            self.assertEqual(item.history.count(), 2)
+            self.assertEqual(item.history.first().column, 'client_approval')
+        events = {call.args[0]: call.args[2]['content_item_ids'] for call in send.call_args_list}
+        self.assertEqual(send.call_count, 2)
+        self.assertEqual(events, {self.client_a.pk: [items[0].pk, items[1].pk], self.client_b.pk: [items[2].pk]})
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ContentItemBoardTests(TestCase):
+    url = '/api/kanban/content-items/board/'
+
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(email='manager@example.com', password='x', type='manager')
+        self.client_a = CustomUser.objects.create_user(email='a@example.com', password='x', type='client')
+        self.client_b = CustomUser.objects.create_user(email='b@example.com', password='x', type='client')
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def _items(self, client, column, n):
+        invoice = Invoice.objects.create(client=client)
+        return [
+            ContentItem.objects.create(
+                title=f'{column} {i}', client=client, invoice=invoice, created_by=self.staff, column=column
+            )
+            for i in range(n)
+        ]
+
+    def _board(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.api.get(self.url, {'client_id': self.client_a.pk, 'page_size': 2})
+        self.assertEqual(resp.status_code, 200)
+        return {column['key']: column for column in resp.data['columns']}, [q['sql'] for q in ctx.captured_queries]
+
+    def test_columns_carry_counts_and_their_newest_cards(self):
+        backlog = self._items(self.client_a, 'backlog', 3)
+        ready = self._items(self.client_a, 'ready', 1)
+        self._items(self.client_b, 'backlog', 2)
+
+        columns, queries = self._board()
+
+        self.assertEqual(list(columns), [key for key, _ in KANBAN_COLUMNS])
+        self.assertEqual(columns['backlog']['count'], 3)
+        self.assertEqual([row['id'] for row in columns['backlog']['items']], [backlog[2].pk, backlog[1].pk])
+        self.assertIsNotNone(columns['backlog']['next'])
+        self.assertEqual(columns['ready']['count'], 1)
+        self.assertEqual([row['id'] for row in columns['ready']['items']], [ready[0].pk])
+        self.assertIsNone(columns['ready']['cursor'])
+        self.assertEqual(columns['posted'], {**columns['posted'], 'count': 0, 'items': [], 'cursor': None})
+        self.assertEqual(len([sql for sql in queries if 'COUNT("kanban_contentitem"."id")' in sql]), 1)
+        self.assertEqual(len([sql for sql in queries if 'ROW_NUMBER' in sql]), 1)
+
+    def test_column_next_link_continues_after_the_first_page(self):
+        backlog = self._items(self.client_a, 'backlog', 3)
+        columns, _ = self._board()
+
+        resp = self.api.get(columns['backlog']['next'])
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['column'], 'backlog')
+        self.assertEqual([row['id'] for row in resp.data['items']], [backlog[0].pk])
+        self.assertIsNone(resp.data['cursor'])
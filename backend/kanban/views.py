@@ -1,8 +1,11 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import ContentItem, ContentComment, MediaAsset, ContentItemCommentRead
+from .models import ContentItem, ContentComment, MediaAsset, ContentItemCommentRead, with_unread_comments_count
 from .serializers import (
+    ContentItemBulkAssignSerializer,
+    ContentItemBulkMoveSerializer,
+    ContentItemBulkScheduleSerializer,
     ContentItemMoveSerializer,
     ContentItemApprovalSerializer,
     ContentCommentSerializer,
@@ -13,21 +16,179 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.utils.dateparse import parse_datetime
 from django.utils import timezone
-from typing import Any
-from .models import KANBAN_COLUMNS, APPROVAL_STATUS
+from .models import KANBAN_COLUMNS
 from kanban.ws import send_to_client_and_user
+from . import activity as activity_feed, sync
+from core.pagination import KeysetPagination, KeysetPaginationOptInMixin
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from rest_framework.utils.urls import replace_query_param
 
-class ContentItemViewSet(viewsets.ModelViewSet):
+class ContentItemViewSet(KeysetPaginationOptInMixin, viewsets.ModelViewSet):
     queryset = ContentItem.objects.select_related(
         "client",
         "created_by",
-        "service",
+        "service__category",
         "invoice",
         "assigned_to",
         "approved_by",
     ).prefetch_related("media_assets")
     serializer_class = ContentItemSerializer
     permission_classes = [IsAuthenticated]
+    # Unpaginated by default; ?pagination=cursor pages on the (-created_at, -id) index.
+    keyset_ordering = ("-created_at", "-id")
+
+    # Actions that serialize cards read unread comment counts for the requesting
+    # user computed in SQL (by ContentItemSerializer) instead of two queries per
+    # card. Other actions only look items up and skip the Count/GROUP BY.
+    unread_count_actions = ("list", "retrieve", "board", "changes")
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in self.unread_count_actions:
+            queryset = with_unread_comments_count(queryset, self.request.user)
+        return queryset
+
+    def board_client_id(self, request):
+        """Client whose board is requested: the requesting client, or `client_id`
+        (alias `client`) for staff; None for all clients."""
+        if getattr(request.user, "type", None) == "client":
+            return request.user.pk
+        client_id = request.query_params.get("client_id") or request.query_params.get("client")
+        if client_id and client_id != "All":
+            try:
+                return int(client_id)
+            except (TypeError, ValueError):
+                pass
+        return None
+
+    def filter_board_queryset(self, request, queryset):
+        """Restrict to one client's board (see `board_client_id`)."""
+        client_id = self.board_client_id(request)
+        return queryset if client_id is None else queryset.filter(client_id=client_id)
+
+    def _board_next_link(self, request, column, cursor):
+        url = replace_query_param(request.build_absolute_uri(), "column", column)
+        return replace_query_param(url, "cursor", cursor)
+
+    @action(detail=False, methods=["get"], url_path="changes")
+    def changes(self, request):
+        """Delta sync: what changed on the board since `since` (see kanban/sync.py).
+
+        `since` is the `watermark` of the previous sync (a revision number).
+        Returns changed `items` (oldest first, `page_size` per page, follow
+        `next` while `has_more`), `archived` and `deleted` ids, and the
+        `watermark`; keep the one from the last page for the next sync. Without
+        `since`, or with one older than the tombstone retention or ahead of the
+        current watermark, returns `reset: true`: reload the board.
+        """
+        # Read before the items: every revision up to it is already visible.
+        watermark = sync.current_revision()
+        since = sync.parse_watermark(request.query_params.get("since"))
+        if since is None or sync.is_expired(since, watermark):
+            return Response({"success": True, "reset": True, "watermark": str(watermark)})
+
+        queryset = self.filter_board_queryset(request, self.get_queryset())
+        paginator = KeysetPagination()
+        paginator.ordering = sync.SYNC_ORDERING
+        paginator.page_size = 200
+        rows = paginator.paginate_queryset(sync.changed_items(queryset, since), request)
+
+        # Deletes are reported once, with the last page, so none made while
+        # paging are missed.
+        deleted = (
+            [] if paginator.next_cursor is not None
+            else sync.deleted_ids(since, self.board_client_id(request))
+        )
+
+        live = [item for item in rows if not item.archived]
+        return Response(
+            {
+                "success": True,
+                "reset": False,
+                "watermark": str(watermark),
+                "items": self.get_serializer(live, many=True).data,
+                "archived": [item.pk for item in rows if item.archived],
+                "deleted": deleted,
+                "has_more": paginator.next_cursor is not None,
+                "cursor": paginator.next_cursor,
+                "next": paginator.get_next_link(),
+            }
+        )
+
+    @action(detail=False, methods=["get"], url_path="board")
+    def board(self, request):
+        """Kanban board grouped by column.
+
+        Returns every column of KANBAN_COLUMNS with its `count` (one GROUP BY),
+        its first `page_size` cards (newest first, picked with a window
+        function) and a `cursor`/`next` to load more. `?column=<key>&cursor=...`
+        returns the next cards of one column. Served by the
+        (client, column, -created_at, -id) index.
+        """
+        paginator = KeysetPagination()
+        ordering = tuple(self.keyset_ordering)
+        column_labels = dict(KANBAN_COLUMNS)
+        base = self.filter_board_queryset(request, ContentItem.objects.all())
+
+        column = request.query_params.get("column")
+        if column:
+            if column not in column_labels:
+                return Response(
+                    {"success": False, "error": "Unknown column."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            queryset = self.filter_board_queryset(request, self.get_queryset()).filter(column=column)
+            items = paginator.paginate_queryset(queryset, request, view=self)
+            return Response(
+                {
+                    "success": True,
+                    "column": column,
+                    "items": self.get_serializer(items, many=True).data,
+                    "cursor": paginator.next_cursor,
+                    "next": paginator.get_next_link(),
+                }
+            )
+
+        page_size = paginator.get_page_size(request)
+        counts = dict(
+            base.order_by().values("column").annotate(n=Count("id")).values_list("column", "n")
+        )
+        ranked_ids = list(
+            base.order_by()
+            .annotate(
+                board_rank=Window(
+                    RowNumber(),
+                    partition_by=[F("column")],
+                    order_by=[F("created_at").desc(), F("id").desc()],
+                )
+            )
+            .filter(board_rank__lte=page_size)
+            .values_list("id", flat=True)
+        )
+        by_column = {}
+        if ranked_ids:
+            for item in self.get_queryset().filter(pk__in=ranked_ids).order_by(*ordering):
+                by_column.setdefault(item.column, []).append(item)
+
+        columns = []
+        for key, label in KANBAN_COLUMNS:
+            items = by_column.get(key, [])
+            count = counts.get(key, 0)
+            cursor = None
+            if items and count > len(items):
+                cursor = paginator.encode_cursor(paginator.key_of(items[-1], ordering))
+            columns.append(
+                {
+                    "key": key,
+                    "label": label,
+                    "count": count,
+                    "items": self.get_serializer(items, many=True).data,
+                    "cursor": cursor,
+                    "next": self._board_next_link(request, key, cursor) if cursor else None,
+                }
+            )
+        return Response({"success": True, "columns": columns})
 
     def create(self, request, *args, **kwargs):
         user = request.user
@@ -48,6 +209,36 @@ class ContentItemViewSet(viewsets.ModelViewSet):
             return Response({"success": True, "item": ContentItemSerializer(item).data})
         return Response({"success": False, "errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
+    def _bulk_action(self, request, serializer_class):
+        serializer = serializer_class(data=request.data, context={"request": request})
+        if not serializer.is_valid():
+            return Response({"success": False, "errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        items = serializer.save()
+        refreshed = with_unread_comments_count(
+            self.get_queryset().filter(pk__in=[item.pk for item in items]), request.user
+        ).order_by(*self.keyset_ordering)
+        return Response(
+            {
+                "success": True,
+                "updated": len(items),
+                "items": self.get_serializer(refreshed, many=True).data,
+            }
+        )
+
+    # Bulk variants of move / assign / schedule: {"ids": [...], ...}; one
+    # transaction, bulk history and one coalesced event per client (kanban/bulk.py).
+    @action(detail=False, methods=["post"], url_path="bulk-move")
+    def bulk_move(self, request):
+        return self._bulk_action(request, ContentItemBulkMoveSerializer)
+
+    @action(detail=False, methods=["post"], url_path="bulk-assign")
+    def bulk_assign(self, request):
+        return self._bulk_action(request, ContentItemBulkAssignSerializer)
+
+    @action(detail=False, methods=["post"], url_path="bulk-schedule")
+    def bulk_schedule(self, request):
+        return self._bulk_action(request, ContentItemBulkScheduleSerializer)
+
     # Approve or revise in client approval
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
@@ -173,112 +364,42 @@ class ContentItemViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=["get"], url_path="activity")
     def activity(self, request, pk=None):
-        """Return activity history for this content item using django-simple-history."""
-        item = self.get_object()
+        """Activity history of this content item, newest first (see kanban/activity.py).
 
-        def format_user(u: Any) -> str:
-            # Only show "System" when the change was made without a user context
-            # (e.g., background tasks).
-            if not u:
-                return "System"
-            try:
-                first_name = (getattr(u, "first_name", "") or "").strip()
-                if first_name:
-                    return first_name
-                email = (getattr(u, "email", "") or "").strip()
-                if email:
-                    return email
-                return str(getattr(u, "pk", "")) or "User"
-            except Exception:
-                return "User"
-
-        column_labels = dict(KANBAN_COLUMNS)
-        approval_labels = dict(APPROVAL_STATUS)
-
-        # Newest first
-        history_qs = item.history.all().order_by("-history_date")
-        history_list = list(history_qs)
-
-        tracked_fields = [
-            "title",
-            "column",
-            "priority",
-            "due_date",
-            "assigned_to_id",
-            "approval_status",
-            "revise_requested",
-            "revise_count",
-            "post_action",
-            "scheduled_at",
-            "posted_at",
-            "invoice_id",
-            "service_id",
-        ]
-
-        def get_val(obj: Any, field: str):
-            try:
-                return getattr(obj, field)
-            except Exception:
-                return None
-
-        def describe_change(current: Any, previous: Any) -> str:
-            # history_type: + created, ~ changed, - deleted
-            ht = getattr(current, "history_type", "~")
-            if ht == "+":
-                return "Created the task"
-            if ht == "-":
-                return "Deleted the task"
-
-            changes = {}
-            if previous is not None:
-                for f in tracked_fields:
-                    a = get_val(current, f)
-                    b = get_val(previous, f)
-                    if a != b:
-                        changes[f] = (b, a)
-
-            # Prefer meaningful summaries
-            if "column" in changes:
-                new_col = changes["column"][1]
-                return f"Moved to {column_labels.get(new_col, new_col)}"
-            if "approval_status" in changes:
-                new_val = changes["approval_status"][1]
-                return f"Approval status set to {approval_labels.get(new_val, new_val)}"
-            if "assigned_to_id" in changes:
-                return "Updated assignee"
-            if "scheduled_at" in changes:
-                new_dt = changes["scheduled_at"][1]
-                if new_dt:
-                    try:
-                        return f"Scheduled for {new_dt.isoformat()}"
-                    except Exception:
-                        return "Scheduled"
-                return "Removed schedule"
-            if "revise_requested" in changes and changes["revise_requested"][1] is True:
-                return "Requested revision"
-            if changes:
-                # Generic but still helpful
-                fields = ", ".join(list(changes.keys())[:3])
-                extra = "" if len(changes) <= 3 else f" (+{len(changes) - 3} more)"
-                return f"Updated {fields}{extra}"
-            return "Updated the task"
-
-        out = []
-        for idx, current in enumerate(history_list):
-            previous = history_list[idx + 1] if idx + 1 < len(history_list) else None
-            actor = getattr(current, "history_user", None)
-            out.append(
-                {
-                    "id": str(getattr(current, "history_id", idx)),
-                    "user": format_user(actor),
-                    "action": describe_change(current, previous),
-                    "timestamp": getattr(current, "history_date").isoformat()
-                    if getattr(current, "history_date", None)
-                    else "",
-                }
+        Without `page_size` or `before`, returns the whole history. With either,
+        returns `page_size` entries; while `has_more`, pass `cursor` back as
+        `?before=` (or follow `next`) for older entries.
+        """
+        item = self.get_object()
+        params = request.query_params
+        before = params.get("before")
+        if before not in (None, "") and not str(before).isdigit():
+            return Response(
+                {"success": False, "error": "before must be a history id"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-
-        return Response({"success": True, "history": out})
+        if not before and not params.get("page_size"):
+            return Response({"success": True, "history": activity_feed.activity_entries(item)})
+        paginator = KeysetPagination()
+        paginator.page_size = activity_feed.ACTIVITY_PAGE_SIZE
+        paginator.max_page_size = activity_feed.ACTIVITY_MAX_PAGE_SIZE
+        entries, next_before = activity_feed.activity_page(
+            item,
+            before=int(before) if before else None,
+            page_size=paginator.get_page_size(request),
+        )
+        next_link = None
+        if next_before is not None:
+            next_link = replace_query_param(request.build_absolute_uri(), "before", next_before)
+        return Response(
+            {
+                "success": True,
+                "history": entries,
+                "has_more": next_before is not None,
+                "cursor": next_before,
+                "next": next_link,
+            }
+        )
 
     @action(detail=True, methods=["post"], url_path="comments/mark-read")
     def mark_comments_read(self, request, pk=None):
@@ -47,3 +47,17 @@ def send_to_user(user_id: str | int, event: str, data: Dict[str, Any]) -> None:
             "data": data,
         },
     )
+
+
+STAFF_GROUP = "staff"
+
+
+def send_to_staff(event: str, data: Dict[str, Any]) -> None:
+    """Broadcast to every connected non-client user (see EventsConsumer)."""
+    _group_send(
+        STAFF_GROUP,
+        {
+            "event": event,
+            "data": data,
+        },
+    )
@@ -17,10 +17,11 @@ class RequestOTPForAccessTokenView(APIView):
 		from .otp_helpers import generate_otp, store_otp
 		from core.utils import send_otp_email
 		from invoice.models import BusinessInfo
+		from core import cache as reference_cache
 		
 		# Get business info
 		try:
-			business_info = BusinessInfo.objects.last()
+			business_info = reference_cache.business_info()
 			if not business_info or not business_info.secondary_email:
 				return Response({"detail": "Secondary email not configured"}, status=status.HTTP_400_BAD_REQUEST)
 		except BusinessInfo.DoesNotExist:
@@ -425,6 +426,7 @@ class DeleteUserTokenView(APIView):
 		from .otp_helpers import generate_otp, store_otp
 		from core.utils import send_otp_email
 		from invoice.models import BusinessInfo
+		from core import cache as reference_cache
 		
 		user_id = 1  # Default user_id for testing (no auth required)
 		
@@ -435,7 +437,7 @@ class DeleteUserTokenView(APIView):
 		
 		# Get business secondary email
 		try:
-			business_info = BusinessInfo.objects.last()
+			business_info = reference_cache.business_info()
 			if not business_info or not business_info.secondary_email:
 				return Response({"detail": "Secondary email not configured"}, status=status.HTTP_400_BAD_REQUEST)
 		except BusinessInfo.DoesNotExist:
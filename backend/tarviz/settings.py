@@ -185,6 +185,22 @@ if not DEBUG:
 # Basic upload constraints (used by model validators)
 MAX_UPLOAD_IMAGE_MB = int(os.getenv('MAX_UPLOAD_IMAGE_MB', '5'))
 
+# Rendered invoice PDFs, keyed by a hash of their content (see invoice/pdf.py).
+# Kept outside MEDIA_ROOT so invoices are never publicly served.
+INVOICE_PDF_CACHE_DIR = os.getenv('INVOICE_PDF_CACHE_DIR', str(BASE_DIR / 'pdf_cache'))
+# Seconds a cached PDF may go unused before `manage.py prune_invoice_pdfs` deletes it.
+INVOICE_PDF_CACHE_MAX_AGE = int(os.getenv('INVOICE_PDF_CACHE_MAX_AGE', str(7 * 24 * 60 * 60)))
+# Size of the warm WeasyPrint process pool per Django process; 0 renders inline.
+INVOICE_PDF_WORKERS = int(os.getenv('INVOICE_PDF_WORKERS', '2'))
+# Seconds after which an unfinished async PDF job is treated as lost (its process died).
+INVOICE_PDF_JOB_TIMEOUT = int(os.getenv('INVOICE_PDF_JOB_TIMEOUT', '300'))
+# Run async pipeline jobs (invoice/pipeline.py) on a background thread; False runs them inline.
+PIPELINE_JOBS_IN_BACKGROUND = os.getenv('PIPELINE_JOBS_IN_BACKGROUND', 'True') == 'True'
+# Lifetime (seconds) of cached sender info and dropdowns (core/cache.py). Saves
+# invalidate them at once on a shared cache backend; with the default per-process
+# cache other workers catch up within this window.
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT', '300'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 